@@ -0,0 +1,47 @@
+#
+# MIT License
+#
+# Copyright (c) 2018-2021 Wisconsin Autonomous
+#
+# See https://wa.wisc.edu
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+from wa_cli.utils import ipam
+from wa_cli.utils.state import STATE_DIR_ENV
+
+from types import SimpleNamespace
+import pytest
+
+
+@pytest.fixture
+def state_dir(tmp_path, monkeypatch):
+    """Keep the state (leases, caches, etc.) of a test in its own directory."""
+    monkeypatch.setenv(STATE_DIR_ENV, str(tmp_path / "state"))
+    return tmp_path / "state"
+
+
+@pytest.fixture
+def containers(monkeypatch):
+    """The names of the containers that exist when leases are reclaimed. Leases are reclaimed as soon as their container is gone."""
+    names = set()
+    monkeypatch.setattr(ipam, "docker", SimpleNamespace(container=SimpleNamespace(list=lambda all=False: [SimpleNamespace(name=n) for n in names])))
+    monkeypatch.setattr(ipam, "LEASE_GRACE_PERIOD", -1)
+    return names
@@ -0,0 +1,105 @@
+#
+# MIT License
+#
+# Copyright (c) 2018-2021 Wisconsin Autonomous
+#
+# See https://wa.wisc.edu
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+from wa_cli.utils.build_context import dockerignore_matcher, fingerprint_build
+
+import os
+
+
+def test_dockerignore_matcher_wildcards():
+    is_excluded = dockerignore_matcher("*.log\nbuild\n**/*.o\n# comment\n\n")
+    assert is_excluded("debug.log")
+    assert not is_excluded("logs/debug.log")
+    assert is_excluded("build")
+    assert is_excluded("build/bin/app")
+    assert is_excluded("main.o")
+    assert is_excluded("src/lib/main.o")
+    assert not is_excluded("src/main.c")
+    assert not is_excluded("comment")
+
+
+def test_dockerignore_matcher_exceptions():
+    is_excluded = dockerignore_matcher("docs\n!docs/README.md\n*.md\n!README.md")
+    assert is_excluded("docs/usage.md")
+    assert not is_excluded("docs/README.md")
+    assert is_excluded("CHANGELOG.md")
+    assert not is_excluded("README.md")
+
+
+def test_dockerignore_matcher_normalizes_patterns():
+    is_excluded = dockerignore_matcher("/build/\n./data//raw\n.")
+    assert is_excluded("build/out")
+    assert is_excluded("data/raw/0.bin")
+    assert not is_excluded("src/main.c")
+
+
+def _make_context(root):
+    (root / "src").mkdir()
+    (root / "src" / "main.c").write_text("int main() {}")
+    (root / "Dockerfile").write_text("FROM ubuntu:20.04")
+    (root / ".dockerignore").write_text("*.log")
+    (root / "build.log").write_text("")
+
+
+def test_fingerprint_build_changes_with_the_context(tmp_path):
+    _make_context(tmp_path)
+    build = {"context": ".", "args": {"USER": "wa"}}
+    fingerprint = fingerprint_build(tmp_path, build)
+    assert fingerprint_build(tmp_path, build) == fingerprint
+    assert fingerprint_build(tmp_path, ".") != fingerprint
+
+    # Ignored files don't matter
+    (tmp_path / "build.log").write_text("compiling...")
+    assert fingerprint_build(tmp_path, build) == fingerprint
+
+    (tmp_path / "src" / "main.c").write_text("int main() { return 1; }")
+    assert fingerprint_build(tmp_path, build) != fingerprint
+
+    fingerprint = fingerprint_build(tmp_path, build)
+    (tmp_path / "Dockerfile").write_text("FROM ubuntu:22.04")
+    assert fingerprint_build(tmp_path, build) != fingerprint
+
+
+def test_fingerprint_build_ignores_the_build_cache(tmp_path):
+    _make_context(tmp_path)
+    fingerprint = fingerprint_build(tmp_path, {"context": "."})
+    cached = {"context": ".", "cache_from": ["type=local,src=/tmp/cache"], "cache_to": ["type=local,dest=/tmp/cache"]}
+    assert fingerprint_build(tmp_path, cached) == fingerprint
+
+
+def test_fingerprint_build_reuses_the_content_hash(tmp_path):
+    _make_context(tmp_path)
+    state = {}
+    fingerprint = fingerprint_build(tmp_path, ".", state=state)
+    assert list(state["contexts"]) == [str(tmp_path.resolve())]
+
+    # The cached hash is used as long as the names, sizes and modification times don't change
+    main = tmp_path / "src" / "main.c"
+    stat = main.stat()
+    main.write_text("int main() {}".upper())
+    os.utime(main, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert fingerprint_build(tmp_path, ".", state=state) == fingerprint
+    assert fingerprint_build(tmp_path, ".") != fingerprint
@@ -0,0 +1,74 @@
+#
+# MIT License
+#
+# Copyright (c) 2018-2021 Wisconsin Autonomous
+#
+# See https://wa.wisc.edu
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+from wa_cli.utils.buildkit import parse_build_progress, summarize_build
+
+
+PROGRESS = """\
+#0 building with "wa-cli" instance using docker-container driver
+
+#1 [dev internal] load build definition from Dockerfile
+#1 transferring dockerfile: 1.2kB done
+#1 DONE 0.1s
+
+#2 [dev base 1/3] FROM docker.io/library/ubuntu:20.04
+#2 CACHED
+
+#3 [dev base 2/3] RUN apt-get update && apt-get install -y cmake
+#3 12.04 Setting up cmake (3.16.3-1ubuntu1) ...
+#3 DONE 30.5s
+
+#4 [dev base 3/3] RUN make
+#4 ERROR: process "/bin/sh -c make" did not complete successfully: exit code: 2
+
+#5 importing cache manifest from local:1234
+#5 DONE 0.4s
+"""
+
+
+def test_parse_build_progress():
+    steps = parse_build_progress(PROGRESS.splitlines())
+    assert steps == [
+        {"stage": "dev internal", "step": "load build definition from Dockerfile", "seconds": 0.1, "cached": False, "error": False},
+        {"stage": "dev base", "step": "FROM docker.io/library/ubuntu:20.04", "seconds": 0.0, "cached": True, "error": False},
+        {"stage": "dev base", "step": "RUN apt-get update && apt-get install -y cmake", "seconds": 30.5, "cached": False, "error": False},
+        {"stage": "dev base", "step": "RUN make", "seconds": 0.0, "cached": False, "error": True},
+        {"stage": "buildkit", "step": "importing cache manifest from local:1234", "seconds": 0.4, "cached": False, "error": False},
+    ]
+
+
+def test_parse_build_progress_ignores_other_output():
+    assert parse_build_progress(["", "Step 1/3 : FROM ubuntu", " ---> Using cache"]) == []
+
+
+def test_summarize_build():
+    summary = summarize_build(parse_build_progress(PROGRESS.splitlines()), top=1)
+    assert summary["steps"] == 5
+    assert summary["cached"] == 1
+    assert round(summary["seconds"], 1) == 31.0
+    assert [stage["stage"] for stage in summary["stages"]] == ["dev base", "buildkit", "dev internal"]
+    assert summary["stages"][0]["steps"] == 3
+    assert [step["step"] for step in summary["slowest"]] == ["RUN apt-get update && apt-get install -y cmake"]
@@ -0,0 +1,49 @@
+#
+# MIT License
+#
+# Copyright (c) 2018-2021 Wisconsin Autonomous
+#
+# See https://wa.wisc.edu
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+from wa_cli.utils.cache import parse_size
+
+
+def test_parse_size_plain_bytes():
+    assert parse_size("512") == 512
+    assert parse_size(1024) == 1024
+
+
+def test_parse_size_suffixes():
+    assert parse_size("1K") == 1024
+    assert parse_size("512M") == 512 * 1024 ** 2
+    assert parse_size("5G") == 5 * 1024 ** 3
+    assert parse_size("2T") == 2 * 1024 ** 4
+
+
+def test_parse_size_is_case_insensitive_and_allows_a_trailing_b():
+    assert parse_size("5g") == parse_size("5G")
+    assert parse_size("5GB") == parse_size("5G")
+    assert parse_size(" 10kb ") == 10 * 1024
+
+
+def test_parse_size_fractions():
+    assert parse_size("1.5K") == 1536
@@ -0,0 +1,92 @@
+#
+# MIT License
+#
+# Copyright (c) 2018-2021 Wisconsin Autonomous
+#
+# See https://wa.wisc.edu
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+from wa_cli.utils import cpus
+from wa_cli.utils.cpus import allocate_cores, release_cores, resolve_cpus, parse_cpuset, AUTO
+
+import pytest
+
+
+def test_parse_cpuset_single_cpu():
+    assert parse_cpuset("3") == [3]
+
+
+def test_parse_cpuset_ranges_and_cpus():
+    assert parse_cpuset("0-3,6") == [0, 1, 2, 3, 6]
+    assert parse_cpuset("0,2-3,8-9") == [0, 2, 3, 8, 9]
+
+
+# Two physical cores (with hyperthreads) on node 0 and three on node 1
+_CORES = {
+    "0:0:0": {"node": 0, "cpus": [0, 5]},
+    "0:0:1": {"node": 0, "cpus": [1, 6]},
+    "1:1:0": {"node": 1, "cpus": [2, 7]},
+    "1:1:1": {"node": 1, "cpus": [3, 8]},
+    "1:1:2": {"node": 1, "cpus": [4, 9]},
+}
+
+
+@pytest.fixture
+def cores(monkeypatch, state_dir, containers):
+    monkeypatch.setattr(cpus, "physical_cores", lambda: _CORES)
+
+
+def test_allocate_cores_prefers_the_node_with_the_most_free_cores(cores, containers):
+    containers.update(["sim-1", "sim-2", "sim-3"])
+    assert allocate_cores("sim-1", 2) == ([2, 3, 7, 8], [1])
+    assert allocate_cores("sim-2", 2) == ([0, 1, 5, 6], [0])
+    assert allocate_cores("sim-3", 1) == ([4, 9], [1])
+    assert allocate_cores("sim-4", 1) is None
+
+
+def test_allocate_cores_reclaims_cores_of_removed_containers(cores, containers):
+    containers.update(["sim-1", "sim-2"])
+    allocate_cores("sim-1", 3)
+    allocate_cores("sim-2", 2)
+    assert allocate_cores("sim-3", 1) is None
+
+    containers.discard("sim-1")
+    containers.add("sim-3")
+    assert allocate_cores("sim-3", 3) == ([2, 3, 4, 7, 8, 9], [1])
+
+
+def test_release_cores(cores, containers):
+    containers.update(["sim-1", "sim-2"])
+    allocate_cores("sim-1", 5)
+    release_cores("sim-1")
+    assert allocate_cores("sim-2", 5) is not None
+
+
+def test_resolve_cpus(cores, containers):
+    containers.update(["sim-1", "sim-2"])
+    config = {"name": "sim-1", "cpus": 1.5, "cpuset_cpus": AUTO}
+    assert resolve_cpus(config)
+    assert config["cpuset_cpus"] == [2, 3, 7, 8] and config["cpuset_mems"] == [1]
+
+    # Not enough free cores, so the container isn't pinned
+    config = {"name": "sim-2", "cpus": 4, "cpuset_cpus": AUTO}
+    assert not resolve_cpus(config)
+    assert "cpuset_cpus" not in config
@@ -0,0 +1,48 @@
+#
+# MIT License
+#
+# Copyright (c) 2018-2021 Wisconsin Autonomous
+#
+# See https://wa.wisc.edu
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+from wa_cli.dev import _render_template
+
+from pathlib import Path
+import avtoolbox.dev
+import os
+
+
+def test_render_template():
+    template = (
+        'image: avtoolbox/{project}:dev\n'
+        'context: {str(root)}\n'
+        'dockerfile: {os.path.realpath(os.path.join(__file__, "..", "docker", "dev", "dev.dockerfile"))}\n'
+        'user: "{uid}:{gid}"\n'
+    )
+    rendered = _render_template(template, dict(project="stack", root=Path("/home/wa/stack"), uid=1000, gid=1001))
+    dockerfile = os.path.realpath(os.path.join(avtoolbox.dev.__file__, "..", "docker", "dev", "dev.dockerfile"))
+    assert rendered == f'image: avtoolbox/stack:dev\ncontext: /home/wa/stack\ndockerfile: {dockerfile}\nuser: "1000:1001"\n'
+
+
+def test_render_template_doesnt_evaluate_code():
+    rendered = _render_template("name: {project}\n", dict(project="{__import__('os').getcwd()}"))
+    assert rendered == "name: {__import__('os').getcwd()}\n"
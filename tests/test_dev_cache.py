@@ -0,0 +1,92 @@
+#
+# MIT License
+#
+# Copyright (c) 2018-2021 Wisconsin Autonomous
+#
+# See https://wa.wisc.edu
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+from wa_cli.utils.dev_cache import add_cache_volumes, _parse_ccache_stats, CCACHE_LAUNCHER, COLCON_DEFAULTS
+
+import subprocess
+import yaml
+
+
+CCACHE_4 = """\
+stats_updated_timestamp\t1700000000
+direct_cache_hit\t30
+preprocessed_cache_hit\t10
+cache_miss\t60
+files_in_cache\t250
+"""
+
+CCACHE_3 = """\
+cache directory                     /ccache
+primary config                      /ccache/ccache.conf
+cache hit (direct)                    30
+cache hit (preprocessed)              10
+cache miss                            60
+cache hit rate                     40.00 %
+files in cache                       250
+"""
+
+
+def test_parse_ccache_stats_ccache_4():
+    assert _parse_ccache_stats(CCACHE_4) == {"hits": 40, "misses": 60, "hit_rate": 0.4}
+
+
+def test_parse_ccache_stats_ccache_3():
+    assert _parse_ccache_stats(CCACHE_3) == {"hits": 40, "misses": 60, "hit_rate": 0.4}
+
+
+def test_parse_ccache_stats_empty_cache():
+    assert _parse_ccache_stats("") == {"hits": 0, "misses": 0, "hit_rate": None}
+
+
+def test_add_cache_volumes(state_dir):
+    compose = {"services": {
+        "dev": {"build": {"args": {"ROS_WORKSPACE": "workspace"}}, "volumes": ["/home/wa/stack:/home/wa/stack"], "image": "avtoolbox/stack:dev"},
+        "vnc": {"build": {"args": {}}, "volumes": []},
+    }}
+    mounted = add_cache_volumes(compose, "/home/wa/stack", "stack", ccache_size="1G")
+    assert mounted == {"dev": {
+        "build": "/home/wa/stack/workspace/build",
+        "install": "/home/wa/stack/workspace/install",
+        "log": "/home/wa/stack/workspace/log",
+        "ccache": "/home/wa/.ccache",
+    }}
+    assert set(compose["volumes"]) == {f"wa-dev-stack-dev-workspace-{kind}" for kind in ["ccache", "build", "install", "log"]}
+    assert "environment" not in compose["services"]["vnc"]
+
+    dev = compose["services"]["dev"]
+    env = dict(e.split("=", 1) for e in dev["environment"])
+    assert env["CCACHE_DIR"] == "/home/wa/.ccache" and env["CCACHE_MAXSIZE"] == "1G"
+    assert env["CMAKE_C_COMPILER_LAUNCHER"] == env["CMAKE_CXX_COMPILER_LAUNCHER"] == CCACHE_LAUNCHER
+
+    # CMake before 3.17 only takes the launcher as a cache variable, which colcon passes from its defaults file
+    assert env["COLCON_DEFAULTS_FILE"] == COLCON_DEFAULTS
+    mounts = {v.split(":")[1]: v.split(":")[0] for v in dev["volumes"] if v.endswith(":ro")}
+    defaults = yaml.safe_load(open(mounts[COLCON_DEFAULTS]))
+    assert defaults == {"build": {"cmake-args": [f"-DCMAKE_C_COMPILER_LAUNCHER={CCACHE_LAUNCHER}", f"-DCMAKE_CXX_COMPILER_LAUNCHER={CCACHE_LAUNCHER}"]}}
+
+    # The launcher runs the compiler directly if ccache isn't installed
+    output = subprocess.run([mounts[CCACHE_LAUNCHER], "/bin/echo", "compiled"], stdout=subprocess.PIPE, env={"PATH": "/nonexistent"}, check=True).stdout
+    assert output == b"compiled\n"
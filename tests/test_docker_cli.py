@@ -0,0 +1,40 @@
+#
+# MIT License
+#
+# Copyright (c) 2018-2021 Wisconsin Autonomous
+#
+# See https://wa.wisc.edu
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+from wa_cli.docker_cli import _has_auto_leases
+from wa_cli.utils.cpus import AUTO as CPUS_AUTO
+
+
+def _config(**kwargs):
+    return {"name": None, "ip": None, "publish": [], **kwargs}
+
+
+def test_has_auto_leases():
+    assert not _has_auto_leases(_config())
+    assert not _has_auto_leases(_config(ip="172.20.0.10", publish=[["8080", "8080"]], cpuset_cpus=[0, 1]))
+    assert _has_auto_leases(_config(ip="auto"))
+    assert _has_auto_leases(_config(cpuset_cpus=CPUS_AUTO))
+    assert _has_auto_leases(_config(publish=[["8080", "8080"], ["auto", "5555/udp"]]))
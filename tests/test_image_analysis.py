@@ -0,0 +1,123 @@
+#
+# MIT License
+#
+# Copyright (c) 2018-2021 Wisconsin Autonomous
+#
+# See https://wa.wisc.edu
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+from wa_cli.utils import image_analysis
+from wa_cli.utils.image_analysis import analyze_image
+
+from types import SimpleNamespace
+import tarfile
+import json
+import io
+
+
+def _tar(files: dict) -> bytes:
+    # Files maps paths to their contents. A None content adds a directory.
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        for path, content in files.items():
+            info = tarfile.TarInfo(path)
+            if content is None:
+                info.type = tarfile.DIRTYPE
+                tar.addfile(info)
+            else:
+                info.size = len(content)
+                tar.addfile(info, io.BytesIO(content))
+    return buffer.getvalue()
+
+
+def _saved_image(layers: list, links: dict = None, history: list = None) -> bytes:
+    # Builds the output of a legacy 'docker save'. Links maps the layer directories that are symlinks to their target.
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as saved:
+        def add(name, data):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            saved.addfile(info, io.BytesIO(data))
+
+        links = links or {}
+        names = []
+        for i, layer in enumerate(layers):
+            name = f"layer{i}/layer.tar"
+            if name.split("/")[0] in links:
+                info = tarfile.TarInfo(name)
+                info.type = tarfile.SYMTYPE
+                info.linkname = f"../{links[name.split('/')[0]]}/layer.tar"
+                saved.addfile(info)
+            else:
+                add(name, _tar(layer))
+            names.append(name)
+        history = history or [{"created_by": f"step {i}"} for i in range(len(layers))]
+        add("config.json", json.dumps({"history": history}).encode())
+        add("manifest.json", json.dumps([{"Config": "config.json", "Layers": names}]).encode())
+    return buffer.getvalue()
+
+
+def _mock_docker(monkeypatch, saved: bytes):
+    chunks = [saved[i:i + 4096] for i in range(0, len(saved), 4096)]
+    image = SimpleNamespace(save=lambda image: iter(chunks), inspect=lambda image: SimpleNamespace(id="sha256:1234"))
+    monkeypatch.setattr(image_analysis, "docker", SimpleNamespace(image=image))
+
+
+def test_analyze_image(monkeypatch):
+    _mock_docker(monkeypatch, _saved_image([
+        {"etc": None, "etc/config": b"a" * 100, "usr/bin/tool": b"b" * 300},
+        {"etc/config": b"c" * 50, "usr/bin/.wh.tool": b""},
+    ]))
+    report = analyze_image("wa/image", top=5)
+    assert report["id"] == "sha256:1234"
+    assert report["layers"] == 2
+    assert report["files"] == 3
+    assert report["size"] == 450
+    assert report["wasted_size"] == 400
+    assert {w["path"] for w in report["wasted_paths"]} == {"/etc/config", "/usr/bin/tool"}
+    assert report["largest_layers"][0]["created_by"] == "step 0"
+    assert report["largest_paths"][0] == {"layer": 0, "path": "/usr/bin/tool", "size": 300}
+
+
+def test_analyze_image_with_an_empty_layer(monkeypatch):
+    # A 'RUN' that doesn't change any files creates a layer that's only the end-of-archive blocks
+    _mock_docker(monkeypatch, _saved_image([{"app/main.py": b"print()"}, {}, {"app/data": b"0" * 10}]))
+    report = analyze_image("wa/image")
+    assert report["layers"] == 3
+    assert report["files"] == 2
+    assert [layer["files"] for layer in sorted(report["largest_layers"], key=lambda layer: layer["index"])] == [1, 0, 1]
+
+
+def test_analyze_image_with_a_linked_layer(monkeypatch):
+    _mock_docker(monkeypatch, _saved_image([{"app/main.py": b"print()"}, {"app/main.py": b"print()"}], links={"layer1": "layer0"}))
+    report = analyze_image("wa/image")
+    assert report["layers"] == 2
+    assert report["wasted_paths"] == [{"path": "/app/main.py", "size": 7, "layer": 0}]
+
+
+def test_analyze_image_with_an_opaque_directory(monkeypatch):
+    _mock_docker(monkeypatch, _saved_image([
+        {"./var/cache/a": b"a" * 10, "./var/cache/b": b"b" * 20, "./var/log": b"c"},
+        {"./var/cache/.wh..wh..opq": b"", "./var/cache/c": b"d"},
+    ]))
+    report = analyze_image("wa/image")
+    assert report["wasted_size"] == 30
+    assert {w["path"] for w in report["wasted_paths"]} == {"/var/cache/a", "/var/cache/b"}
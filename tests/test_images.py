@@ -0,0 +1,103 @@
+#
+# MIT License
+#
+# Copyright (c) 2018-2021 Wisconsin Autonomous
+#
+# See https://wa.wisc.edu
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+from wa_cli.utils import images
+from wa_cli.utils.images import pull_images, write_lock, pin_image
+
+from types import SimpleNamespace
+import logging
+import json
+import pytest
+
+_DOCKER = """#!/bin/sh
+# Prints what 'docker pull' prints when its output isn't a terminal
+case "$2" in
+    wiscauto/vnc:latest)
+        echo "latest: Pulling from wiscauto/vnc"
+        echo "0123456789ab: Already exists"
+        echo "abcdef012345: Pulling fs layer"
+        echo "abcdef012345: Download complete"
+        echo "abcdef012345: Pull complete"
+        echo "Digest: sha256:1111"
+        ;;
+    local/image:latest)
+        echo "Status: Image is up to date for local/image:latest"
+        ;;
+    *)
+        echo "Error response from daemon: pull access denied for $2" >&2
+        exit 1
+        ;;
+esac
+"""
+
+
+@pytest.fixture
+def registry(monkeypatch, tmp_path, state_dir):
+    """Maps the images that are present locally to their digest references."""
+    script = tmp_path / "docker"
+    script.write_text(_DOCKER)
+    script.chmod(0o755)
+    monkeypatch.setattr(images.shutil, "which", lambda name: str(script))
+
+    digests = {"wiscauto/vnc:latest": ["wiscauto/vnc@sha256:1111"], "local/image:latest": []}
+    image = SimpleNamespace(inspect=lambda name: SimpleNamespace(repo_digests=digests[name]), exists=lambda name: name in digests)
+    monkeypatch.setattr(images, "docker", SimpleNamespace(image=image))
+    return digests
+
+
+def test_pull_images(registry, caplog):
+    with caplog.at_level(logging.INFO):
+        pins, errors = pull_images(["wiscauto/vnc:latest", "wiscauto/private:latest", "local/image:latest"], workers=2)
+    assert pins == {"wiscauto/vnc:latest": "wiscauto/vnc@sha256:1111"}
+    assert set(errors) == {"wiscauto/private:latest", "local/image:latest"}
+    assert "pull access denied" in str(errors["wiscauto/private:latest"])
+    assert "digest" in str(errors["local/image:latest"])
+
+    # Each layer's progress is logged as it's pulled
+    assert "'wiscauto/vnc:latest' 0123456789ab: Already exists (1/1 layers done)" in caplog.messages
+    assert "'wiscauto/vnc:latest' abcdef012345: Download complete (1/2 layers done)" in caplog.messages
+    assert "'wiscauto/vnc:latest' abcdef012345: Pull complete (2/2 layers done)" in caplog.messages
+
+
+def test_pin_image(registry, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    registry["wiscauto/vnc@sha256:1111"] = []
+    assert pin_image("wiscauto/vnc:latest") == "wiscauto/vnc:latest"
+    write_lock({"wiscauto/vnc:latest": "wiscauto/vnc@sha256:1111", "wiscauto/wa_simulator:latest": "wiscauto/wa_simulator@sha256:2222"})
+    assert pin_image("wiscauto/vnc:latest") == "wiscauto/vnc@sha256:1111"
+    # Pinned images that aren't present locally aren't used
+    assert pin_image("wiscauto/wa_simulator:latest") == "wiscauto/wa_simulator:latest"
+
+
+def test_pin_image_uses_the_project_lock_file(registry, tmp_path, monkeypatch):
+    (tmp_path / "project" / "src").mkdir(parents=True)
+    (tmp_path / "project" / "wa-images.lock").touch()
+    monkeypatch.chdir(tmp_path / "project" / "src")
+
+    registry["wiscauto/vnc@sha256:1111"] = []
+    write_lock({"wiscauto/vnc:latest": "wiscauto/vnc@sha256:1111"})
+    assert json.loads((tmp_path / "project" / "wa-images.lock").read_text()) == {"images": {"wiscauto/vnc:latest": "wiscauto/vnc@sha256:1111"}}
+    assert pin_image("wiscauto/vnc:latest") == "wiscauto/vnc@sha256:1111"
@@ -0,0 +1,81 @@
+#
+# MIT License
+#
+# Copyright (c) 2018-2021 Wisconsin Autonomous
+#
+# See https://wa.wisc.edu
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+from wa_cli.utils import ipam
+from wa_cli.utils.ipam import allocate_ip, release_ip, release_ips, list_leases
+
+from types import SimpleNamespace
+import pytest
+
+
+@pytest.fixture
+def network(state_dir, containers):
+    """A /28 network with a container that got a dynamic address. Returns the addresses in use on the network."""
+    in_use = {"172.20.0.5"}
+
+    def inspect(name):
+        assert name == "wa"
+        return SimpleNamespace(
+            ipam=SimpleNamespace(config=[{"Subnet": "172.20.0.0/28"}, {"Subnet": "fd00::/64"}]),
+            containers={ip: SimpleNamespace(ipv4_address=f"{ip}/28") for ip in in_use},
+        )
+
+    ipam.docker.network = SimpleNamespace(inspect=inspect)
+    return in_use
+
+
+def test_allocate_ip(network, containers):
+    containers.update(["sim", "a", "b"])
+    assert allocate_ip("wa", "sim", preferred="172.20.0.3") == "172.20.0.3"
+    # The reserved hosts and the addresses in use are skipped
+    assert allocate_ip("wa", "a") == "172.20.0.6"
+    assert allocate_ip("wa", "b", preferred="172.20.0.3") == "172.20.0.7"
+    assert set(list_leases()["wa"]) == {"172.20.0.3", "172.20.0.6", "172.20.0.7"}
+
+
+def test_allocate_ip_keeps_the_leases_of_running_containers(network, containers):
+    containers.update(f"sim-{i}" for i in range(9))
+    leased = [allocate_ip("wa", f"sim-{i}") for i in range(9)]
+    assert len(set(leased)) == 9
+    with pytest.raises(RuntimeError):
+        allocate_ip("wa", "sim-9")
+
+    # Once a container is removed its address can be leased again
+    containers.discard("sim-4")
+    containers.add("sim-9")
+    assert allocate_ip("wa", "sim-9") == leased[4]
+
+
+def test_release_ips(network, containers):
+    containers.update(["sim", "vnc"])
+    ip = allocate_ip("wa", "sim")
+    allocate_ip("wa", "vnc")
+    release_ips("sim")
+    assert ip not in list_leases()["wa"]
+    assert len(list_leases()["wa"]) == 1
+
+    release_ip("wa", list(list_leases()["wa"])[0])
+    assert list_leases()["wa"] == {}
@@ -0,0 +1,128 @@
+#
+# MIT License
+#
+# Copyright (c) 2018-2021 Wisconsin Autonomous
+#
+# See https://wa.wisc.edu
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+from wa_cli import jobs
+from wa_cli.utils import ipam, ports, cpus
+from wa_cli.utils.state import locked_state
+
+from types import SimpleNamespace
+from contextlib import closing
+import json
+import time
+import pytest
+
+
+class _Docker:
+    # Just enough of python_on_whales' docker client to run jobs. Containers run instantly and exit with the code in 'exit_codes'.
+    def __init__(self, containers: set):
+        self.containers = containers
+        self.exit_codes = {}
+        self.running = set()
+        self.container = SimpleNamespace(logs=lambda container: f"logs of {getattr(container, 'name', container)}\n", remove=self._remove, exists=lambda name: name in self.containers,
+                                         inspect=lambda name: SimpleNamespace(state=SimpleNamespace(running=name in self.running)))
+
+    def run(self, name, detach, **config):
+        assert detach
+        self.containers.add(name)
+        return SimpleNamespace(id=f"id-{name}", name=name)
+
+    def wait(self, container):
+        return self.exit_codes.get(getattr(container, "name", container), 0)
+
+    def _remove(self, container, force):
+        self.containers.discard(getattr(container, "name", container))
+
+
+@pytest.fixture
+def docker(monkeypatch, state_dir, containers):
+    docker = _Docker(containers)
+    monkeypatch.setattr(jobs, "docker", docker)
+    monkeypatch.setattr(ports, "_port_is_free", lambda port, protocol="tcp": True)
+    monkeypatch.setattr(cpus, "physical_cores", lambda: {"0:0:0": {"node": 0, "cpus": [0]}, "0:0:1": {"node": 0, "cpus": [1]}})
+    return docker
+
+
+def _submit(**config):
+    config = {"image": "wiscauto/wa_simulator", "command": ["python", "sim.py"], "volumes": [], "publish": [], "networks": [None], "ip": None, **config}
+    with closing(jobs._connect()) as conn:
+        return conn.execute("INSERT INTO jobs (spec, state, created) VALUES (?, ?, ?)", (json.dumps({"config": config, "vnc": False}), jobs.PENDING, time.time())).lastrowid
+
+
+def _leases(name: str) -> dict:
+    with locked_state(name) as leases:
+        return leases
+
+
+def test_worker_runs_every_pending_job(docker, state_dir):
+    ids = [_submit() for _ in range(3)]
+    docker.exit_codes["wa-job-2"] = 3
+    jobs._worker([], concurrent=False)
+
+    states = {job["id"]: (job["state"], job["exit_code"]) for job in jobs._get_jobs()}
+    assert states == {ids[0]: (jobs.SUCCEEDED, 0), ids[1]: (jobs.FAILED, 3), ids[2]: (jobs.SUCCEEDED, 0)}
+    assert all(job["container_id"] == f"id-wa-job-{job['id']}" for job in jobs._get_jobs())
+    assert (state_dir / "jobs" / "logs" / f"{ids[1]}.log").read_text() == f"logs of wa-job-{ids[1]}\n"
+
+
+def test_finished_jobs_release_their_leases(docker):
+    _submit(publish=[["auto", "8080"], ["auto", "5555/udp"]], cpuset_cpus=cpus.AUTO)
+    jobs._worker([], concurrent=True)
+    assert jobs._get_jobs()[0]["state"] == jobs.SUCCEEDED
+    assert _leases("ports.json") == {}
+    assert _leases("cpus.json") == {}
+
+
+def test_jobs_that_fail_to_start_release_their_leases(docker, monkeypatch):
+    def allocate_ip(network, name, preferred=None):
+        raise RuntimeError(f"No free ip addresses are left on network '{network}'.")
+
+    monkeypatch.setattr(ipam, "allocate_ip", allocate_ip)
+    failed = _submit(publish=[["auto", "8080"]], networks=["wa"], ip="auto")
+    succeeded = _submit(publish=[["auto", "8080"]], cpuset_cpus=cpus.AUTO)
+    jobs._worker([], concurrent=False)
+
+    states = {job["id"]: job["state"] for job in jobs._get_jobs()}
+    assert states == {failed: jobs.FAILED, succeeded: jobs.SUCCEEDED}
+    assert _leases("ports.json") == {}
+    assert _leases("cpus.json") == {}
+
+
+def test_reconcile(docker):
+    missing, running, exited = _submit(), _submit(), _submit()
+    for job in jobs._get_jobs():
+        jobs._update(job["id"], state=jobs.RUNNING, started=time.time())
+    docker.containers.update([f"wa-job-{running}", f"wa-job-{exited}"])
+    docker.running.add(f"wa-job-{running}")
+    docker.exit_codes[f"wa-job-{exited}"] = 1
+
+    alive = jobs._reconcile()
+    assert [job["id"] for job in alive] == [running]
+    states = {job["id"]: job["state"] for job in jobs._get_jobs()}
+    assert states == {missing: jobs.PENDING, running: jobs.RUNNING, exited: jobs.FAILED}
+
+    # Resuming waits on the running job and runs the re-queued one
+    jobs._worker(alive, concurrent=False)
+    assert all(job["state"] == jobs.SUCCEEDED for job in jobs._get_jobs(ids=[missing, running]))
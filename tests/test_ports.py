@@ -0,0 +1,86 @@
+#
+# MIT License
+#
+# Copyright (c) 2018-2021 Wisconsin Autonomous
+#
+# See https://wa.wisc.edu
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+from wa_cli.utils import ports
+from wa_cli.utils.ports import allocate_port, resolve_ports
+
+import socket
+import pytest
+
+
+@pytest.fixture
+def busy(monkeypatch, state_dir, containers):
+    """The (port, protocol) pairs that are bound on the host."""
+    bound = set()
+    monkeypatch.setattr(ports, "_port_is_free", lambda port, protocol="tcp": (port, protocol) not in bound)
+    return bound
+
+
+def test_allocate_port(busy, containers):
+    containers.update(["sim", "vnc", "bridge"])
+    busy.add((5901, "tcp"))
+    assert allocate_port("sim", 8080) == 8080
+    assert allocate_port("vnc", 5901) == 5902
+    # Leased ports are skipped even if nothing is bound to them yet
+    assert allocate_port("bridge", 8080) == 8081
+
+
+def test_allocate_port_probes_the_protocol_of_the_port(busy, containers):
+    containers.update(["sim", "bridge"])
+    busy.add((5555, "udp"))
+    assert allocate_port("sim", 5555) == 5555
+    assert allocate_port("bridge", 5556, protocol="udp") == 5556
+    assert allocate_port("bridge", 5555, protocol="udp") == 5557
+
+
+def test_allocate_port_reclaims_ports_of_removed_containers(busy, containers):
+    containers.add("sim-1")
+    assert allocate_port("sim-1", 8080, max_tries=1) == 8080
+    containers.add("sim-2")
+    with pytest.raises(RuntimeError):
+        allocate_port("sim-2", 8080, max_tries=1)
+
+    containers.discard("sim-1")
+    assert allocate_port("sim-2", 8080, max_tries=1) == 8080
+
+
+def test_resolve_ports(busy, containers):
+    containers.add("bridge")
+    busy.add((5555, "udp"))
+    config = {"name": "bridge", "publish": [["auto", "5555/udp"], ["127.0.0.1", "auto", "8080"], ["9000", "9000"]]}
+    assert resolve_ports(config) == {"5555/udp": "5556", "8080": "8080", "9000": "9000"}
+    assert config["publish"] == [["5556", "5555/udp"], ["127.0.0.1", "8080", "8080"], ["9000", "9000"]]
+
+
+def test_port_is_free_uses_the_right_socket_type():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.bind(("", 0))
+        port = s.getsockname()[1]
+        assert not ports._port_is_free(port, "udp")
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("", 0))
+        port = s.getsockname()[1]
+        assert not ports._port_is_free(port, "tcp")
@@ -0,0 +1,98 @@
+#
+# MIT License
+#
+# Copyright (c) 2018-2021 Wisconsin Autonomous
+#
+# See https://wa.wisc.edu
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+from wa_cli.utils import stream
+from wa_cli.utils.stream import follow_containers
+
+from types import SimpleNamespace
+import pytest
+
+
+class _Done(Exception):
+    pass
+
+
+def _mock_docker(monkeypatch, logs: dict, ids):
+    # Logs maps container ids to their output. Ids is called with a container's name and returns its current id.
+    def inspect(name):
+        return SimpleNamespace(id=ids(name))
+
+    def container_logs(container_id, follow, stream, timestamps):
+        assert follow and stream and timestamps
+        return [("stdout", chunk) for chunk in logs[container_id]]
+
+    monkeypatch.setattr(stream, "docker", SimpleNamespace(container=SimpleNamespace(inspect=inspect, logs=container_logs)))
+
+
+def test_follow_containers_merges_by_timestamp(monkeypatch):
+    _mock_docker(monkeypatch, {
+        "id-sim": [b"2023-01-01T00:00:01Z sim 1\n2023-01-01T00:00:03", b".5Z sim 2\n"],
+        "id-vnc": [b"2023-01-01T00:00:02.25Z vnc 1\r\n2023-01-01T00:00:04Z vnc 2"],
+    }, ids=lambda name: f"id-{name}")
+    emitted = []
+    follow_containers(lambda: ["sim", "vnc"], lambda *line: emitted.append(line), window=0.05, poll=0, keep_polling=False)
+    assert [(container, line) for _, container, line in emitted] == [("sim", "sim 1"), ("vnc", "vnc 1"), ("sim", "sim 2"), ("vnc", "vnc 2")]
+    assert [timestamp for timestamp, _, _ in emitted] == sorted(timestamp for timestamp, _, _ in emitted)
+
+
+def test_follow_containers_doesnt_replay_ended_containers(monkeypatch):
+    _mock_docker(monkeypatch, {"id-sim": [b"2023-01-01T00:00:01Z done\n"]}, ids=lambda name: f"id-{name}")
+    emitted, polls = [], []
+
+    def list_containers():
+        polls.append(None)
+        if len(polls) > 20:
+            raise _Done()
+        return ["sim"]
+
+    with pytest.raises(_Done):
+        follow_containers(list_containers, lambda *line: emitted.append(line), window=0.01, poll=0)
+    assert [line for _, _, line in emitted] == ["done"]
+
+
+def test_follow_containers_follows_recreated_containers(monkeypatch):
+    # The container is re-created with the same name after its first logs ended
+    _mock_docker(monkeypatch, {
+        "first": [b"2023-01-01T00:00:01Z first run\n"],
+        "second": [b"2023-01-01T00:01:00Z second run\n"],
+    }, ids=lambda name: "first" if len(emitted) < 1 else "second")
+    emitted = []
+
+    def emit(*line):
+        emitted.append(line)
+        if len(emitted) == 2:
+            raise _Done()
+
+    polls = []
+
+    def list_containers():
+        polls.append(None)
+        assert len(polls) < 500, "the re-created container was never followed"
+        return ["sim"]
+
+    with pytest.raises(_Done):
+        follow_containers(list_containers, emit, window=0.01, poll=0)
+    assert [line for _, _, line in emitted] == ["first run", "second run"]
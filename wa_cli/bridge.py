@@ -0,0 +1,173 @@
+#
+# MIT License
+#
+# Copyright (c) 2018-2021 Wisconsin Autonomous
+#
+# See https://wa.wisc.edu
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""
+CLI command that measures the communication path between the simulator and external entities
+"""
+
+# Imports from wa_cli
+from wa_cli.utils.logger import LOGGER, dumps_dict
+from wa_cli.utils.files import get_resolved_path
+from wa_cli.utils.ports import resolve_ports
+
+# Docker imports
+from python_on_whales import docker
+
+# General imports
+import subprocess
+import json
+import sys
+import uuid
+
+_BENCH_PATH = "/root/bridge_bench.py"
+
+def _bench_config(args, name, command) -> dict:
+    from wa_cli.docker_cli import WA_LABEL
+
+    script = get_resolved_path("scripts/bridge_bench.py", wa_cli_relative=True)
+    config = {
+        "name": name,
+        "image": args.image,
+        "volumes": [(script, _BENCH_PATH)],
+        "publish": [],
+        "networks": ["host" if args.net_mode == "host" else args.network],
+        "ip": None,
+        "envs": {"PYTHONUNBUFFERED": "1"},
+        "labels": {WA_LABEL: "true"},
+        "command": ["python", _BENCH_PATH, "--port", str(args.port), "--protocol", args.protocol, *command],
+    }
+    return config
+
+def _client_args(args, host, port) -> list:
+    return ["--port", str(port), "--protocol", args.protocol, "client", "--host", host,
+            "--sizes", args.sizes, "--rates", args.rates, "--duration", str(args.duration), "--timeout", str(args.timeout)]
+
+def _network_mtu(network):
+    options = docker.network.inspect(network).options or {}
+    return int(options.get("com.docker.network.driver.mtu", 1500))
+
+def run_bench(args):
+    """Command to benchmark the latency and throughput of the simulator bridge.
+
+    As described in `wa docker run`, the `wa_simulator` communicates with external entities (i.e. the control stack)
+    over port 5555. This command measures that path so changes to it (i.e. bridge vs host networking or a different
+    MTU) can be compared with a repeatable number. An echo endpoint is started in a container and a client sends
+    timestamped messages to it at a fixed rate, for every combination of `--sizes` and `--rates`, from two places:
+
+    - `host-container`: From the host to the container through its published port.
+    - `container-container`: From a second container on the same network.
+
+    For each combination, the p50/p99/max round trip latency, the achieved throughput and the number of dropped messages
+    (responses that didn't arrive within `--timeout` seconds) are reported as JSON, along with the network's MTU.
+
+    ```bash
+    wa bridge bench --sizes 64,1024,65000 --rates 100,1000,10000 --output bridge.json
+    wa bridge bench --net-mode host --output host.json
+    ```
+
+    The endpoints only need the standard library, so any image with `python` works (`--image`).
+    """
+    LOGGER.info("Running 'bridge bench' entrypoint...")
+
+    from wa_cli.docker_cli import _try_create_network, _resolve_ip
+
+    args.paths = args.paths or ["host-container", "container-container"]
+
+    echo = _bench_config(args, f"wa-bench-echo-{uuid.uuid4().hex[:6]}", ["echo"])
+    if args.net_mode == "bridge":
+        echo["publish"] = [["auto", f"{args.port}/{args.protocol}"]]
+        echo["ip"] = "auto"
+
+    LOGGER.debug(f"Running the echo endpoint with the following arguments: {dumps_dict(echo)}")
+    if args.dry_run:
+        return
+
+    if args.net_mode == "bridge":
+        _try_create_network(args.network)
+    leased_ip = _resolve_ip(echo)
+    host_port = resolve_ports(echo).get(f"{args.port}/{args.protocol}", args.port)
+
+    report = {
+        "net_mode": args.net_mode,
+        "network": args.network if args.net_mode == "bridge" else "host",
+        "mtu": _network_mtu(args.network) if args.net_mode == "bridge" else None,
+        "protocol": args.protocol,
+        "results": {},
+    }
+    try:
+        docker.run(**echo, detach=True, remove=True)
+
+        if "host-container" in args.paths:
+            LOGGER.info("Benchmarking the host to container path...")
+            script = get_resolved_path("scripts/bridge_bench.py", wa_cli_relative=True)
+            output = subprocess.run([sys.executable, script, *_client_args(args, "127.0.0.1", host_port)], stdout=subprocess.PIPE, check=True).stdout
+            report["results"]["host-container"] = json.loads(output)
+
+        if "container-container" in args.paths:
+            LOGGER.info("Benchmarking the container to container path...")
+            host = "127.0.0.1" if args.net_mode == "host" else leased_ip
+            client = _bench_config(args, f"wa-bench-client-{uuid.uuid4().hex[:6]}", [])
+            client["command"] = ["python", _BENCH_PATH, *_client_args(args, host, args.port)]
+            output = docker.run(**client, remove=True)
+            report["results"]["container-container"] = json.loads(output)
+    finally:
+        docker.container.remove(echo["name"], force=True)
+        if leased_ip is not None:
+            from wa_cli.utils.ipam import release_ip
+            release_ip(args.network, leased_ip)
+
+    output = json.dumps(report, indent=4)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+        LOGGER.info(f"Wrote the results to '{args.output}'.")
+    print(output)
+
+def init(subparser):
+    """Initializer method for the `bridge` entrypoint.
+
+    This entrypoint serves as a mechanism for inspecting the bridge between the simulator and external entities.
+    """
+    LOGGER.debug("Initializing 'bridge' entrypoint...")
+
+    # Create some entrypoints for additional commands
+    subparsers = subparser.add_subparsers(required=False)
+
+    # Bench subcommand
+    bench = subparsers.add_parser("bench", description="Benchmark the latency and throughput of the simulator bridge.")
+    bench.add_argument("--image", type=str, help="The image to run the endpoints in. Must have python installed.", default="python:3.9-slim")
+    bench.add_argument("--network", type=str, help="The network to benchmark.", default="wa")
+    bench.add_argument("--net-mode", type=str, choices=["bridge", "host"], help="Whether the endpoints use the bridge network or host networking.", default="bridge")
+    bench.add_argument("--port", type=int, help="The port the echo endpoint listens on.", default=5555)
+    bench.add_argument("--protocol", type=str, choices=["udp", "tcp"], help="The transport to benchmark.", default="udp")
+    bench.add_argument("--path", type=str, dest="paths", action="append", choices=["host-container", "container-container"], help="The paths to benchmark. Defaults to both.", default=None)
+    bench.add_argument("--sizes", type=str, help="Comma separated list of message sizes in bytes.", default="64,1024,16384")
+    bench.add_argument("--rates", type=str, help="Comma separated list of message rates in messages per second.", default="100,1000")
+    bench.add_argument("--duration", type=float, help="How long to send for at each size and rate, in seconds.", default=2)
+    bench.add_argument("--timeout", type=float, help="How long to wait for outstanding responses before counting them as dropped.", default=1)
+    bench.add_argument("--output", type=str, help="Also write the results to this file.", default=None)
+    bench.set_defaults(cmd=run_bench)
+
+    return subparser
@@ -0,0 +1,544 @@
+#
+# MIT License
+#
+# Copyright (c) 2018-2021 Wisconsin Autonomous
+#
+# See https://wa.wisc.edu
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""
+CLI command that handles working with the AV development environment
+"""
+
+# Imports from wa_cli
+from wa_cli.utils.logger import LOGGER
+from wa_cli.utils.files import search_upwards_for_file
+from wa_cli.utils.state import locked_state, get_state_path
+from wa_cli.utils.engine import inspect_container
+from wa_cli.utils.dev_cache import add_cache_volumes, chown_cache_volumes, cache_stats, prune_cache_volumes, CACHE_KINDS
+from wa_cli.utils.build_context import fingerprint_build
+from wa_cli.utils.buildkit import ensure_builder, add_build_cache, rotate_build_cache, run_build, summarize_build, print_build_summary
+
+# Imports from avtoolbox
+from avtoolbox.utils.yaml_parser import YAMLParser
+from avtoolbox.utils.docker import get_docker_client_binary_path, run_docker_cmd, compose_is_installed, DockerComposeClient, find_available_port, parse_devices
+
+# General imports
+from pathlib import Path
+import avtoolbox.dev
+import hashlib
+import ast
+import shutil
+import yaml
+import json
+import sys
+import os
+import re
+
+_DEV_STATE = "dev.json"
+
+_DEFAULT_COMPOSE_YML = os.path.realpath(os.path.join(avtoolbox.dev.__file__, "..", "docker", "default-compose.yml"))
+
+# The daemon's configuration decides which runtimes are available to the generated compose file
+_DOCKER_DAEMON_JSON = "/etc/docker/daemon.json"
+
+# Attributes of the .avtoolbox.yml file that aren't part of the docker-compose file
+_CUSTOM_ATTRS = ["project", "user", "default_services", "optional_devices"]
+
+def _check_avtoolbox(avtoolbox_yml, *args, default=None):
+    # Gets a (nested) attribute of the .avtoolbox.yml file. Logs an error and returns None if it's required and missing.
+    if not avtoolbox_yml.contains(*args):
+        if default is None:
+            LOGGER.fatal(f"'{'.'.join(args)}' must be in '.avtoolbox.yml'.")
+            return None
+        return default
+    return avtoolbox_yml.get(*args)
+
+def _merge_dictionaries(source: dict, destination: dict) -> dict:
+    # Recursively merges source into destination. Values in source take precedence.
+    for key, value in source.items():
+        if isinstance(value, dict):
+            _merge_dictionaries(value, destination.setdefault(key, {}))
+        else:
+            destination[key] = value
+    return destination
+
+def _load_project():
+    # Finds and parses the .avtoolbox.yml file. Returns None if it isn't valid.
+    LOGGER.info("Searching for '.avtoolbox.yml'...")
+    conf = search_upwards_for_file('.avtoolbox.yml')
+    if conf is None:
+        LOGGER.fatal("No .avtoolbox.yml file was found in this directory or any parent directories. Make sure you are running this command in an avtoolbox compatible repository.")
+        return None
+    LOGGER.info(f"Found '.avtoolbox.yml' at {conf}.")
+
+    avtoolbox_yml = YAMLParser(conf)
+    project = _check_avtoolbox(avtoolbox_yml, "project")
+    if project is None or _check_avtoolbox(avtoolbox_yml, "services", "dev") is None:
+        return None
+    if any(c.isupper() for c in project):
+        LOGGER.fatal(f"'project' is set to '{project}' which is not allowed since it has capital letters. Please choose a name with only lowercase.")
+        return None
+
+    return conf.parent, avtoolbox_yml, project
+
+def _render_template(template: str, values: dict) -> str:
+    # The default file is written as a python f-string. Rather than evaluating it, the paths it builds relative to
+    # avtoolbox's installation are resolved up front, which leaves plain fields that str.format fills in.
+    def resolve(match):
+        parts = ast.literal_eval(f"({match.group(1)},)")
+        return os.path.realpath(os.path.join(avtoolbox.dev.__file__, *parts)).replace("{", "{{").replace("}", "}}")
+
+    template = re.sub(r"\{os\.path\.realpath\(os\.path\.join\(__file__, (.*?)\)\)\}", resolve, template)
+    template = re.sub(r"\{str\((\w+)\)\}", r"{\1}", template)
+    return template.format(**values)
+
+def _generate_compose(root, avtoolbox_yml, project) -> dict:
+    # Merges the .avtoolbox.yml file into the default docker-compose file shipped with avtoolbox
+    is_posix = lambda: os.name == "posix"
+    username = _check_avtoolbox(avtoolbox_yml, "user", "username", default=project)
+    uid = _check_avtoolbox(avtoolbox_yml, "user", "uid", default=os.getuid() if is_posix() else 1000)
+    gid = _check_avtoolbox(avtoolbox_yml, "user", "gid", default=os.getgid() if is_posix() else 1000)
+
+    info, err = run_docker_cmd("--debug", "info", stdout=-1, stderr=-1)
+    avail_runtimes = info.split("Runtimes: ")[1].split('\n')[0].split(' ')
+    runtime_name = info.split("Default Runtime: ")[1].split('\n')[0].split(' ')[0]
+    if "nvidia" in avail_runtimes:
+        runtime_name = "nvidia"
+
+    LOGGER.debug("Reading the default-compose.yml file...")
+    with open(_DEFAULT_COMPOSE_YML, "r") as f:
+        template = f.read()
+    values = dict(project=project, root=root, username=username, uid=uid, gid=gid, runtime_name=runtime_name)
+    default_configs = YAMLParser(text=_render_template(template, values)).get_data()
+
+    temp = {k: v for k, v in avtoolbox_yml.get_data().items() if k not in _CUSTOM_ATTRS}
+    return _merge_dictionaries(temp, default_configs)
+
+def _compose_key(root, project, net_mode) -> str:
+    # Hashes every input of the generated compose file, except for 'docker info' which is what's slow to get
+    hasher = hashlib.sha256()
+    for path in [root / ".avtoolbox.yml", _DEFAULT_COMPOSE_YML, _DOCKER_DAEMON_JSON]:
+        hasher.update(Path(path).read_bytes() if Path(path).is_file() else b"")
+    ids = [os.getuid(), os.getgid()] if os.name == "posix" else []
+    hasher.update(json.dumps([str(root), project, net_mode, ids]).encode())
+    return hasher.hexdigest()
+
+def _get_compose(root, avtoolbox_yml, project, net_mode) -> dict:
+    # Generating the compose file is slow (it calls 'docker info'), so it's cached until one of its inputs changes
+    key = _compose_key(root, project, net_mode)
+    cached = get_state_path("compose", f"{key}.json")
+    if cached.is_file():
+        LOGGER.debug(f"Using the cached compose file '{cached}'...")
+        with open(cached, "r") as f:
+            return json.load(f)
+
+    docker_compose = _generate_compose(root, avtoolbox_yml, project)
+    _apply_net_mode(docker_compose, net_mode)
+    with open(cached, "w") as f:
+        json.dump(docker_compose, f)
+
+    # Only keep the latest compose file of each project
+    with locked_state(_DEV_STATE) as state:
+        entry = state.setdefault(str(root), {})
+        previous, entry["compose"] = entry.get("compose"), key
+    if previous is not None and previous != key and get_state_path("compose", f"{previous}.json").is_file():
+        get_state_path("compose", f"{previous}.json").unlink()
+    return docker_compose
+
+def _read_dockerignore() -> str:
+    default_dockerignore = os.path.realpath(os.path.join(avtoolbox.dev.__file__, "..", "docker", "dockerignore"))
+    with open(default_dockerignore, "r") as f:
+        dockerignore = f.read()
+    existing_dockerignore = search_upwards_for_file('.dockerignore')
+    if existing_dockerignore is not None:
+        with open(existing_dockerignore, "r") as f:
+            dockerignore += f.read()
+    return dockerignore
+
+def _apply_net_mode(docker_compose: dict, net_mode: str):
+    # Rewrites the services for the requested networking mode
+    services = docker_compose["services"]
+    if net_mode == "host":
+        # Every service shares the host's network stack, so there's nothing to publish or route
+        for service in services.values():
+            service["network_mode"] = "host"
+            for key in ("networks", "ports", "hostname"):
+                service.pop(key, None)
+        docker_compose.pop("networks", None)
+
+        # The vnc container is then reachable on localhost
+        env = services["dev"].get("environment", [])
+        services["dev"]["environment"] = [e if not e.startswith("DISPLAY=") else "DISPLAY=localhost:0.0" for e in env]
+    elif net_mode == "shared":
+        # Let simulations join the dev container's network and ipc namespaces (see 'wa docker run --net-mode shared')
+        services["dev"]["ipc"] = "shareable"
+        services["dev"].setdefault("shm_size", "1gb")
+
+def _fingerprint_services(root, docker_compose: dict, services: list) -> dict:
+    # Fingerprints the build inputs of each of the services that's built from a Dockerfile
+    dockerignore = _read_dockerignore()
+    fingerprints = {}
+    with locked_state(_DEV_STATE) as state:
+        for name in services:
+            build = docker_compose["services"].get(name, {}).get("build")
+            if build is None:
+                continue
+            context = (root / (build if isinstance(build, str) else build.get("context", "."))).resolve()
+            # The generated .dockerignore is written next to the compose file, so it only applies to that context
+            fingerprints[name] = fingerprint_build(root, build, dockerignore if context == root.resolve() else None, state=state)
+    return fingerprints
+
+def _fast_attach(args) -> bool:
+    # Execs a shell in the dev container the last attach went to, if it's still running. Returns False if it can't.
+    conf = search_upwards_for_file('.avtoolbox.yml')
+    docker_binary = shutil.which("docker")
+    if conf is None or docker_binary is None:
+        return False
+    with locked_state(_DEV_STATE) as state:
+        entry = state.get(str(conf.parent), {}).get("attach")
+    if entry is None or entry["config"] != hashlib.sha256(conf.read_bytes()).hexdigest():
+        return False
+
+    try:
+        container = inspect_container(entry["container"])
+    except OSError as e:
+        LOGGER.debug(f"Couldn't inspect '{entry['container']}' through the docker socket: {e}")
+        return False
+    if container is None or not container["State"]["Running"]:
+        return False
+
+    LOGGER.info(f"Attaching to '{entry['container']}'...")
+    if args.dry_run:
+        return True
+    tty = ["-it"] if sys.stdin.isatty() else ["-i"]
+    os.execv(docker_binary, ["docker", "exec", *tty, entry["container"], entry["shell"]])
+
+def run_dev(args):
+    """Command that essentially wraps `docker compose` to automatically build, spin up, attach, and tear down the AV development environment.
+
+    The `dev` command will search for a file called `.avtoolbox.yml`. This is a hidden file, and it defines some custom
+    configurations for the development environment. It allows users to quickly start and attach to the AV development environment
+    based on a shared docker-compose file and any Dockerfile build configurations.
+
+    There are four possible options that can be used using the `dev` subcommand:
+    `build`, `up`, `down`, and `attach`. For example, if you'd like to build the container, you'd run
+    the following command:
+
+    ```bash
+    wa dev --build
+    ```
+
+    If you'd like to build, start the container, then attach to it, run the following command:
+
+    ```bash
+    wa dev --build --up --attach
+    # OR (shorthand)
+    wa dev -b -u -a
+    # OR
+    wa dev -bua
+    ```
+
+    If no arguments are passed, this is equivalent to the following command:
+
+    ```bash
+    wa dev --up --attach
+    ```
+
+    If desired, pass `--down` to stop the container. Further, if the container is already running, it isn't
+    recreated when its image is rebuilt; pass `--down --up` to recreate it.
+
+    By default, the services communicate over a bridge network. Closed-loop control is sensitive to the
+    latency this adds, so pass `--net-mode host` to run every service with host networking (the `DISPLAY` of the
+    `dev` service then points at `localhost`), or `--net-mode shared` to make the `dev` container's ipc namespace
+    shareable so a simulation can join its network and ipc namespaces (and `/dev/shm`) with
+    `wa docker run --net-mode shared`.
+
+    When spinning up, the build inputs of each service (its build configuration, its Dockerfile and every file in
+    its build context that isn't excluded by `.dockerignore`) are fingerprinted, and the services whose inputs changed
+    since they were last built are rebuilt first. This way the environment is never started with stale images, and
+    services that didn't change aren't rebuilt. Pass `--no-auto-build` to skip this check. Passing `--build` always
+    builds every selected service.
+
+    The generated docker-compose file is cached in the `wa_cli` state directory until `.avtoolbox.yml`, the
+    avtoolbox defaults, the docker daemon configuration (`/etc/docker/daemon.json`), the user or `--net-mode` change,
+    so repeated invocations (i.e. `wa dev -a`) don't have to regenerate it.
+
+    Each attach records the container and shell it used. `wa dev --attach` (without `--build`, `--up` or `--down`)
+    then checks that container directly through the docker socket and execs the shell in it, without going through
+    compose. If the container isn't running (or `.avtoolbox.yml` changed), the regular flow is used instead.
+
+    Services built for a ROS workspace (with a `ROS_WORKSPACE` build arg) keep ccache and the colcon `build`,
+    `install` and `log` directories of the workspace in named volumes (one set per project, service and workspace).
+    They survive `wa dev --down`, so rebuilding the workspace in a recreated container is incremental. CMake compiles
+    through ccache (via `CMAKE_<LANG>_COMPILER_LAUNCHER` and the `cmake-args` of a colcon defaults file set with
+    `COLCON_DEFAULTS_FILE`) if it's installed in the image, i.e. by adding `ccache` to the `APT_DEPENDENCIES` build
+    arg in `.avtoolbox.yml`. Run
+    `wa dev cache stats` to see the ccache hit rates and `wa dev cache prune` to remove the volumes. Pass
+    `--no-cache-volumes` to not use them.
+
+    After a build, the time spent in each stage and the slowest steps are printed (pass `--build-report` to also
+    write them to a json file). To reuse the build cache across machines (i.e. on CI runners), pass `--cache-dir`:
+    each service imports its cache from, and exports it to, `<cache-dir>/<project>/<service>`. Restoring that
+    directory before building means only the steps after the first changed file are rebuilt. Exporting requires a
+    `docker-container` buildx builder, which is created (as `wa-cli`) if it doesn't exist.
+
+    ```bash
+    wa dev --build --cache-dir ~/.cache/wa-build --build-report build.json
+    ```
+    """
+    LOGGER.info("Running 'dev' entrypoint...")
+
+    # Attaching to a container that's already running doesn't need compose at all
+    if args.attach and not (args.build or args.up or args.down) and _fast_attach(args):
+        return
+
+    # Check docker and docker compose are installed
+    if get_docker_client_binary_path() is None:
+        LOGGER.fatal("Docker was not found to be installed. Cannot continue.")
+        return
+    if not compose_is_installed():
+        LOGGER.fatal("The command 'docker compose' is not installed. See http://projects.sbel.org/avtoolbox/tutorials/using_the_development_environment.html for more information.")
+        return
+
+    project = _load_project()
+    if project is None:
+        return
+    root, avtoolbox_yml, project = project
+    default_services = _check_avtoolbox(avtoolbox_yml, "default_services", default=["dev"])
+    optional_devices = _check_avtoolbox(avtoolbox_yml, "optional_devices", default={})
+
+    docker_compose = _get_compose(root, avtoolbox_yml, project, args.net_mode)
+    cache_volumes = {} if args.no_cache_volumes else add_cache_volumes(docker_compose, root, project, args.ccache_size)
+
+    # If no command is passed, start up the container and attach to it
+    cmds = [args.build, args.up, args.down, args.attach]
+    if all(not c for c in cmds):
+        args.up = True
+        args.attach = True
+
+    # Get the services we'll use
+    if args.services is None: args.services = default_services
+    if 'dev' not in args.services and 'all' not in args.services and args.attach:
+        LOGGER.fatal("'--services' requires 'dev' (or 'all') when attach is set to true.")
+        return
+    args.services = args.services if 'all' not in args.services else []
+
+    # Only rebuild the services whose build inputs changed since they were last built
+    fingerprints, build_services = {}, args.services
+    if args.build or (args.up and not args.no_auto_build):
+        fingerprints = _fingerprint_services(root, docker_compose, args.services or list(docker_compose["services"]))
+    if not args.build and fingerprints:
+        with locked_state(_DEV_STATE) as state:
+            built = state.get(str(root), {}).get("fingerprints", {})
+        build_services = [name for name, fingerprint in fingerprints.items() if built.get(name) != fingerprint]
+        if build_services:
+            LOGGER.info(f"The build inputs of {', '.join(build_services)} changed since they were last built.")
+            args.build = True
+
+    cache_dirs = []
+    if args.build and args.cache_dir is not None:
+        cache_dirs = add_build_cache(docker_compose, args.cache_dir, project)
+
+    if args.dry_run:
+        return
+
+    compose_file = root / "docker-compose.yml"
+    dockerignore_file = root / ".dockerignore"
+    try:
+        LOGGER.info(f"Writing to '{compose_file}'...")
+        with open(compose_file, "w") as f:
+            yaml.dump(docker_compose, f)
+        with open(dockerignore_file, "w") as f:
+            f.write(_read_dockerignore())
+
+        client = DockerComposeClient(project=project, services=args.services, compose_file=str(compose_file))
+
+        if args.down:
+            LOGGER.info("Tearing down...")
+            client.run("down")
+
+        if args.build:
+            LOGGER.info("Building...")
+            env = dict(os.environ)
+            if cache_dirs:
+                env["BUILDX_BUILDER"] = ensure_builder()
+            no_cache = ["--no-cache"] if args.no_cache else []
+            cmd = [str(get_docker_client_binary_path()), "compose", "-p", project, "-f", str(compose_file), "build", *no_cache, *build_services]
+            returncode, steps = run_build(cmd, env=env)
+            rotate_build_cache(cache_dirs, success=returncode == 0)
+
+            summary = summarize_build(steps)
+            print_build_summary(summary)
+            if args.build_report is not None:
+                with open(args.build_report, "w") as f:
+                    json.dump(summary, f, indent=4)
+
+            if returncode != 0:
+                LOGGER.fatal(f"Build failed with exit code {returncode}.")
+                return
+
+            with locked_state(_DEV_STATE) as state:
+                built = state.setdefault(str(root), {}).setdefault("fingerprints", {})
+                built.update({name: fingerprints[name] for name in (build_services or fingerprints) if name in fingerprints})
+
+        if args.up:
+            # Don't spin up again if the dev container is already running
+            stdout, stderr = client.run("ps", "--services", *args.services, "--filter", "status=running", stdout=-1, stderr=-1)
+            if "no such service: dev" not in stderr:
+                LOGGER.warn("'dev' service is already running. If you didn't explicitly call '--up', you can safely ignore this warning.")
+                if args.build:
+                    LOGGER.warn("The running containers use the previous images. Run 'wa dev --down --up' to recreate them.")
+                args.up = False
+
+        if args.up:
+            LOGGER.info("Spinning up...")
+
+            # Avoid port conflicts with other projects and add the optional devices that are available
+            config = YAMLParser(text=client.run("config", stdout=-1)[0])
+            for service_name, service in config.get_data()['services'].items():
+                for ports in service.get('ports', []):
+                    port = find_available_port(ports['published'])
+                    if port is None:
+                        LOGGER.fatal(f"PORT CONFLICT: Could not find an available port within range of '{ports['published']}' to use for the '{service_name}' service.")
+                        return
+                    elif port != ports['published']:
+                        LOGGER.warn(f"PORT CONFLICT: Adjusted port mapping for '{service_name}' service from '{ports['published']}' to '{port}'.")
+                        ports['published'] = port
+
+                for device in parse_devices(optional_devices.get(service_name, [])):
+                    if os.path.exists(device["PathOnHost"]):
+                        service.setdefault('devices', []).append(device['Original'])
+
+            with open(compose_file, "w") as f:
+                yaml.dump(config.get_data(), f)
+
+            client.run("up", "-d")
+            chown_cache_volumes(docker_compose, {name: paths for name, paths in cache_volumes.items() if not args.services or name in args.services})
+
+        if args.attach:
+            LOGGER.info("Attaching...")
+
+            # Get the shell we'll use
+            dev_name = docker_compose["services"]["dev"]["container_name"]
+            env, err = run_docker_cmd("exec", dev_name, "env", stdout=-1, stderr=-1)
+            if err:
+                if "Error: No such container: " in err:
+                    LOGGER.fatal("Please rerun the command with '--up'. The container cannot be attached to since it hasn't been created.")
+                else:
+                    LOGGER.fatal(f"Got error while trying to attach to the container: '{err}'.")
+                return
+            shellcmd = env.split("USERSHELLPATH=")[1].split('\n')[0]
+
+            # Remember the container so the next attach can skip straight to it
+            with locked_state(_DEV_STATE) as state:
+                config = hashlib.sha256((root / ".avtoolbox.yml").read_bytes()).hexdigest()
+                state.setdefault(str(root), {})["attach"] = {"container": dev_name, "shell": shellcmd, "config": config}
+
+            client.run("exec", "dev", exec_cmd=shellcmd)
+    finally:
+        if dockerignore_file.is_file():
+            dockerignore_file.unlink()
+        if not args.keep_yml and compose_file.is_file():
+            compose_file.unlink()
+
+def run_cache_stats(args):
+    """Command to print the ccache hit rate and the size of the build cache volumes of `wa dev`
+
+    The stats of the current project are printed; pass `--all` to print the stats of every project.
+    """
+    LOGGER.info("Running 'dev cache stats' entrypoint...")
+
+    project = None
+    if not args.all:
+        project = _load_project()
+        if project is None:
+            return
+        project = project[2]
+
+    if args.dry_run:
+        return
+
+    print(f"{'PROJECT':<16}  {'SERVICE':<10}  {'WORKSPACE':<12}  {'HITS':>7}  {'MISSES':>7}  {'HIT RATE':>8}  " + "  ".join(f"{kind.upper():>8}" for kind in CACHE_KINDS))
+    for entry in cache_stats(project):
+        hit_rate = f"{entry['hit_rate']:.1%}" if entry["hit_rate"] is not None else "-"
+        sizes = "  ".join(f"{entry['sizes'].get(kind, 0) / 1024 ** 2:>7.0f}M" for kind in CACHE_KINDS)
+        print(f"{entry['project']:<16}  {entry['service']:<10}  {entry['workspace']:<12}  {str(entry['hits']):>7}  {str(entry['misses']):>7}  {hit_rate:>8}  {sizes}")
+
+def run_cache_prune(args):
+    """Command to remove the build cache volumes of `wa dev`
+
+    The volumes of the current project are removed; pass `--all` to remove the volumes of every project. Volumes
+    that are mounted in a container are kept, so run `wa dev --down` first to remove them.
+    """
+    LOGGER.info("Running 'dev cache prune' entrypoint...")
+
+    project = None
+    if not args.all:
+        project = _load_project()
+        if project is None:
+            return
+        project = project[2]
+
+    if args.dry_run:
+        return
+
+    removed = prune_cache_volumes(project)
+    LOGGER.info(f"Removed {len(removed)} cache volume(s).")
+
+def init(subparser):
+    """Initializer method for the `dev` entrypoint
+
+    This entrypoint provides easy access to the AV development environment. The dev environment
+    leverages [Docker](https://docker.com) to allow interoperability across operating systems. `docker compose`
+    is used to build, spin up, attach, and tear down the containers. The `dev` entrypoint will basically wrap
+    the `docker compose` commands to make it easier to customize the workflow to work best for AV.
+
+    The `.avtoolbox.yml` format and the default services are the ones used by [avtoolbox](https://pypi.org/project/avtoolbox/).
+    """
+    LOGGER.debug("Initializing 'dev' entrypoint...")
+
+    subparser.add_argument("-b", "--build", action="store_true", help="Build the env.", default=False)
+    subparser.add_argument("-u", "--up", action="store_true", help="Spin up the env.", default=False)
+    subparser.add_argument("-d", "--down", action="store_true", help="Tear down the env.", default=False)
+    subparser.add_argument("-a", "--attach", action="store_true", help="Attach to the env.", default=False)
+    subparser.add_argument("--no-cache", action="store_true", help="Build with no cache. Only used if --build is set to True.", default=False)
+    subparser.add_argument("--no-auto-build", action="store_true", help="Don't rebuild the services whose build inputs changed when spinning up.", default=False)
+    subparser.add_argument("--cache-dir", type=str, help="Import and export the build cache of each service from this directory. Only used if --build is set to True.", default=None)
+    subparser.add_argument("--build-report", type=str, help="Write the per stage and per step build times to this json file. Only used if --build is set to True.", default=None)
+    subparser.add_argument("--keep-yml", action="store_true", help="Don't delete the generated docker-compose file.", default=False)
+    subparser.add_argument("--services", nargs='+', help="The services to use. Defaults to 'all' or whatever 'default_services' is set to in .avtoolbox.yml. 'dev' or 'all' is required for the 'attach' argument. If 'all' is passed, all the services are used.", default=None)
+    subparser.add_argument("--net-mode", type=str, choices=["bridge", "host", "shared"], help="How the services are networked. 'host' uses host networking and 'shared' lets simulations join the dev container's network and ipc namespaces.", default="bridge")
+    subparser.add_argument("--no-cache-volumes", action="store_true", help="Don't keep ccache and the colcon build, install and log directories in volumes.", default=False)
+    subparser.add_argument("--ccache-size", type=str, help="The maximum size of the ccache directory of each service.", default="5G")
+    subparser.set_defaults(cmd=run_dev)
+
+    # Subcommands that manage the build cache volumes
+    subparsers = subparser.add_subparsers(required=False)
+    cache = subparsers.add_parser("cache", description="Manage the ccache and colcon build volumes of the development environment.")
+    cache_subparsers = cache.add_subparsers(required=False)
+    cache_stats = cache_subparsers.add_parser("stats", description="Print the ccache hit rate and the size of the build cache volumes.")
+    cache_stats.add_argument("--all", action="store_true", help="Print the stats of every project instead of the current one.", default=False)
+    cache_stats.set_defaults(cmd=run_cache_stats)
+    cache_prune = cache_subparsers.add_parser("prune", description="Remove the build cache volumes that aren't in use.")
+    cache_prune.add_argument("--all", action="store_true", help="Remove the volumes of every project instead of the current one.", default=False)
+    cache_prune.set_defaults(cmd=run_cache_prune)
+
+    return subparser
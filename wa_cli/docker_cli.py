@@ -1,6 +1,9 @@
 # Imports from wa_cli
 from wa_cli.utils.logger import LOGGER, dumps_dict
+from wa_cli.utils.ports import resolve_ports
+from wa_cli.utils.cpus import resolve_cpus, release_cores, parse_cpuset, AUTO as CPUS_AUTO
 from wa_cli.utils.files import file_exists, get_resolved_path
+from wa_cli.utils.images import pin_image
 from wa_cli.utils.dependencies import check_for_dependency
 
 # Docker imports
@@ -9,6 +12,67 @@ from python_on_whales import docker, exceptions as docker_exceptions
 # General imports
 import argparse
 import pathlib
+import json
+import uuid
+import os
+import sys
+
+SIM_IP = "172.20.0.3"
+"""The address preferred for the simulation container."""
+
+WA_LABEL = "wa_cli.managed"
+"""Label attached to every container started by the ``wa_cli``."""
+
+VNC_LABEL = "wa_cli.vnc"
+"""Label attached to every vnc container started by the ``wa_cli``."""
+
+HEADLESS_ENVS = {"MPLBACKEND": "Agg", "QT_QPA_PLATFORM": "offscreen", "SDL_VIDEODRIVER": "dummy"}
+"""Environment variables that make common rendering backends draw offscreen instead of to a display."""
+
+HEADLESS_WRAPPER = """
+if command -v Xvfb >/dev/null 2>&1; then
+    Xvfb :99 -screen 0 "${WA_RESOLUTION}x24" -nolisten tcp >/dev/null 2>&1 &
+    xvfb=$!
+    export DISPLAY=:99
+    for i in $(seq 50); do [ -e /tmp/.X11-unix/X99 ] && break; sleep 0.1; done
+    if [ -n "$WA_RECORD" ]; then
+        if command -v ffmpeg >/dev/null 2>&1; then
+            ffmpeg -loglevel error -y -f x11grab -framerate "$WA_RECORD_FPS" -video_size "$WA_RESOLUTION" -i :99 "$WA_RECORD" </dev/null &
+            ffmpeg=$!
+        else
+            echo "ffmpeg was not found in the image. The run will not be recorded." >&2
+        fi
+    fi
+else
+    echo "Xvfb was not found in the image. Running without a display." >&2
+fi
+"$@"
+code=$?
+if [ -n "$ffmpeg" ]; then kill -INT "$ffmpeg"; wait "$ffmpeg"; fi
+if [ -n "$xvfb" ]; then kill "$xvfb"; fi
+exit $code
+"""
+"""Shell wrapper that runs a command against an in-container virtual framebuffer, optionally recording it."""
+
+COPY_OUT_DIR = "/root/wa_copy_out"
+"""Where the host directories that scratch paths are copied out to are mounted in the container."""
+
+RECORD_DIR = "/root/record"
+"""Where the host directory of the '--record' video is mounted in the container."""
+
+COPY_OUT_WRAPPER = """
+"$@"
+code=$?
+i=0
+for src in $WA_COPY_OUT; do
+    dst="/root/wa_copy_out/$i"
+    if [ -d "$src" ]; then cp -a "$src/." "$dst/"; elif [ -e "$src" ]; then cp -a "$src" "$dst/"; fi
+    if [ -n "$WA_COPY_OUT_OWNER" ]; then chown -R "$WA_COPY_OUT_OWNER" "$dst"; fi
+    i=$((i + 1))
+done
+exit $code
+"""
+"""Shell wrapper that runs a command, then copies the paths in ``$WA_COPY_OUT`` to the mounted host directories."""
 
 def _parse_args(args):
     # First, populate a config dictionary with the command line arguments
@@ -24,12 +88,16 @@ def _parse_args(args):
     # Data folders
     config["volumes"] = []
     # If the path doesn't have a ':', make the container dir at /root/<dir>
+    # A trailing ':ro' (or '--read-only-data') mounts the data read-only
     # Also, resolve the paths to be absolute
     for data in args.data:
         split_data = data.split(':')
+        mode = split_data.pop() if len(split_data) > 1 and split_data[-1] in ("ro", "rw") else None
+        if getattr(args, "read_only_data", False):
+            mode = "ro"
         hostfile = get_resolved_path(split_data[0], return_as_str=False)
         containerfile = split_data[1] if len(split_data) == 2 else f"/root/{hostfile.name}"
-        vol = (str(hostfile), containerfile)
+        vol = (str(hostfile), containerfile, mode) if mode is not None else (str(hostfile), containerfile)
         config["volumes"].append(vol)
 
     # Ports
@@ -49,32 +117,358 @@ def _parse_args(args):
         variable, value = e.split("=")
         config["envs"][variable] = value
 
+    # Resource controls
+    # These are only set if requested, since other commands (i.e. 'docker vnc') reuse this method
+    for option in ["cpus", "memory", "shm_size"]:
+        if getattr(args, option, None) is not None:
+            config[option] = getattr(args, option)
+    if getattr(args, "cpuset", None) is not None:
+        config["cpuset_cpus"] = parse_cpuset(args.cpuset)
+    if getattr(args, "pin", None) is not None:
+        config["cpuset_cpus"] = CPUS_AUTO
+    for option in ["ulimit", "tmpfs"]:
+        if getattr(args, option, None):
+            config[option] = getattr(args, option)
+
+    # Label the container so other commands (i.e. 'wa docker logs --all') can find it
+    config["labels"] = {WA_LABEL: "true"}
+
     return config
 
-def _try_create_network(name, driver="bridge", ip="172.20.0.0", **kwargs):
+def _try_create_network(name, driver="bridge", ip="172.20.0.0", prefix=None, **kwargs):
     if len(docker.network.list({"name": name})) == 0:
         # If the network doesn't exist, create it
 
         # Determine the subnet from the ip
+        # If a prefix is passed, the subnet may span several /24s (i.e. a /22 for ~1000 containers)
         import ipaddress
-        ip_network = ipaddress.ip_network(f"{ip}/255.255.255.0", strict=False)
-        subnet = str(list(ip_network.subnets())[0])
+        if prefix is None:
+            ip_network = ipaddress.ip_network(f"{ip}/255.255.255.0", strict=False)
+            subnet = str(list(ip_network.subnets())[0])
+        else:
+            subnet = str(ipaddress.ip_network(f"{ip}/{prefix}", strict=False))
 
         return docker.network.create(name=name, driver=driver, subnet=subnet, **kwargs)
     return f"Network with name '{name}' has already been created."
 
+def _resolve_ip(config, preferred=None):
+    # Replaces an 'auto' ip with an address leased from the network. Returns the leased address, if any.
+    if config["ip"] != "auto":
+        return None
+    if config["networks"][0] is None:
+        config["ip"] = None
+        return None
+
+    from wa_cli.utils.ipam import allocate_ip
+
+    config["ip"] = allocate_ip(config["networks"][0], config["name"], preferred=preferred)
+    LOGGER.info(f"Using ip address '{config['ip']}' for '{config['name']}'.")
+    return config["ip"]
+
+def _has_auto_leases(config):
+    # Whether the container leases an ip, cores or host ports when it's created
+    from wa_cli.utils.ports import AUTO
+    return config["ip"] == "auto" or config.get("cpuset_cpus") == CPUS_AUTO or any(p[-2] == AUTO for p in config["publish"])
+
+def _fixed_ports(config):
+    from wa_cli.utils.ports import AUTO
+    return [p for p in config["publish"] if p[-2] != AUTO]
+
+def _print_ports(name, mapping):
+    for container, host in mapping.items():
+        print(f"{name}: {container} -> localhost:{host}")
+
+def _unique_name(name):
+    # Appends a suffix to a default container name if it's taken, so several runs can live side by side
+    if not docker.container.exists(name):
+        return name
+    i = 2
+    while docker.container.exists(f"{name}-{i}"):
+        i += 1
+    return f"{name}-{i}"
+
 def _does_container_exist(name):
     return len(docker.container.list(filters={"name": name})) != 0
 
-def _try_create_default_vnc(parse_args, log=False):
+def _container_ip(name, network):
+    return docker.container.inspect(name).network_settings.networks[network].ip_address
+
+def _find_stack():
+    # The dev container started by 'wa dev' is labelled with its compose service name
+    containers = docker.container.list(filters={"label": "com.docker.compose.service=dev"})
+    if len(containers) != 1:
+        LOGGER.error(f"Found {len(containers)} running 'dev' containers. Pass the one to join with '--stack'.")
+        return None
+    return containers[0].name
+
+def _apply_net_mode(config, args) -> bool:
+    """Update the container config for the `--net-mode` of a `docker run` style invocation.
+
+    `host` uses host networking and `shared` joins the network and ipc namespaces of the control stack container.
+    In both cases, static ips and published ports don't apply and are dropped. Returns `False` if the mode can't be applied.
+    """
+    if args.net_mode == "bridge":
+        return True
+
+    if config["publish"] or config["ip"] is not None:
+        LOGGER.info(f"Static ips and published ports don't apply with '--net-mode {args.net_mode}'. They will be ignored.")
+    config["publish"] = []
+    config["ip"] = None
+
+    if args.net_mode == "host":
+        config["networks"] = ["host"]
+        return True
+
+    stack = args.stack or _find_stack()
+    if stack is None:
+        return False
+    LOGGER.info(f"Joining the network and ipc namespaces of '{stack}'.")
+    config["networks"] = [f"container:{stack}"]
+    config["ipc"] = f"container:{stack}"
+
+    # The stack is already wired up to a display, so use the same one
+    args.no_vnc = True
+    if "DISPLAY" in config["envs"] and not args.dry_run:
+        env = dict(e.split("=", 1) for e in docker.container.inspect(stack).config.env)
+        if "DISPLAY" in env:
+            config["envs"]["DISPLAY"] = env["DISPLAY"]
+        else:
+            config["envs"].pop("DISPLAY")
+    return True
+
+def _get_image_digest(image):
+    # The image id is the digest of the image config, so it changes whenever the image contents change
+    if not docker.image.exists(image):
+        LOGGER.info(f"Pulling '{image}' to resolve its digest...")
+        docker.pull(image)
+    return docker.image.inspect(image).id
+
+def _try_create_default_vnc(parse_args, log=False, name="vnc", ip="172.20.0.4"):
     from types import SimpleNamespace
     args = SimpleNamespace()
     args.dry_run = parse_args.dry_run
-    args.name = "vnc"
+    args.name = name
     args.network = "wa"
-    args.ip = "172.20.0.4"
+    args.ip = ip
     run_vnc(args, log_if_created=log)
 
+def _prepare_run(args) -> dict:
+    """Build the container config for a `docker run` style invocation.
+
+    Resolves the script, applies the `--wasim` defaults (if requested) and maps the remaining command
+    line arguments to the keyword arguments expected by `docker.run`. `args` is updated in place.
+    """
+    # Grab the args to run
+    script = args.script
+    script_args = args.script_args
+
+    # Grab the file path
+    absfile = get_resolved_path(script, return_as_str=False)
+    file_exists(absfile, throw_error=True)
+    filename = absfile.name
+
+    # Create the command
+    cmd = f"python {filename} {' '.join(script_args)}"
+
+    # If args.wasim is True, we will use some predefined values that's typical for wa_simulator runs
+    if args.wasim:
+        LOGGER.info("Updating args with 'wasim' defaults...")
+        def up(arg, val, dval=None):
+            return val if arg == dval else arg
+        args.name = up(args.name, "wasim-docker")
+        args.image = up(args.image, "wiscauto/wa_simulator:latest")
+        args.port.insert(0, "auto:5555") # For bridge communication
+        if not args.no_vnc and not args.headless:
+            args.environment.insert(0, "DISPLAY=vnc:0.0")
+        args.environment.insert(0, "WA_DATA_DIRECTORY=/root/data")
+        args.network = up(args.network, "wa")
+        args.ip = up(args.ip, "auto")
+
+        # Try to find the data folder
+        if args.data is None:
+            LOGGER.warn("A data folder was not provided. You may want to pass one...")
+
+    config = _parse_args(args)
+    config["volumes"].append((str(absfile),f"/root/{filename}"))  # The actual python file # noqa
+    config["command"] = cmd.split(" ")
+
+    if args.headless:
+        _make_headless(config, args)
+    if args.scratch:
+        _add_scratch(config, args)
+
+    return config
+
+def _make_headless(config, args):
+    # Renders offscreen (or to an in-container framebuffer) instead of through a vnc container
+    args.no_vnc = True
+    config["envs"].pop("DISPLAY", None)
+    for key, value in HEADLESS_ENVS.items():
+        config["envs"].setdefault(key, value)
+
+    # The forkserver runs the script itself, so it can't be wrapped with a framebuffer
+    if getattr(args, "preload", None) is not None or getattr(args, "watch", False):
+        if args.record:
+            LOGGER.warn("'--record' can't be used with '--preload' or '--watch'. The run will not be recorded.")
+        return
+
+    config["envs"]["WA_RESOLUTION"] = args.resolution
+    if args.record:
+        record = get_resolved_path(args.record, return_as_str=False)
+        record.parent.mkdir(parents=True, exist_ok=True)
+        config["volumes"].append((str(record.parent), RECORD_DIR))
+        config["envs"]["WA_RECORD"] = f"{RECORD_DIR}/{record.name}"
+        config["envs"]["WA_RECORD_FPS"] = str(args.record_fps)
+        LOGGER.info(f"Recording the run to '{record}'.")
+    config["command"] = ["sh", "-c", HEADLESS_WRAPPER, "wa-headless", *config["command"]]
+
+def _add_scratch(config, args):
+    # Mounts memory backed scratch directories and copies selected paths out of them when the script exits
+    for scratch in args.scratch:
+        path, _, size = scratch.partition(":")
+        config.setdefault("tmpfs", []).append(f"{path}:size={size or args.scratch_size}")
+
+    if not args.copy_out:
+        return
+    if getattr(args, "preload", None) is not None or getattr(args, "watch", False):
+        LOGGER.warn("'--copy-out' can't be used with '--preload' or '--watch'. Nothing will be copied out.")
+        return
+
+    sources = []
+    for i, copy_out in enumerate(args.copy_out):
+        source, _, destination = copy_out.partition(":")
+        destination = get_resolved_path(destination or pathlib.Path(source).name, return_as_str=False)
+        destination.mkdir(parents=True, exist_ok=True)
+        config["volumes"].append((str(destination), f"{COPY_OUT_DIR}/{i}"))
+        sources.append(source)
+        LOGGER.info(f"'{source}' will be copied to '{destination}' when the script exits.")
+    config["envs"]["WA_COPY_OUT"] = " ".join(sources)
+    if hasattr(os, "getuid"):
+        config["envs"]["WA_COPY_OUT_OWNER"] = f"{os.getuid()}:{os.getgid()}"
+    config["command"] = ["sh", "-c", COPY_OUT_WRAPPER, "wa-copy-out", *config["command"]]
+
+def _use_data_volumes(config, args):
+    # Swaps the '--data' directories for content addressed, read-only named volumes
+    from wa_cli.utils.data_volumes import get_data_volume, evict_data_volumes
+    from wa_cli.utils.cache import parse_size
+
+    # The '--data' entries are the first volumes of the config
+    used = []
+    for i, (hostpath, containerpath, *_) in enumerate(config["volumes"][:len(args.data)]):
+        if pathlib.Path(hostpath).is_dir():
+            used.append(get_data_volume(hostpath, config["image"]))
+            config["volumes"][i] = (used[-1], containerpath, "ro")
+            LOGGER.info(f"Mounting '{hostpath}' from data volume '{used[-1]}'.")
+    evict_data_volumes(parse_size(args.data_volume_size), keep=used)
+
+def _run_and_stream(config, args, cache=None, key=None) -> int:
+    """Run a container and stream its output to the terminal as it's produced.
+
+    The container is started detached (and _not_ automatically removed) so its real exit code can be retrieved.
+    Its output is optionally teed to a rotating log file (`--log-file`) and recorded for the result cache.
+    """
+    from wa_cli.utils.stream import RotatingLog, stream_container
+    from wa_cli.utils.cache import parse_size
+    import tempfile
+
+    log = RotatingLog(args.log_file, parse_size(args.log_max_size), args.log_backups) if args.log_file else None
+    record = tempfile.NamedTemporaryFile(prefix="wa-run-", suffix=".stdout") if cache is not None else None
+
+    container = None
+    try:
+        if args.reuse:
+            from wa_cli.utils.pool import run_in_pool
+            from wa_cli.utils.stream import stream_output
+
+            exit_code = run_in_pool(config, args.pool_size, args.pool_ttl, lambda chunks: stream_output(chunks, log=log, record=record), preload=args.preload)
+        else:
+            container = docker.run(**config, detach=True)
+            stream_container(container, log=log, record=record)
+            exit_code = docker.wait(container)
+
+        if cache is not None and exit_code == 0:
+            LOGGER.info("Storing the result of this run in the cache...")
+            record.flush()
+            cache.store(key, record.name, args.cache_artifact)
+    except docker_exceptions.DockerException as e:
+        LOGGER.error(f"Failed to run the container: {e}")
+        exit_code = e.return_code or 1
+    finally:
+        if container is not None:
+            docker.container.remove(container, force=True)
+        if log is not None:
+            log.close()
+        if record is not None:
+            record.close()
+
+    return exit_code
+
+def _watch(config, args):
+    """Run the script in a warm container and re-run it whenever the script or one of the `--data` paths changes.
+
+    Changes are detected with [watchdog](https://github.com/gorakhargosh/watchdog) (inotify on linux). An in-flight
+    run is cancelled through the forkserver so the next run starts in the same container right away.
+    """
+    check_for_dependency('watchdog', install_method='pip install watchdog')
+
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+    from wa_cli.utils.pool import pooled_container, execute_in_container, cancel_in_container
+    from wa_cli.utils.stream import stream_output
+    from fnmatch import fnmatch
+    import threading
+
+    pidfile = "/tmp/wa_watch.pid"
+    watched = [pathlib.Path(v[0]) for v in config["volumes"]]
+    changed = threading.Event()
+
+    class _Handler(FileSystemEventHandler):
+        def on_any_event(self, event):
+            path = pathlib.Path(event.src_path)
+            if not any(path == w or w in path.parents for w in watched):
+                return
+            if args.watch_glob and not any(fnmatch(str(path), g) or fnmatch(path.name, g) for g in args.watch_glob):
+                return
+            LOGGER.debug(f"Detected change to '{path}'.")
+            changed.set()
+
+    # Directories are watched recursively, single files through their (non-recursively watched) parent
+    schedule = {}
+    for w in watched:
+        path = w if w.is_dir() else w.parent
+        schedule[path] = schedule.get(path, False) or w.is_dir()
+    observer = Observer()
+    for path, recursive in schedule.items():
+        observer.schedule(_Handler(), str(path), recursive=recursive)
+    observer.start()
+
+    with pooled_container(config, 1, args.pool_ttl, args.preload) as name:
+        runner = None
+        try:
+            while True:
+                changed.clear()
+                runner = threading.Thread(target=execute_in_container, args=(name, config, stream_output, args.preload, pidfile), daemon=True)
+                runner.start()
+
+                # Wait for a change, then until things have been quiet for the debounce period
+                changed.wait()
+                while True:
+                    changed.clear()
+                    if not changed.wait(args.debounce):
+                        break
+
+                if runner.is_alive():
+                    LOGGER.info("Change detected. Cancelling the current run...")
+                    cancel_in_container(name, pidfile)
+                    runner.join()
+                LOGGER.info("Change detected. Re-running...")
+        except (KeyboardInterrupt, SystemExit):
+            # Leave the container in a reusable state instead of tearing it down
+            if runner is not None and runner.is_alive():
+                cancel_in_container(name, pidfile)
+        finally:
+            observer.stop()
+
 def run_run(args, run_cmd="/bin/bash"):
     """The run command will spin up a Docker container that runs a python script with the desired image.
 
@@ -118,53 +512,198 @@ def run_run(args, run_cmd="/bin/bash"):
             --data "pid_controller.py" \\ 
             demo_bridge_server.py --step_size 2e-3
     ```
-    """
-    LOGGER.info("Running 'docker run' entrypoint...")
-    
-    # Grab the args to run
-    script = args.script
-    script_args = args.script_args
 
-    # Grab the file path
-    absfile = get_resolved_path(script, return_as_str=False)
-    file_exists(absfile, throw_error=True)
-    filename = absfile.name
+    The output of the script is streamed to the terminal while it runs, and the exit code of the script becomes
+    the exit code of `wa docker run`. Pass `--log-file` to also keep the output in a log file that's rotated
+    once it reaches `--log-max-size`.
+
+    Pass `--reuse` to skip the container start up cost in an edit-run loop. The script is then run with
+    `docker exec` in a warm container that's kept running between invocations. Up to `--pool-size`
+    containers are kept per image, data folders and network; containers idle for longer than `--pool-ttl`
+    seconds are removed the next time `--reuse` is used (or with `wa docker pool --prune`). Files passed with
+    `--data` (including the script) are copied into the container before every run, so edits are always picked up.
+
+    For short scripts, importing `wa_simulator`, NumPy and friends often takes longer than the script itself.
+    Pass `--preload` (which implies `--reuse`) to start a small forkserver in the warm container that imports
+    those modules once (`wa_simulator,numpy` by default, or a comma separated list passed to `--preload`).
+    Each run is then forked from the server with the requested arguments and working directory, and the time
+    each run took is reported.
+
+    Pass `--watch` (which implies `--preload`) to keep a development loop running: the script and every `--data`
+    path are watched, and on a change the in-flight run is cancelled and the script is run again in the same
+    container. Use `--watch-glob` to only react to certain files (i.e. `--watch-glob "*.py"`) and `--debounce`
+    to control how long to wait for a burst of changes (i.e. an editor saving several files) to settle.
+    This requires the `watchdog` package.
+
+    The simulation talks to the control stack over the `wa` bridge network by default, which adds NAT and veth
+    overhead to every bridge message. Pass `--net-mode host` to use host networking instead, or
+    `--net-mode shared` to join the network and ipc namespaces (and therefore `/dev/shm`) of the control stack
+    container so the two talk over loopback. The stack defaults to the running `wa dev` container (start it with
+    `wa dev --net-mode shared`), or pass its name to `--stack`. Static ips and published ports don't apply in these
+    modes and are ignored.
 
-    # Create the command
-    cmd = f"python {filename} {' '.join(script_args)}"
+    ```bash
+    wa dev --net-mode shared --up
+    wa docker run --wasim --net-mode shared --data "../data:/root/data" demo_bridge_server.py
+    ```
 
-    # If args.wasim is True, we will use some predefined values that's typical for wa_simulator runs
-    if args.wasim:
-        LOGGER.info("Updating args with 'wasim' defaults...")
-        def up(arg, val, dval=None):
-            return val if arg == dval else arg
-        args.name = up(args.name, "wasim-docker")
-        args.image = up(args.image, "wiscauto/wa_simulator:latest")
-        args.port.insert(0, "5555:5555") # For bridge communication
-        if not args.no_vnc:
-            args.environment.insert(0, "DISPLAY=vnc:0.0")
-        args.environment.insert(0, "WA_DATA_DIRECTORY=/root/data")
-        args.network = up(args.network, "wa")
-        args.ip = up(args.ip, "172.20.0.3")
+    Simulations running side by side otherwise compete for the same cpus, memory and caches, which makes
+    timing-sensitive controllers behave nondeterministically. Use `--cpus`, `--cpuset`, `--memory`, `--shm-size`,
+    `--ulimit` and `--tmpfs` to limit or size the container, and `--pin auto` to pin it to free physical cores.
+    Pinned cores are leased (one per `--cpus`, keeping hyperthread siblings and the NUMA node together) so
+    concurrent runs, including `wa jobs` workers, are spread across the machine.
 
-        # Try to find the data folder
-        if args.data is None:
-            LOGGER.warn("A data folder was not provided. You may want to pass one...")
+    ```bash
+    wa docker run --wasim --cpus 2 --pin auto --memory 4g --shm-size 1g demo_bridge_server.py
+    ```
 
-    config = _parse_args(args)
-    config["volumes"].append((str(absfile),f"/root/{filename}"))  # The actual python file # noqa
-    config["command"] = cmd.split(" ")
+    I/O heavy simulations are slowed down by writing to bind mounted host disks, especially on overlay or encrypted
+    filesystems. Suffix a `--data` entry with `:ro` (or pass `--read-only-data`) to mount it read-only, and pass
+    `--scratch <dir>[:<size>]` to mount a memory backed (tmpfs) scratch directory that's sized by `--scratch-size`
+    by default. Scratch directories disappear with the container, so use `--copy-out <path>[:<host path>]` to copy
+    the paths worth keeping to the host once the script exits (owned by the current user).
+
+    ```bash
+    wa docker run --wasim \\
+            --data "../data:/root/data:ro" \\
+            --scratch /root/scratch:4g \\
+            --copy-out /root/scratch/results:./results \\
+            demo.py --output /root/scratch/results
+    ```
+
+    Instead of installing extra pip packages every time the container starts, pass `--requirements requirements.txt`.
+    A thin image is then built from `--image` with the requirements installed and tagged by a hash of the base image
+    digest and the requirements, so later runs reuse it and it's rebuilt automatically when either changes. Unused
+    derived images can be removed with `wa docker image prune`.
+
+    Bind mounting large `--data` directories is slow on setups that share files with a VM or a remote daemon. Pass
+    `--data-volume` to mount each `--data` directory from a read-only named docker volume instead. Volumes are
+    content addressed: the directory is hashed (the hash is reused as long as no file's size or modification time
+    changed) and a volume is only populated once per version of the data. The least recently used volumes are
+    removed once they take up more than `--data-volume-size`. See `wa docker data` to list or prune them.
+
+    For unattended batch runs, pass `--headless` to skip vnc entirely. The script is then run against a virtual
+    framebuffer (`Xvfb`) inside the container, so scripts that expect a display still work without any X11
+    round-trips over the network, and common rendering backends (matplotlib, Qt, SDL) are told to draw offscreen.
+    If the image doesn't have `Xvfb`, the script is run without a display. Pass `--record output.mp4` to record the
+    framebuffer to a video on the host at `--record-fps` frames per second (this requires `ffmpeg` in the image).
+
+    ```bash
+    wa docker run --wasim --headless --record out/run.mp4 --data "../data:/root/data" demo.py
+    ```
+
+    Pass `--cache` to reuse the result of a previous run with identical inputs. The cache key covers the
+    image digest, the contents of the script and every `--data` path, the environment, the ports and the
+    script arguments. On a hit, the recorded output is printed and every `--cache-artifact` is restored
+    without starting a container. Results are stored in `~/.wa_cli/cache` and evicted least recently used
+    first once `--cache-size` is exceeded.
+
+    ```bash
+    wa docker run \\
+            --wasim \\
+            --data "../data:/root/data" \\
+            --cache --cache-artifact "../data/output" \\
+            demo_bridge_server.py --step_size 2e-3
+    ```
+    """
+    LOGGER.info("Running 'docker run' entrypoint...")
+
+    default_name = args.wasim and args.name is None
+    config = _prepare_run(args)
+    if not _apply_net_mode(config, args):
+        return
+
+    # Use the digest the image is pinned to by 'wa docker pull', if any
+    if not args.dry_run:
+        config["image"] = pin_image(config["image"])
+
+    # Scripts that need extra packages run in a derived image that already has them installed
+    if args.requirements is not None and not args.dry_run:
+        from wa_cli.utils.images import get_derived_image
+
+        config["image"] = get_derived_image(config["image"], _get_image_digest(config["image"]), args.requirements)
+
+    # If caching is enabled, a previous run with the same inputs is replayed instead of starting a container
+    cache, key = None, None
+    if args.cache and not args.dry_run:
+        from wa_cli.utils.cache import ResultCache, compute_run_key, parse_size
+
+        cache = ResultCache(parse_size(args.cache_size))
+        outputs = [v[1] for v in config["volumes"] if v[1] == RECORD_DIR or v[1].startswith(COPY_OUT_DIR + "/")]
+        key = compute_run_key(config, _get_image_digest(config["image"]), exclude=args.cache_artifact, outputs=outputs)
+        LOGGER.debug(f"Cache key for this run is '{key}'.")
+        if cache.lookup(key) is not None:
+            LOGGER.info("Found a cached result for this run. Replaying it instead of starting a container...")
+            cache.replay(key, sys.stdout.buffer)
+            return
+
+    # Python buffers stdout when it isn't attached to a terminal, so disable that to get output as it's produced
+    config["envs"].setdefault("PYTHONUNBUFFERED", "1")
+
+    if args.watch and args.preload is None:
+        args.preload = "wa_simulator,numpy"
+    if args.preload is not None:
+        args.reuse = True
+    if args.reuse and args.pool_size > 1 and (config["ip"] not in (None, "auto") or _fixed_ports(config)):
+        LOGGER.warn("Static ips and fixed host ports can't be shared by pooled containers. They will be ignored.")
+        if config["ip"] != "auto":
+            config["ip"] = None
+        config["publish"] = [p for p in config["publish"] if p not in _fixed_ports(config)]
 
     # Run the script
     LOGGER.debug(f"Running docker container with the following arguments: {dumps_dict(config)}")
     if not args.dry_run:
-        _try_create_network(config["networks"])
+        if args.net_mode == "bridge" and config["networks"][0] is not None:
+            _try_create_network(config["networks"][0])
+        if not args.reuse and default_name:
+            config["name"] = _unique_name(config["name"])
+        elif not args.reuse and config["name"] is None and _has_auto_leases(config):
+            # Leases are held until no container with their name exists, so a container that leases anything needs a name
+            config["name"] = f"wa-run-{uuid.uuid4().hex[:6]}"
+        if args.data_volume:
+            if args.watch:
+                LOGGER.warn("'--data-volume' can't be used with '--watch' since changes to the data wouldn't be seen. It will be ignored.")
+            else:
+                _use_data_volumes(config, args)
+
+        # Either share the default vnc container or give this simulation a display of its own
+        vnc_name = None
         if not args.no_vnc:
-            _try_create_default_vnc(args)
+            if args.vnc_mode == "per-sim":
+                vnc_name = f"vnc-{config['name'] or uuid.uuid4().hex[:6]}"
+                config["envs"]["DISPLAY"] = f"{vnc_name}:0.0"
+                _try_create_default_vnc(args, name=vnc_name, ip="auto")
+            else:
+                _try_create_default_vnc(args)
+
+            # Host networking can't resolve container names, so point the display at the vnc container's address
+            if args.net_mode == "host" and "DISPLAY" in config["envs"]:
+                config["envs"]["DISPLAY"] = f"{_container_ip(vnc_name or 'vnc', 'wa')}:0.0"
+
+        # Pooled containers lease their own address (and cores) when they are created
+        leased_ip, pinned = None, False
         try:
-            print(docker.run(**config, remove=True, tty=True))
-        except docker_exceptions.DockerException as e:
-            pass
+            if args.watch:
+                _watch(config, args)
+                return
+
+            if not args.reuse:
+                leased_ip = _resolve_ip(config, preferred=SIM_IP)
+                pinned = resolve_cpus(config)
+                _print_ports(config["name"], resolve_ports(config))
+            exit_code = _run_and_stream(config, args, cache=cache, key=key)
+        finally:
+            if leased_ip is not None:
+                from wa_cli.utils.ipam import release_ip
+                release_ip(config["networks"][0], leased_ip)
+            if pinned:
+                release_cores(config["name"])
+            if vnc_name is not None and _does_container_exist(vnc_name):
+                LOGGER.info(f"Stopping vnc container with name '{vnc_name}'")
+                docker.stop(vnc_name)
+        if exit_code != 0:
+            LOGGER.error(f"The container exited with exit code {exit_code}.")
+            sys.exit(exit_code)
 
 def run_dev(args):
     """Command that essentially wraps `docker-compose` and can help spin up, attach, destroy, and build docker-compose based containers.
@@ -237,12 +776,19 @@ def run_stack(args):
     If desired, pass `--down` to stop the container. Further, if the container exists and changes are
     made to the repository, the container will _not_ be built automatically. To do that, add the 
     `--build` argument.
+
+    This uses the same implementation as `wa dev`, so `--cache-dir` and `--build-report` work the same way.
     """
     LOGGER.info("Running 'docker stack' entrypoint...")
 
-    from avtoolbox.dev import _run_env
+    from wa_cli import dev
 
-    _run_env(args)
+    # Use the defaults of 'wa dev' for the arguments 'stack' doesn't have
+    defaults = dev.init(argparse.ArgumentParser()).parse_args([])
+    for key, value in vars(defaults).items():
+        if not hasattr(args, key):
+            setattr(args, key, value)
+    dev.run_dev(args)
 
 def run_vnc(args, log_if_created=True):
     """Command to spin up a `vnc` docker container to allow the visualization of GUI apps in docker
@@ -260,6 +806,11 @@ def run_vnc(args, log_if_created=True):
     applications in X window systems (used by any linux based container, like the ones we use). To make sure the gui apps are visualized in vnc when the aforementioned
     requirements are setup, you need to make sure the `DISPLAY` variable is set correctly. The variable should be set to `vnc:0.0` (assuming the vnc container that has
     been setup is named 'vnc').
+
+    To watch several simulations side by side, pass `--vnc-mode per-sim` to `wa docker run`. Each simulation then gets
+    its own vnc container (named `vnc-<simulation name>`, with its own address and host ports) and its `DISPLAY` is set
+    accordingly; the vnc container is stopped when the simulation exits. Run `wa docker vnc --list` to print the noVNC
+    url of every running vnc container and write an index page (`~/.wa_cli/vnc/index.html`) that shows all of them.
     """
     LOGGER.info("Running 'docker vnc' entrypoint...")
 
@@ -268,15 +819,22 @@ def run_vnc(args, log_if_created=True):
         return val if arg == dval else arg
     args.image = "wiscauto/vnc:latest"
     args.name = up(args.name, "vnc")
-    args.port = ["8080:8080", "5900:5900"]
+    args.port = ["auto:8080", "auto:5900"]
     args.network = up(args.network, "wa")
     args.ip = up(args.ip, "172.20.0.4")
     args.environment = []
     args.data = []
     args.stop = args.stop if hasattr(args, 'stop') else False
+    args.list = args.list if hasattr(args, 'list') else False
+
+    if args.list:
+        if not args.dry_run:
+            _list_vnc()
+        return
 
     # Parse the arguments
     config = _parse_args(args)
+    config["labels"][VNC_LABEL] = "true"
 
     # Start up the container
     LOGGER.debug(f"Running docker container with the following arguments: {dumps_dict(config)}")
@@ -295,7 +853,313 @@ def run_vnc(args, log_if_created=True):
                 LOGGER.warn(f"A vnc container with name '{config['name']}' already exists. You can probably ignore this error.")
         else:
             LOGGER.info(f"Creating vnc container with name '{config['name']}")
+            _resolve_ip(config)
+            ports = resolve_ports(config)
+            config["image"] = pin_image(config["image"])
             print(docker.run(**config, detach=True, remove=True))
+            _print_ports(config["name"], ports)
+            LOGGER.info(f"noVNC is available at http://localhost:{ports['8080']}/vnc_auto.html")
+
+def _list_vnc():
+    # Prints the noVNC url of every running vnc container and writes an index page linking to all of them
+    from wa_cli.utils.state import get_state_path
+    import html
+
+    urls = {}
+    for container in docker.container.list(filters={"label": VNC_LABEL}):
+        bindings = (container.network_settings.ports or {}).get("8080/tcp") or []
+        if bindings:
+            urls[container.name] = f"http://localhost:{bindings[0]['HostPort']}/vnc_auto.html"
+
+    for name, url in sorted(urls.items()):
+        print(f"{name}: {url}")
+
+    index = get_state_path("vnc", "index.html")
+    with open(index, "w") as f:
+        f.write("<!DOCTYPE html>\n<html><head><title>wa vnc displays</title></head><body>\n")
+        for name, url in sorted(urls.items()):
+            f.write(f'<div style="display:inline-block;margin:4px"><a href="{html.escape(url)}">{html.escape(name)}</a><br>')
+            f.write(f'<iframe src="{html.escape(url)}" width="640" height="480"></iframe></div>\n')
+        f.write("</body></html>\n")
+    LOGGER.info(f"Wrote an index of the vnc displays to 'file://{index}'.")
+
+def run_pool(args):
+    """Command to inspect or clean up the warm containers used by `wa docker run --reuse`
+
+    Without arguments, the pooled containers are listed along with how long they've been idle. Pass `--prune`
+    to remove every idle pooled container, or `--ttl` to only remove containers idle for longer than that.
+    """
+    LOGGER.info("Running 'docker pool' entrypoint...")
+
+    from wa_cli.utils.pool import evict_idle, list_pool
+    import time
+
+    if args.dry_run:
+        return
+
+    if args.prune or args.ttl is not None:
+        evict_idle(args.ttl if args.ttl is not None else 0, force=args.prune)
+
+    print(f"{'NAME':<28}  {'POOL':<12}  {'IDLE':>8}  BUSY")
+    for name, entry in list_pool().items():
+        print(f"{name:<28}  {entry['key'][:12]:<12}  {time.time() - entry['last_used']:>7.0f}s  {'yes' if entry['busy'] else 'no'}")
+
+def run_data(args):
+    """Command to inspect or clean up the data volumes used by `wa docker run --data-volume`
+
+    Without arguments, the data volumes are listed along with the host directory they were populated from.
+    Pass `--prune` to remove every data volume that isn't in use, or `--max-size` to remove the least recently
+    used ones until the rest fit in that size.
+    """
+    LOGGER.info("Running 'docker data' entrypoint...")
+
+    from wa_cli.utils.data_volumes import evict_data_volumes, list_data_volumes
+    from wa_cli.utils.cache import parse_size
+    import time
+
+    if args.dry_run:
+        return
+
+    if args.prune or args.max_size is not None:
+        evict_data_volumes(parse_size(args.max_size) if args.max_size is not None else 0, force=args.prune)
+
+    print(f"{'NAME':<26}  {'SIZE':>10}  {'LAST USED':>10}  PATH")
+    for name, volume in list_data_volumes().items():
+        print(f"{name:<26}  {volume['size'] / 1024 ** 2:>8.1f}MB  {time.time() - volume['last_used']:>9.0f}s  {volume['path']}")
+
+def run_pull(args):
+    """Command to pre-pull the images used by the wa_cli and pin them in a lock file
+
+    The first `wa docker run --wasim` or `wa docker vnc` on a machine otherwise pulls its image in the middle of
+    the run, one at a time. This command pulls every image referenced by the CLI defaults
+    (`wiscauto/wa_simulator:latest` and `wiscauto/vnc:latest`), by the project's `.avtoolbox.yml` (services that
+    aren't built) and any passed `--image` concurrently.
+
+    The progress of each layer is logged as it's pulled. The digest each tag resolved to is then written to a
+    lock file: `wa-images.lock` in the project (if one exists in the current directory or a parent), or otherwise
+    one for the machine in `~/.wa_cli`. Later runs use the pinned digest instead of the tag, so they're
+    reproducible and never need to resolve the tag against the registry. To pin the images for everyone working
+    on a project, create an empty `wa-images.lock` next to its `.avtoolbox.yml` and commit it after pulling.
+    If some images can't be pulled, the others are still pinned and the command exits with a non-zero code.
+
+    ```bash
+    touch wa-images.lock
+    wa docker pull
+    ```
+    """
+    LOGGER.info("Running 'docker pull' entrypoint...")
+
+    from wa_cli.utils.images import DEFAULT_IMAGES, project_images, pull_images, write_lock
+
+    images = list(dict.fromkeys(DEFAULT_IMAGES + project_images() + args.image))
+    LOGGER.info(f"Pulling {len(images)} image(s): {', '.join(images)}")
+    if args.dry_run:
+        return
+
+    pins, errors = pull_images(images, workers=args.workers)
+    if not args.no_lock and pins:
+        write_lock(pins)
+    if errors:
+        LOGGER.error(f"Failed to pull {len(errors)} image(s): {', '.join(errors)}")
+        sys.exit(1)
+
+def run_bundle_save(args):
+    """Command to export images into a compressed bundle for machines without registry access
+
+    The simulator and vnc images, the project's pulled and built stack images (see `wa dev`) and any passed
+    `--image` are exported with a single `docker save` (so shared layers are only stored once) and compressed
+    with multi-threaded zstd as they're exported. The bundle starts with a manifest listing the images.
+    Requires the `zstandard` package.
+
+    ```bash
+    wa docker bundle save -o wa.bundle
+    # On the machine without registry access
+    wa docker bundle load wa.bundle
+    ```
+    """
+    LOGGER.info("Running 'docker bundle save' entrypoint...")
+
+    check_for_dependency("zstandard", install_method="pip install zstandard")
+    from wa_cli.utils.images import DEFAULT_IMAGES, project_images, stack_images
+    from wa_cli.utils.bundle import save_bundle
+
+    images = args.image if args.only else DEFAULT_IMAGES + project_images() + stack_images() + args.image
+    LOGGER.info(f"Bundling {', '.join(images)}...")
+    if args.dry_run:
+        return
+
+    # Only the images that were explicitly asked for have to be present
+    missing = [image for image in dict.fromkeys(images) if not docker.image.exists(image)]
+    if any(image in args.image for image in missing):
+        LOGGER.fatal(f"The following images were not found locally: {', '.join(i for i in missing if i in args.image)}. Pull or build them first.")
+        sys.exit(1)
+    for image in missing:
+        LOGGER.warn(f"Image '{image}' was not found locally. Skipping it (run 'wa docker pull' to include it).")
+    images = [image for image in images if image not in missing]
+    if not images:
+        LOGGER.fatal("None of the images to bundle were found locally.")
+        sys.exit(1)
+
+    save_bundle(images, args.output, level=args.level, threads=args.threads)
+
+def run_bundle_load(args):
+    """Command to load the images in a bundle written by `wa docker bundle save`
+
+    The bundle is decompressed straight into `docker load`, without writing the uncompressed images to disk.
+    If every image in the bundle is already present, nothing is loaded (pass `--force` to load it anyway).
+    Requires the `zstandard` package.
+    """
+    LOGGER.info("Running 'docker bundle load' entrypoint...")
+
+    check_for_dependency("zstandard", install_method="pip install zstandard")
+    from wa_cli.utils.bundle import load_bundle, read_manifest
+
+    LOGGER.debug(f"Bundle manifest: {dumps_dict(read_manifest(args.bundle))}")
+    if args.dry_run:
+        return
+
+    load_bundle(args.bundle, force=args.force)
+
+def run_image_prune(args):
+    """Command to remove the derived images built by `wa docker run --requirements`
+
+    Every derived image that isn't used by a container is removed. Pass `--max-age` to only remove
+    images that haven't been used by `wa docker run` for that many seconds.
+    """
+    LOGGER.info("Running 'docker image prune' entrypoint...")
+
+    from wa_cli.utils.images import prune_derived_images
+
+    if args.dry_run:
+        return
+
+    removed = prune_derived_images(args.max_age)
+    LOGGER.info(f"Removed {len(removed)} derived image(s).")
+
+def run_image_analyze(args):
+    """Command to break down the size of an image by layer and estimate how long it takes to pull
+
+    The image is read from the local image store with `docker save`, so no registry access is needed. Each layer is
+    listed with the command that created it, its size, file count and largest paths, along with its estimated
+    compressed size and pull/extract times. Files that a later layer overwrites or deletes are still downloaded, so
+    they're reported as wasted space; these are usually the first thing to fix in a Dockerfile (i.e. by cleaning up
+    in the same `RUN` that created the files).
+
+    The estimates use `--bandwidth` and `--extract-rate` (both in MB/s) and a compression ratio measured on a sample
+    of each layer. Pass `--json` to print the full report as json instead of a table.
+
+    Example usage:
+
+    ```bash
+    wa docker image analyze wiscauto/wa_simulator:latest
+    wa docker image analyze avtoolbox/my_project:dev --top 20 --bandwidth 5 --output report.json
+    ```
+    """
+    LOGGER.info("Running 'docker image analyze' entrypoint...")
+
+    from wa_cli.utils.image_analysis import analyze_image, format_size
+
+    if args.dry_run:
+        return
+
+    report = analyze_image(args.image, top=args.top, bandwidth=args.bandwidth, extract_rate=args.extract_rate)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=4)
+
+    if args.json:
+        print(json.dumps(report, indent=4))
+        return
+
+    print(f"{report['image']} ({report['id'][:19]}): {report['layers']} layers, {report['files']} files, "
+          f"{format_size(report['size'])} ({format_size(report['estimated_compressed_size'])} compressed), "
+          f"{format_size(report['wasted_size'])} wasted")
+    print(f"Estimated pull: {report['estimated_pull_seconds']:.1f}s, extract: {report['estimated_extract_seconds']:.1f}s")
+
+    print(f"\n{'LAYER':<6}  {'SIZE':>8}  {'COMPRESSED':>10}  {'FILES':>7}  {'PULL':>7}  CREATED BY")
+    for layer in report["largest_layers"]:
+        created_by = " ".join(layer["created_by"].replace("/bin/sh -c #(nop) ", "").split())
+        print(f"{layer['index']:<6}  {format_size(layer['size']):>8}  {format_size(layer['estimated_compressed_size']):>10}  "
+              f"{layer['files']:>7}  {layer['estimated_pull_seconds']:>6.1f}s  {created_by[:80]}")
+
+    print(f"\n{'LAYER':<6}  {'SIZE':>8}  LARGEST PATHS")
+    for path in report["largest_paths"]:
+        print(f"{path['layer']:<6}  {format_size(path['size']):>8}  {path['path']}")
+
+    if report["wasted_paths"]:
+        print(f"\n{'LAYER':<6}  {'SIZE':>8}  WASTED PATHS (overwritten or deleted by a later layer)")
+        for path in report["wasted_paths"]:
+            print(f"{path['layer']:<6}  {format_size(path['size']):>8}  {path['path']}")
+
+def _list_wa_containers(network="wa"):
+    containers = docker.container.list(filters={"label": WA_LABEL})
+    if network is not None:
+        containers += docker.container.list(filters={"network": network})
+    return sorted(set(c.name for c in containers))
+
+def run_logs(args):
+    """Command to follow the logs of one or more wa containers at once
+
+    When the simulation, vnc and control stack containers are running together, it's often necessary to see
+    how their logs line up in time. The `logs` command follows each requested container concurrently and merges
+    their output into a single stream ordered by timestamp, where each line is prefixed with the time and the
+    name of the container it came from.
+
+    Pass `--all` to follow every container started by the `wa_cli` or connected to the `wa` network (containers
+    started later are picked up automatically). Otherwise, pass the names of the containers to follow.
+
+    ```bash
+    wa docker logs --all
+    wa docker logs wasim-docker vnc --log-file wa.log --compress
+    ```
+    """
+    LOGGER.info("Running 'docker logs' entrypoint...")
+
+    from wa_cli.utils.stream import RotatingLog, follow_containers
+    from wa_cli.utils.cache import parse_size
+    from datetime import datetime
+
+    if args.all:
+        list_containers = lambda: _list_wa_containers(args.network)
+    elif args.names:
+        list_containers = lambda: args.names
+    else:
+        LOGGER.error("Either pass the names of the containers to follow or '--all'.")
+        return
+
+    log = RotatingLog(args.log_file, parse_size(args.log_max_size), args.log_backups, compress=args.compress) if args.log_file else None
+    width = max([len(n) for n in list_containers()] + [8])
+    def emit(timestamp, container, line):
+        line = f"{datetime.fromtimestamp(timestamp).strftime('%H:%M:%S.%f')[:-3]} {container:<{width}} | {line}"
+        print(line, flush=True)
+        if log is not None:
+            log.write("merged", line.encode() + b"\n")
+
+    LOGGER.debug(f"Following the logs of the following containers: {list_containers()}")
+    if not args.dry_run:
+        try:
+            follow_containers(list_containers, emit, window=args.window, buffer_size=args.buffer_size, keep_polling=args.all)
+        finally:
+            if log is not None:
+                log.close()
+
+def run_ports(args):
+    """Command to list the host ports published by running wa containers
+
+    Host ports are allocated automatically (i.e. `--wasim` publishes the bridge port `5555` on the first free host
+    port starting at `5555`, and vnc does the same for `8080` and `5900`), so several simulations can run on the same
+    machine. This command shows where each container port ended up.
+    """
+    LOGGER.info("Running 'docker ports' entrypoint...")
+
+    if args.dry_run:
+        return
+
+    print(f"{'NAME':<28}  {'CONTAINER PORT':<15}  HOST PORT")
+    for container in docker.container.list(filters={"label": WA_LABEL}):
+        for port, bindings in sorted((container.network_settings.ports or {}).items()):
+            for binding in bindings or []:
+                print(f"{container.name:<28}  {port:<15}  {binding['HostIp']}:{binding['HostPort']}")
 
 def run_network(args):
     """Command to start a docker network for use with WA applications
@@ -314,11 +1178,42 @@ def run_network(args):
     config = {}
     config["name"] = args.name
     config["driver"] = "bridge"
+    config["ip"] = args.ip
+    config["prefix"] = args.prefix
 
     LOGGER.debug(f"Creating docker network with the following arguments: {dumps_dict(config)}")
     if not args.dry_run:
         print(_try_create_network(**config))
 
+def _add_run_args(parser):
+    """Add the arguments shared by every command that runs a script in a container (e.g. `docker run`)."""
+    parser.add_argument("--name", type=str, help="Name of the container.", default=None)
+    parser.add_argument("--image", type=str, help="Name of the image to run.", default=None)
+    parser.add_argument("--data", type=str, action="append", help="Data to pass to the container as a Docker volume. Multiple data entries can be provided.", default=[])
+    parser.add_argument("--port", type=str, action="append", help="Ports to expose from the container.", default=[])
+    parser.add_argument("--env", type=str, action="append", dest="environment", help="Environment variables.", default=[])
+    parser.add_argument("--network", type=str, help="The network to communicate with.", default=None)
+    parser.add_argument("--ip", type=str, help="The static ip address to use when connecting to 'network'. Used as the server ip. Pass 'auto' to lease a free address from the network (the default with '--wasim').", default=None)
+    parser.add_argument("--wasim", action="store_true", help="Run the passed script with all the defaults for the wa_simulator. Will set 'DISPLAY' to use vnc.")
+    parser.add_argument("--no-vnc", action="store_true", help="Don't implicitly create a vnc server. Not to be confused with noVNC.", default=False)
+    parser.add_argument("--headless", action="store_true", help="Render offscreen to a virtual framebuffer in the container instead of through vnc. Implies '--no-vnc'.", default=False)
+    parser.add_argument("--resolution", type=str, help="The resolution of the virtual framebuffer used with '--headless'.", default="1280x720")
+    parser.add_argument("--record", type=str, help="Record the virtual framebuffer to this video file on the host. Requires '--headless' and ffmpeg in the image.", default=None)
+    parser.add_argument("--record-fps", type=int, help="The frame rate used with '--record'.", default=10)
+    parser.add_argument("--read-only-data", action="store_true", help="Mount every '--data' entry read-only. Single entries can also be suffixed with ':ro'.", default=False)
+    parser.add_argument("--scratch", type=str, action="append", help="Mount a memory backed scratch directory in the container, i.e. '/root/scratch' or '/root/scratch:4g'. Multiple directories can be provided.", default=[])
+    parser.add_argument("--scratch-size", type=str, help="The size of scratch directories that don't specify one.", default="1g")
+    parser.add_argument("--copy-out", type=str, action="append", help="Copy a path out of the container to the host when the script exits, i.e. '/root/scratch/results:./results'. Multiple paths can be provided.", default=[])
+    parser.add_argument("--cpus", type=float, help="The number of cpus the container can use, i.e. 1.5.", default=None)
+    parser.add_argument("--cpuset", type=str, help="The cpus the container can run on, i.e. '0-3,6'.", default=None)
+    parser.add_argument("--pin", type=str, choices=[CPUS_AUTO], help="Pin the container to free physical cores (one per '--cpus', NUMA aware) so concurrent runs don't share cores.", default=None)
+    parser.add_argument("--memory", type=str, help="The memory limit of the container, i.e. '4g'.", default=None)
+    parser.add_argument("--shm-size", type=str, help="The size of '/dev/shm', i.e. '1g'.", default=None)
+    parser.add_argument("--ulimit", type=str, action="append", help="A ulimit for the container, i.e. 'nofile=1024:2048'. Multiple ulimits can be provided.", default=[])
+    parser.add_argument("--tmpfs", type=str, action="append", help="Mount a tmpfs in the container, i.e. '/tmp:size=512m'. Multiple mounts can be provided.", default=[])
+    parser.add_argument("script", help="The script to run up in the Docker container")
+    parser.add_argument("script_args", nargs=argparse.REMAINDER, help="The arguments for the [script]")
+
 def init(subparser):
     """Initializer method for the `docker` entrypoint.
 
@@ -333,11 +1228,20 @@ def init(subparser):
     - `8888`: `rosboard` visualizer. See [their github](https://github.com/dheera/rosboard). This is used for visualizing ROS data
     - `5555`: Used by `wa_simulator` to communicate data over a bridge or to another external entity
 
+    Pass `auto` as the host port (i.e. `--port auto:5555`) to publish on the first free host port starting at the
+    container port. This is what `--wasim` and `vnc` do, so several simulations can run on one machine; the
+    resulting mapping is printed when the container is created and can be listed with `wa docker ports`.
+
     There are also a few ip addresses we use and how they are used is seen below:
     - `172.20.0.2`: Reserved for the control stack
     - `172.20.0.3`: Reserved for the simulation
     - `172.20.0.4`: Reserved for vnc
 
+    When running more than one simulation, the address of each simulation is leased from the network
+    instead (`--ip auto`, which is the default for `--wasim`). The first simulation still gets `172.20.0.3` if it's
+    free. Leases are kept in `~/.wa_cli/ipam.json` and are reclaimed once their container is gone. To run many
+    simulations at once, create a larger network, i.e. `wa docker network --prefix 22`.
+
     To see specific commands that are available, run the following command:
 
     ```bash
@@ -351,17 +1255,26 @@ def init(subparser):
 
     # Subcommand that runs a script in a docker container
     run = subparsers.add_parser("run", description="Run python script in a Docker container")
-    run.add_argument("--name", type=str, help="Name of the container.", default=None)
-    run.add_argument("--image", type=str, help="Name of the image to run.", default=None)
-    run.add_argument("--data", type=str, action="append", help="Data to pass to the container as a Docker volume. Multiple data entries can be provided.", default=[])
-    run.add_argument("--port", type=str, action="append", help="Ports to expose from the container.", default=[])
-    run.add_argument("--env", type=str, action="append", dest="environment", help="Environment variables.", default=[])
-    run.add_argument("--network", type=str, help="The network to communicate with.", default=None)
-    run.add_argument("--ip", type=str, help="The static ip address to use when connecting to 'network'. Used as the server ip.", default=None)
-    run.add_argument("--wasim", action="store_true", help="Run the passed script with all the defaults for the wa_simulator. Will set 'DISPLAY' to use vnc.")
-    run.add_argument("--no-vnc", action="store_true", help="Don't implicitly create a vnc server. Not to be confused with noVNC.", default=False)
-    run.add_argument("script", help="The script to run up in the Docker container")
-    run.add_argument("script_args", nargs=argparse.REMAINDER, help="The arguments for the [script]")
+    _add_run_args(run)
+    run.add_argument("--cache", action="store_true", help="Replay the result of a previous run with the same image, script, data, environment, ports and script arguments instead of starting a container.", default=False)
+    run.add_argument("--cache-artifact", type=str, action="append", help="Host path written by the script (i.e. inside a '--data' folder) that is stored with and restored from the cache. Multiple artifacts can be provided.", default=[])
+    run.add_argument("--cache-size", type=str, help="The maximum size of the result cache. Least recently used results are evicted first.", default="5G")
+    run.add_argument("--net-mode", type=str, choices=["bridge", "host", "shared"], help="How the container is networked. 'host' uses host networking and 'shared' joins the network and ipc namespaces of the control stack container.", default="bridge")
+    run.add_argument("--stack", type=str, help="With '--net-mode shared', the control stack container to join. Defaults to the running 'wa dev' container.", default=None)
+    run.add_argument("--vnc-mode", type=str, choices=["shared", "per-sim"], help="Share the default vnc container between simulations or start one vnc container (and display) per simulation.", default="shared")
+    run.add_argument("--requirements", type=str, help="A pip requirements file to install in a derived image that's cached and reused by later runs.", default=None)
+    run.add_argument("--data-volume", action="store_true", help="Mount '--data' directories from read-only, content addressed docker volumes instead of bind mounting them.", default=False)
+    run.add_argument("--data-volume-size", type=str, help="The total size of data volumes to keep. The least recently used ones are removed first.", default="20G")
+    run.add_argument("--reuse", action="store_true", help="Run the script with 'docker exec' in a warm, pre-started container instead of starting a new one.", default=False)
+    run.add_argument("--pool-size", type=int, help="With '--reuse', the number of warm containers to keep per image, data and network configuration.", default=1)
+    run.add_argument("--pool-ttl", type=float, help="With '--reuse', the number of seconds a warm container may be idle before it's removed.", default=600)
+    run.add_argument("--preload", type=str, nargs="?", const="wa_simulator,numpy", help="Implies '--reuse'. Import these modules (comma separated) once in a forkserver in the container and fork each run from it.", default=None)
+    run.add_argument("--watch", action="store_true", help="Implies '--preload'. Re-run the script in the same container whenever it or one of the '--data' paths changes.", default=False)
+    run.add_argument("--watch-glob", type=str, action="append", help="With '--watch', only re-run when a changed path matches this glob. Multiple globs can be provided.", default=[])
+    run.add_argument("--debounce", type=float, help="With '--watch', the number of seconds to wait for changes to settle before re-running.", default=0.1)
+    run.add_argument("--log-file", type=str, help="Also write the output of the container to this file. The file is rotated once it reaches '--log-max-size'.", default=None)
+    run.add_argument("--log-max-size", type=str, help="The size at which the '--log-file' is rotated.", default="10M")
+    run.add_argument("--log-backups", type=int, help="The number of rotated log files to keep.", default=3)
     run.set_defaults(cmd=run_run)
 
     # Subcommand that builds, spins up, attaches or shuts down docker container for our control stacks
@@ -370,6 +1283,8 @@ def init(subparser):
     stack.add_argument("-u", "--up", action="store_true", help="Spin up the stack.", default=False)
     stack.add_argument("-d", "--down", action="store_true", help="Tear down the stack.", default=False)
     stack.add_argument("-a", "--attach", action="store_true", help="Attach to the stack.", default=False)
+    stack.add_argument("--cache-dir", type=str, help="Import and export the build cache of each service from this directory. Only used if --build is set to True.", default=None)
+    stack.add_argument("--build-report", type=str, help="Write the per stage and per step build times to this json file. Only used if --build is set to True.", default=None)
     stack.set_defaults(cmd=run_stack)
 
     # Subcommand that spins up the vnc container
@@ -378,12 +1293,80 @@ def init(subparser):
     vnc.add_argument("--network", type=str, help="The network to communicate with.", default="wa")
     vnc.add_argument("--ip", type=str, help="The static ip address to use when connecting to 'network'.", default="172.20.0.4")
     vnc.add_argument("--stop", action="store_true", help="Stop the vnc container.", default=False)
+    vnc.add_argument("--list", action="store_true", help="Print the noVNC urls of every running vnc container and write an index page linking to them.", default=False)
     vnc.set_defaults(cmd=run_vnc)
 
+    # Subcommand that follows the logs of many containers
+    logs = subparsers.add_parser("logs", description="Follow the logs of one or more wa containers in a single, timestamp ordered stream.")
+    logs.add_argument("names", type=str, nargs="*", help="The containers to follow.")
+    logs.add_argument("--all", action="store_true", help="Follow every wa container, including ones started later.", default=False)
+    logs.add_argument("--network", type=str, help="With '--all', also follow every container connected to this network.", default="wa")
+    logs.add_argument("--window", type=float, help="How long (in seconds) lines are held back to order them across containers.", default=0.25)
+    logs.add_argument("--buffer-size", type=int, help="The maximum number of lines held back per container.", default=1000)
+    logs.add_argument("--log-file", type=str, help="Also write the merged stream to this file. The file is rotated once it reaches '--log-max-size'.", default=None)
+    logs.add_argument("--log-max-size", type=str, help="The size at which the '--log-file' is rotated.", default="10M")
+    logs.add_argument("--log-backups", type=int, help="The number of rotated log files to keep.", default=3)
+    logs.add_argument("--compress", action="store_true", help="Gzip the rotated log files.", default=False)
+    logs.set_defaults(cmd=run_logs)
+
+    # Subcommand that manages the warm container pool
+    pool = subparsers.add_parser("pool", description="List or clean up the warm containers used by 'docker run --reuse'.")
+    pool.add_argument("--prune", action="store_true", help="Remove every idle pooled container.", default=False)
+    pool.add_argument("--ttl", type=float, help="Remove pooled containers that have been idle for longer than this many seconds.", default=None)
+    pool.set_defaults(cmd=run_pool)
+
+    # Subcommand that manages the data volumes
+    data = subparsers.add_parser("data", description="List or clean up the data volumes used by 'docker run --data-volume'.")
+    data.add_argument("--prune", action="store_true", help="Remove every data volume that isn't in use.", default=False)
+    data.add_argument("--max-size", type=str, help="Remove the least recently used data volumes until the rest fit in this size.", default=None)
+    data.set_defaults(cmd=run_data)
+
+    # Subcommand that pre-pulls images
+    pull = subparsers.add_parser("pull", description="Pull the images used by the wa_cli concurrently and pin them in a lock file.")
+    pull.add_argument("--image", type=str, action="append", help="An additional image to pull. Multiple images can be provided.", default=[])
+    pull.add_argument("--workers", type=int, help="How many images to pull at once.", default=4)
+    pull.add_argument("--no-lock", action="store_true", help="Don't write a lock file.", default=False)
+    pull.set_defaults(cmd=run_pull)
+
+    # Subcommands that export and import images
+    bundle = subparsers.add_parser("bundle", description="Move images between machines without registry access.")
+    bundle_subparsers = bundle.add_subparsers(required=False)
+    bundle_save = bundle_subparsers.add_parser("save", description="Export images into a single compressed bundle.")
+    bundle_save.add_argument("-o", "--output", type=str, help="Where to write the bundle.", default="wa.bundle")
+    bundle_save.add_argument("--image", type=str, action="append", help="An additional image to bundle. Multiple images can be provided.", default=[])
+    bundle_save.add_argument("--only", action="store_true", help="Only bundle the images passed with '--image'.", default=False)
+    bundle_save.add_argument("--level", type=int, help="The zstd compression level.", default=3)
+    bundle_save.add_argument("--threads", type=int, help="How many threads to compress with. -1 uses every cpu.", default=-1)
+    bundle_save.set_defaults(cmd=run_bundle_save)
+    bundle_load = bundle_subparsers.add_parser("load", description="Load the images in a bundle.")
+    bundle_load.add_argument("bundle", type=str, help="The bundle to load.")
+    bundle_load.add_argument("--force", action="store_true", help="Load the bundle even if every image is already present.", default=False)
+    bundle_load.set_defaults(cmd=run_bundle_load)
+
+    # Subcommands that manage images
+    image = subparsers.add_parser("image", description="Manage the images used by the wa_cli.")
+    image_subparsers = image.add_subparsers(required=False)
+    image_prune = image_subparsers.add_parser("prune", description="Remove unused derived images built by 'docker run --requirements'.")
+    image_prune.add_argument("--max-age", type=float, help="Only remove images that haven't been used for this many seconds.", default=0)
+    image_prune.set_defaults(cmd=run_image_prune)
+    image_analyze = image_subparsers.add_parser("analyze", description="Break down the size of an image by layer and estimate its pull cost.")
+    image_analyze.add_argument("image", type=str, help="The image to analyze.")
+    image_analyze.add_argument("--top", type=int, help="How many of the largest layers and paths to report.", default=10)
+    image_analyze.add_argument("--bandwidth", type=float, help="The network bandwidth (MB/s) to estimate pull times with.", default=10)
+    image_analyze.add_argument("--extract-rate", type=float, help="The disk throughput (MB/s) to estimate extract times with.", default=100)
+    image_analyze.add_argument("--json", action="store_true", help="Print the report as json instead of a table.", default=False)
+    image_analyze.add_argument("--output", type=str, help="Also write the json report to this file.", default=None)
+    image_analyze.set_defaults(cmd=run_image_analyze)
+
+    # Subcommand that lists published ports
+    ports = subparsers.add_parser("ports", description="List the host ports published by running wa containers.")
+    ports.set_defaults(cmd=run_ports)
+
     # Subcommand that starts a docker network
     network = subparsers.add_parser("network", description="Initializes a network to be used for WA docker applications.")
     network.add_argument("--name", type=str, help="Name of the network to create.", default="wa")
     network.add_argument("--ip", type=str, help="The ip address to use when creating the network. All containers connected to it must be in the subnet 255.255.255.0 of this value.", default="172.20.0.0")
+    network.add_argument("--prefix", type=int, help="The prefix length of the network's subnet, i.e. 22 for four /24s. Larger networks allow more simulations to run side by side. Defaults to a /25.", default=None)
     network.set_defaults(cmd=run_network)
 
     return subparser
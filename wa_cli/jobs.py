@@ -0,0 +1,328 @@
+#
+# MIT License
+#
+# Copyright (c) 2018-2021 Wisconsin Autonomous
+#
+# See https://wa.wisc.edu
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""
+CLI command that manages a durable, local queue of containerized simulation runs
+"""
+
+# Imports from wa_cli
+from wa_cli.utils.logger import LOGGER, dumps_dict
+from wa_cli.utils.state import get_state_path
+from wa_cli.utils.ports import resolve_ports, release_ports
+from wa_cli.utils.cpus import resolve_cpus, release_cores
+from wa_cli.utils.ipam import release_ips
+
+# Docker imports
+from python_on_whales import docker
+
+# General imports
+from contextlib import closing
+import sqlite3
+import json
+import time
+
+# Possible job states
+PENDING = "pending"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    spec TEXT NOT NULL,
+    state TEXT NOT NULL,
+    container_id TEXT,
+    created REAL NOT NULL,
+    started REAL,
+    ended REAL,
+    exit_code INTEGER
+)
+"""
+
+def _connect():
+    conn = sqlite3.connect(str(get_state_path("jobs", "jobs.db")), timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(_SCHEMA)
+    return conn
+
+def _update(job_id, **fields):
+    assignments = ", ".join(f"{k} = ?" for k in fields)
+    with closing(_connect()) as conn:
+        conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+def _get_jobs(*states, ids=None):
+    query = "SELECT * FROM jobs"
+    clauses, params = [], []
+    if states:
+        clauses.append(f"state IN ({', '.join('?' * len(states))})")
+        params.extend(states)
+    if ids:
+        clauses.append(f"id IN ({', '.join('?' * len(ids))})")
+        params.extend(ids)
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    with closing(_connect()) as conn:
+        return conn.execute(query + " ORDER BY id", params).fetchall()
+
+def _claim_next_job():
+    # BEGIN IMMEDIATE takes the write lock so two workers (or two schedulers) never claim the same job
+    with closing(_connect()) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        job = conn.execute("SELECT * FROM jobs WHERE state = ? ORDER BY id LIMIT 1", (PENDING,)).fetchone()
+        if job is not None:
+            conn.execute("UPDATE jobs SET state = ?, started = ? WHERE id = ?", (RUNNING, time.time(), job["id"]))
+        conn.execute("COMMIT")
+    return job
+
+def _container_name(job):
+    return f"wa-job-{job['id']}"
+
+def _release_leases(name):
+    # Releases the ips, host ports and cores leased to a job's container
+    release_ips(name)
+    release_ports(name)
+    release_cores(name)
+
+def _finish_job(job, container):
+    exit_code = docker.wait(container)
+
+    # Save the logs before the container is removed
+    log_file = get_state_path("jobs", "logs", f"{job['id']}.log")
+    with open(log_file, "w") as f:
+        f.write(docker.container.logs(container))
+    docker.container.remove(container, force=True)
+    _release_leases(_container_name(job))
+
+    # A job cancelled while running keeps its 'cancelled' state
+    state = _get_jobs(ids=[job["id"]])[0]["state"]
+    if state != CANCELLED:
+        state = SUCCEEDED if exit_code == 0 else FAILED
+    _update(job["id"], state=state, ended=time.time(), exit_code=exit_code)
+    LOGGER.info(f"Job {job['id']} finished with state '{state}' (exit code {exit_code}).")
+
+def _start_job(job, concurrent=False):
+    config = json.loads(job["spec"])["config"]
+    config["name"] = _container_name(job)
+    config["volumes"] = [tuple(v) for v in config["volumes"]]
+    if concurrent:
+        # Static ips and host ports can't be shared between containers running at the same time
+        if config["ip"] != "auto":
+            config["ip"] = None
+        config["publish"] = [p for p in config["publish"] if p[-2] == "auto"]
+
+    # Whatever was leased before a failure (i.e. the network ran out of addresses) is released right away
+    try:
+        resolve_ports(config)
+        if config["ip"] == "auto":
+            from wa_cli.utils.ipam import allocate_ip
+            config["ip"] = allocate_ip(config["networks"][0], config["name"]) if config["networks"][0] is not None else None
+        resolve_cpus(config)
+
+        # The container is _not_ removed automatically so the exit code survives a crash of the scheduler
+        container = docker.run(**config, detach=True)
+    except BaseException:
+        _release_leases(config["name"])
+        raise
+    _update(job["id"], container_id=container.id)
+    LOGGER.info(f"Started job {job['id']} in container '{config['name']}'.")
+    return container
+
+def _reconcile():
+    """Match jobs marked as running against the containers that are actually alive.
+
+    Returns the jobs whose containers are still running so the scheduler can wait on them.
+    """
+    alive = []
+    for job in _get_jobs(RUNNING):
+        name = _container_name(job)
+        if not docker.container.exists(name):
+            LOGGER.info(f"Job {job['id']} has no container. Re-queueing it.")
+            _update(job["id"], state=PENDING, container_id=None, started=None)
+        elif docker.container.inspect(name).state.running:
+            LOGGER.info(f"Job {job['id']} is still running. Re-attaching to it.")
+            alive.append(job)
+        else:
+            LOGGER.info(f"Job {job['id']} finished while the scheduler was down. Recording its result.")
+            _finish_job(job, name)
+    return alive
+
+def _worker(attached, concurrent):
+    while True:
+        try:
+            job = attached.pop()
+            container = _container_name(job)
+        except IndexError:
+            job = _claim_next_job()
+            if job is None:
+                return
+            try:
+                container = _start_job(job, concurrent)
+            except Exception as e:
+                LOGGER.error(f"Job {job['id']} failed to start: {e}")
+                _update(job["id"], state=FAILED, ended=time.time())
+                continue
+        _finish_job(job, container)
+
+def run_submit(args):
+    """The `submit` command adds a containerized run to the local job queue.
+
+    It accepts the exact same arguments as `wa docker run`; the resolved container configuration is
+    recorded in a SQLite database in the `wa_cli` state directory (`~/.wa_cli` by default, or
+    `$WA_CLI_STATE_DIR`). Nothing is run until `wa jobs resume` is called.
+
+    ```bash
+    for i in $(seq 0 99); do
+        wa jobs submit --wasim --data ../data demo_bridge_server.py --seed $i
+    done
+    wa jobs resume --workers 4
+    ```
+    """
+    LOGGER.info("Running 'jobs submit' entrypoint...")
+
+    from wa_cli.docker_cli import _prepare_run
+
+    spec = {"config": _prepare_run(args), "vnc": args.wasim and not args.no_vnc}
+    LOGGER.debug(f"Submitting job with the following spec: {dumps_dict(spec)}")
+    if not args.dry_run:
+        with closing(_connect()) as conn:
+            cursor = conn.execute("INSERT INTO jobs (spec, state, created) VALUES (?, ?, ?)", (json.dumps(spec), PENDING, time.time()))
+        print(cursor.lastrowid)
+
+def run_status(args):
+    """The `status` command prints the state of each job in the queue."""
+    LOGGER.info("Running 'jobs status' entrypoint...")
+
+    jobs = _get_jobs(*args.state, ids=args.ids)
+    print(f"{'ID':>6}  {'STATE':<10}  {'EXIT':>4}  {'DURATION':>9}  COMMAND")
+    for job in jobs:
+        spec = json.loads(job["spec"])
+        exit_code = "" if job["exit_code"] is None else job["exit_code"]
+        duration = ""
+        if job["started"] is not None:
+            duration = f"{(job['ended'] or time.time()) - job['started']:.1f}s"
+        print(f"{job['id']:>6}  {job['state']:<10}  {exit_code:>4}  {duration:>9}  {' '.join(spec['config']['command'])}")
+
+def run_resume(args):
+    """The `resume` command drains the job queue with a pool of workers.
+
+    Before any new job is started, the queue is reconciled against the containers on this machine:
+    jobs whose container is still running are waited on, jobs whose container exited while nothing was
+    watching have their result recorded, and jobs whose container disappeared are re-queued. This makes
+    it safe to simply rerun `wa jobs resume` after the laptop slept or the shell died; finished work is
+    never redone.
+
+    Because each job runs detached, stopping the scheduler (i.e. ctrl+c) leaves the running containers untouched.
+    """
+    LOGGER.info("Running 'jobs resume' entrypoint...")
+
+    import threading
+
+    if args.dry_run:
+        for job in _get_jobs(PENDING, RUNNING):
+            LOGGER.info(f"Would run job {job['id']} with the following spec: {job['spec']}")
+        return
+
+    from types import SimpleNamespace
+    from wa_cli.docker_cli import _try_create_network, _try_create_default_vnc
+
+    attached = _reconcile()
+
+    # Create the networks and vnc containers the jobs rely on up front instead of in each worker
+    specs = [json.loads(job["spec"]) for job in _get_jobs(PENDING)]
+    for network in set(spec["config"]["networks"][0] for spec in specs):
+        if network is not None:
+            _try_create_network(network)
+    if any(spec["vnc"] for spec in specs):
+        _try_create_default_vnc(SimpleNamespace(dry_run=False))
+
+    if args.workers > 1:
+        LOGGER.warn("Running jobs concurrently. Static ips and host ports (other than 'auto') will be ignored.")
+
+    # Daemon threads are used so that exiting the scheduler doesn't block on running containers
+    workers = [threading.Thread(target=_worker, args=(attached, args.workers > 1), daemon=True) for _ in range(args.workers)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        while worker.is_alive():
+            worker.join(timeout=1)
+
+    LOGGER.info("Job queue has been drained.")
+
+def run_cancel(args):
+    """The `cancel` command cancels pending jobs and stops running ones."""
+    LOGGER.info("Running 'jobs cancel' entrypoint...")
+
+    if not args.all and not args.ids:
+        LOGGER.warn("No jobs were passed to cancel. Pass '--all' to cancel every job.")
+        return
+
+    for job in _get_jobs(PENDING, RUNNING, ids=None if args.all else args.ids):
+        LOGGER.info(f"Cancelling job {job['id']}...")
+        if args.dry_run:
+            continue
+        _update(job["id"], state=CANCELLED, ended=time.time())
+        if job["state"] == RUNNING and docker.container.exists(_container_name(job)):
+            docker.container.stop(_container_name(job))
+
+def init(subparser):
+    """Initializer method for the `jobs` entrypoint.
+
+    Overnight batches of simulation runs are fragile when started with a plain `wa docker run` loop:
+    if the shell dies, all progress is lost. The `jobs` entrypoint records each run in a durable
+    local queue so that batches can be stopped and resumed without redoing finished work.
+    """
+    LOGGER.debug("Initializing 'jobs' entrypoint...")
+
+    from wa_cli.docker_cli import _add_run_args
+
+    # Create some entrypoints for additional commands
+    subparsers = subparser.add_subparsers(required=False)
+
+    # Subcommand that adds a run to the queue
+    submit = subparsers.add_parser("submit", description="Add a 'docker run' invocation to the job queue.")
+    _add_run_args(submit)
+    submit.set_defaults(cmd=run_submit)
+
+    # Subcommand that prints the queue
+    status = subparsers.add_parser("status", description="Print the state of the jobs in the queue.")
+    status.add_argument("ids", type=int, nargs="*", help="The jobs to print. Defaults to all of them.")
+    status.add_argument("--state", type=str, action="append", choices=[PENDING, RUNNING, SUCCEEDED, FAILED, CANCELLED], help="Only print jobs with this state.", default=[])
+    status.set_defaults(cmd=run_status)
+
+    # Subcommand that drains the queue
+    resume = subparsers.add_parser("resume", description="Reconcile the queue with the running containers and run all pending jobs.")
+    resume.add_argument("-j", "--workers", type=int, help="The number of jobs to run concurrently.", default=1)
+    resume.set_defaults(cmd=run_resume)
+
+    # Subcommand that cancels jobs
+    cancel = subparsers.add_parser("cancel", description="Cancel pending or running jobs.")
+    cancel.add_argument("ids", type=int, nargs="*", help="The jobs to cancel.")
+    cancel.add_argument("--all", action="store_true", help="Cancel every pending or running job.", default=False)
+    cancel.set_defaults(cmd=run_cancel)
+
+    return subparser
@@ -0,0 +1,262 @@
+#
+# MIT License
+#
+# Copyright (c) 2018-2021 Wisconsin Autonomous
+#
+# See https://wa.wisc.edu
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""
+Endpoints for ``wa bridge bench``, which measures the latency and throughput of the simulator bridge.
+
+This file is mounted into containers and run with the container's python, so it must only depend on
+the standard library. It has two modes:
+
+- ``echo``: Send every message received on a port straight back to its sender.
+- ``client``: Send timestamped messages to an ``echo`` endpoint at a fixed rate for each message size and
+  rate, and print the round trip latency, throughput and number of dropped messages as JSON.
+"""
+
+import argparse
+import itertools
+import json
+import math
+import select
+import socket
+import struct
+import sys
+import threading
+import time
+
+# Every message starts with its sequence number and the time it was sent
+_HEADER = struct.Struct("!Qd")
+
+# TCP is a stream, so messages are prefixed with their length
+_LENGTH = struct.Struct("!I")
+
+# The largest payload of a single UDP datagram
+MAX_UDP_SIZE = 65507
+
+
+def _recv_exactly(conn, n):
+    data = bytearray()
+    while len(data) < n:
+        chunk = conn.recv(n - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return bytes(data)
+
+
+def _echo_tcp_connection(conn):
+    with conn:
+        while True:
+            data = conn.recv(1 << 16)
+            if not data:
+                return
+            conn.sendall(data)
+
+
+def echo(args):
+    if args.protocol == "udp":
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 22)
+        sock.bind(("", args.port))
+        print(f"Echoing udp on port {args.port}", flush=True)
+        while True:
+            data, address = sock.recvfrom(1 << 16)
+            sock.sendto(data, address)
+    else:
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind(("", args.port))
+        server.listen(16)
+        print(f"Echoing tcp on port {args.port}", flush=True)
+        while True:
+            conn, _ = server.accept()
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=_echo_tcp_connection, args=(conn,), daemon=True).start()
+
+
+def _connect(args):
+    # The echo endpoint may still be starting up, so retry for a little while
+    deadline = time.time() + args.connect_timeout
+    while True:
+        try:
+            if args.protocol == "udp":
+                sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 22)
+                sock.connect((args.host, args.port))
+                _ping_udp(sock)
+            else:
+                sock = socket.create_connection((args.host, args.port), timeout=1)
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.settimeout(0.1)
+            return sock
+        except OSError:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def _ping_udp(sock):
+    sock.settimeout(0.5)
+    sock.send(_HEADER.pack(0, 0.0))
+    sock.recv(1 << 16)
+
+
+def _percentile(values, p):
+    if not values:
+        return None
+    return values[max(0, math.ceil(p * len(values)) - 1)]
+
+
+def _measure(sock, args, size, rate):
+    count = max(1, int(rate * args.duration))
+    padding = b"\0" * (size - _HEADER.size)
+    rtts = {}
+    last_received = [None]
+    done = threading.Event()
+    error = None
+    if args.protocol == "tcp":
+        # A send that times out part way through a frame would corrupt the stream, so tcp sends block.
+        # The receiver polls with select instead of relying on the socket timeout.
+        sock.settimeout(None)
+
+    def receive():
+        # Keep reading until the sender is done and the stragglers have had time to arrive
+        buffer = b""
+        while not done.is_set():
+            try:
+                if args.protocol == "udp":
+                    messages = [sock.recv(1 << 16)]
+                else:
+                    if not select.select([sock], [], [], 0.1)[0]:
+                        continue
+                    data = sock.recv(1 << 20)
+                    if not data:
+                        break  # The echo endpoint closed the connection
+                    buffer += data
+                    messages = []
+                    while len(buffer) >= _LENGTH.size:
+                        (length,) = _LENGTH.unpack_from(buffer)
+                        if len(buffer) < _LENGTH.size + length:
+                            break
+                        messages.append(buffer[_LENGTH.size:_LENGTH.size + length])
+                        buffer = buffer[_LENGTH.size + length:]
+            except socket.timeout:
+                continue
+            now = time.perf_counter()
+            for message in messages:
+                seq, sent = _HEADER.unpack_from(message)
+                if sent == 0.0:
+                    continue  # A late response to the connection check
+                rtts.setdefault(seq, now - sent)
+                last_received[0] = now
+
+    receiver = threading.Thread(target=receive, daemon=True)
+    receiver.start()
+
+    start = time.perf_counter()
+    for seq in range(count):
+        # Send on a fixed schedule so a slow response doesn't lower the offered rate
+        delay = start + seq / rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        message = _HEADER.pack(seq, time.perf_counter()) + padding
+        if args.protocol == "udp":
+            try:
+                sock.send(message)
+            except OSError:
+                pass  # Counted as dropped
+        else:
+            try:
+                sock.sendall(_LENGTH.pack(len(message)) + message)
+            except OSError as e:
+                # The rest of the stream can't be trusted, so the run is reported as failed
+                error = f"send failed after {seq} messages: {e}"
+                count = seq
+                break
+
+    deadline = time.perf_counter() + args.timeout
+    while len(rtts) < count and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    done.set()
+    receiver.join()
+
+    latencies = sorted(rtts.values())
+    elapsed = (last_received[0] or time.perf_counter()) - start
+    received = len(latencies)
+    return {
+        "size": size,
+        "rate": rate,
+        "error": error,
+        "sent": count,
+        "received": received,
+        "dropped": count - received,
+        "p50_ms": _percentile(latencies, 0.5) * 1e3 if latencies else None,
+        "p99_ms": _percentile(latencies, 0.99) * 1e3 if latencies else None,
+        "max_ms": latencies[-1] * 1e3 if latencies else None,
+        "throughput_msgs": received / elapsed if elapsed > 0 else None,
+        "throughput_mbps": received * size * 8 / elapsed / 1e6 if elapsed > 0 else None,
+    }
+
+
+def client(args):
+    sizes = [int(s) for s in args.sizes.split(",")]
+    rates = [float(r) for r in args.rates.split(",")]
+    for size in sizes:
+        if size < _HEADER.size or (args.protocol == "udp" and size > MAX_UDP_SIZE):
+            print(f"bridge_bench: message sizes must be between {_HEADER.size} and {MAX_UDP_SIZE} bytes, got {size}", file=sys.stderr)
+            sys.exit(1)
+
+    results = []
+    for size, rate in itertools.product(sizes, rates):
+        # Use a fresh connection for every run so a backlog from the last one can't skew it
+        with _connect(args) as sock:
+            results.append(_measure(sock, args, size, rate))
+    json.dump(results, sys.stdout)
+    print(flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Endpoints for benchmarking the simulator bridge")
+    parser.add_argument("--port", type=int, default=5555, help="The port to echo on or send to.")
+    parser.add_argument("--protocol", type=str, choices=["udp", "tcp"], default="udp", help="The transport to use.")
+    subparsers = parser.add_subparsers(required=True)
+
+    echo_parser = subparsers.add_parser("echo")
+    echo_parser.set_defaults(cmd=echo)
+
+    client_parser = subparsers.add_parser("client")
+    client_parser.add_argument("--host", type=str, default="127.0.0.1", help="The address of the echo endpoint.")
+    client_parser.add_argument("--sizes", type=str, default="64,1024,16384", help="Comma separated list of message sizes in bytes.")
+    client_parser.add_argument("--rates", type=str, default="100,1000", help="Comma separated list of message rates in messages per second.")
+    client_parser.add_argument("--duration", type=float, default=2, help="How long to send for at each size and rate, in seconds.")
+    client_parser.add_argument("--timeout", type=float, default=1, help="How long to wait for outstanding responses before counting them as dropped.")
+    client_parser.add_argument("--connect-timeout", type=float, default=10, help="How long to wait for the echo endpoint to come up.")
+    client_parser.set_defaults(cmd=client)
+
+    args = parser.parse_args()
+    args.cmd(args)
+
+
+if __name__ == "__main__":
+    main()
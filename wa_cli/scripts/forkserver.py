@@ -0,0 +1,196 @@
+#
+# MIT License
+#
+# Copyright (c) 2018-2021 Wisconsin Autonomous
+#
+# See https://wa.wisc.edu
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""
+A small forkserver that's injected into simulation containers by ``wa docker run --preload``.
+
+This file is copied into the container and run with the container's python, so it must only depend on
+the standard library. It has two modes:
+
+- ``serve``: Import a list of modules once, then listen on a unix socket. For each connection, a child is
+  forked (inheriting the already imported modules) that runs the requested script.
+- ``run``: Connect to the server, hand over this process's stdin/stdout/stderr and wait for the
+  script's exit code. This is the command that's run with ``docker exec``.
+"""
+
+import argparse
+import importlib
+import array
+import json
+import os
+import select
+import signal
+import socket
+import sys
+import time
+
+
+def _send_request(conn, request):
+    fds = [sys.stdin.fileno(), sys.stdout.fileno(), sys.stderr.fileno()]
+    conn.sendmsg([json.dumps(request).encode() + b"\n"], [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array("i", fds))])
+
+
+def _recv_request(conn):
+    fds = array.array("i")
+    msg, ancdata, _, _ = conn.recvmsg(1 << 20, socket.CMSG_LEN(3 * fds.itemsize))
+    for level, kind, data in ancdata:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(data[:len(data) - (len(data) % fds.itemsize)])
+    return json.loads(msg.decode()), list(fds)
+
+
+def _run_script(request, fds):
+    import runpy
+
+    os.setsid()
+    for target, fd in enumerate(fds):
+        os.dup2(fd, target)
+        os.close(fd)
+    sys.stdout.reconfigure(write_through=True)
+
+    os.chdir(request["cwd"])
+    os.environ.clear()
+    os.environ.update(request["env"])
+    sys.argv = list(request["argv"])
+    sys.path[0] = os.path.dirname(os.path.abspath(sys.argv[0]))
+
+    exit_code = 0
+    try:
+        runpy.run_path(sys.argv[0], run_name="__main__")
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except BaseException:
+        import traceback
+        traceback.print_exc()
+        exit_code = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    os._exit(exit_code)
+
+
+def _handle(conn):
+    # Runs in a forked handler process: fork the script, then wait for it or for the client to disconnect
+    request, fds = _recv_request(conn)
+    pid = os.fork()
+    if pid == 0:
+        conn.close()
+        _run_script(request, fds)
+    for fd in fds:
+        os.close(fd)
+
+    while True:
+        done, status = os.waitpid(pid, os.WNOHANG)
+        if done:
+            exit_code = os.waitstatus_to_exitcode(status) if hasattr(os, "waitstatus_to_exitcode") else (status >> 8)
+            conn.sendall(f"{exit_code}\n".encode())
+            break
+        readable, _, _ = select.select([conn], [], [], 0.05)
+        if readable and not conn.recv(1, socket.MSG_PEEK):
+            # The client went away (i.e. the exec was cancelled), so stop the script too
+            try:
+                os.killpg(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                os.kill(pid, signal.SIGTERM)
+            os.waitpid(pid, 0)
+            break
+    os._exit(0)
+
+
+def serve(args):
+    start = time.time()
+    for module in filter(None, args.preload.split(",")):
+        try:
+            importlib.import_module(module)
+        except ImportError as e:
+            print(f"forkserver: failed to preload '{module}': {e}", file=sys.stderr)
+    print(f"forkserver: preloaded '{args.preload}' in {time.time() - start:.2f}s", file=sys.stderr)
+
+    # Handlers are reaped automatically
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+
+    if os.path.exists(args.socket):
+        os.unlink(args.socket)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(args.socket + ".tmp")
+    server.listen(64)
+    # The socket only appears once the server is ready to accept connections
+    os.rename(args.socket + ".tmp", args.socket)
+
+    while True:
+        conn, _ = server.accept()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        if os.fork() == 0:
+            server.close()
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            _handle(conn)
+        conn.close()
+
+
+def run(args):
+    if args.pidfile is not None:
+        # Killing this client (i.e. 'kill $(cat <pidfile>)') makes the server stop the script
+        with open(args.pidfile, "w") as f:
+            f.write(str(os.getpid()))
+
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    deadline = time.time() + args.timeout
+    while True:
+        try:
+            conn.connect(args.socket)
+            break
+        except (FileNotFoundError, ConnectionRefusedError):
+            if time.time() > deadline:
+                print(f"forkserver: no server is listening on '{args.socket}'", file=sys.stderr)
+                sys.exit(1)
+            time.sleep(0.05)
+
+    _send_request(conn, {"argv": args.argv, "cwd": os.getcwd(), "env": dict(os.environ)})
+    response = conn.makefile().readline()
+    sys.exit(int(response) if response else 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Forkserver for preloaded simulation scripts")
+    parser.add_argument("--socket", type=str, default="/tmp/wa_forkserver.sock", help="The unix socket to listen on or connect to.")
+    subparsers = parser.add_subparsers(required=True)
+
+    serve_parser = subparsers.add_parser("serve")
+    serve_parser.add_argument("--preload", type=str, default="", help="Comma separated list of modules to import up front.")
+    serve_parser.set_defaults(cmd=serve)
+
+    run_parser = subparsers.add_parser("run")
+    run_parser.add_argument("--timeout", type=float, default=30, help="How long to wait for the server to start.")
+    run_parser.add_argument("--pidfile", type=str, default=None, help="Write the pid of this client to this file.")
+    run_parser.add_argument("argv", nargs=argparse.REMAINDER, help="The script to run and its arguments.")
+    run_parser.set_defaults(cmd=run)
+
+    args = parser.parse_args()
+    args.cmd(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+#
+# MIT License
+#
+# Copyright (c) 2018-2021 Wisconsin Autonomous
+#
+# See https://wa.wisc.edu
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+# Import some utils
+from wa_cli.utils.logger import LOGGER
+
+# External library imports
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional
+import hashlib
+import json
+import re
+import os
+
+
+def _translate(pattern: str) -> str:
+    # Translates a .dockerignore pattern to a regex. Like Go's filepath.Match, '*' doesn't match '/' but '**' does.
+    regex, i = "", 0
+    while i < len(pattern):
+        if pattern.startswith("**", i):
+            regex += ".*"
+            i += 2
+            if pattern.startswith("/", i):
+                regex += "/?"
+                i += 1
+            continue
+        c = pattern[i]
+        regex += "[^/]*" if c == "*" else "[^/]" if c == "?" else re.escape(c)
+        i += 1
+    # A pattern that matches a directory also matches everything in it
+    return regex + "(/.*)?"
+
+
+def dockerignore_matcher(dockerignore: str) -> Callable[[str], bool]:
+    """
+    Build a function that checks whether a path is excluded from a build context by a ``.dockerignore`` file.
+
+    The last pattern that matches a path decides whether it's excluded, and patterns starting with ``!`` re-include paths.
+
+    Args:
+        dockerignore (str): The contents of the ``.dockerignore`` file
+
+    Returns:
+        Callable[[str], bool]: Takes a path relative to the context (with ``/`` separators) and returns True if it's excluded
+    """
+    rules = []
+    for line in dockerignore.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        include = line.startswith("!")
+        pattern = os.path.normpath(line.lstrip("!").strip()).replace(os.sep, "/").lstrip("/")
+        if pattern == ".":
+            continue
+        rules.append((re.compile(_translate(pattern)), include))
+
+    def is_excluded(path: str) -> bool:
+        excluded = False
+        for regex, include in rules:
+            if regex.fullmatch(path):
+                excluded = not include
+        return excluded
+
+    return is_excluded
+
+
+def context_files(context: Path, dockerignore: str = "") -> List[Path]:
+    """
+    List the files docker sends as the build context, i.e. every file in ``context`` that isn't excluded by ``dockerignore``.
+
+    Args:
+        context (Path): The build context
+        dockerignore (str): The contents of the ``.dockerignore`` file that applies to the context
+
+    Returns:
+        List[Path]: The files, sorted
+    """
+    is_excluded = dockerignore_matcher(dockerignore)
+    # Excluded directories can't be skipped if a later pattern might re-include something in them
+    can_prune = not any(line.strip().startswith("!") for line in dockerignore.splitlines())
+
+    files = []
+    for dirpath, dirnames, filenames in os.walk(context):
+        relative = Path(dirpath).relative_to(context).as_posix()
+        prefix = "" if relative == "." else relative + "/"
+        if can_prune:
+            dirnames[:] = [d for d in dirnames if not is_excluded(prefix + d)]
+        files.extend(Path(dirpath) / f for f in filenames if not is_excluded(prefix + f))
+    return sorted(files)
+
+
+def _stat_signature(files: Iterable[Path], context: Path) -> str:
+    # Hashes the names, sizes and modification times of the files. Much cheaper than hashing the contents.
+    hasher = hashlib.sha256()
+    for f in files:
+        stat = f.stat()
+        hasher.update(json.dumps([f.relative_to(context).as_posix(), stat.st_size, stat.st_mtime_ns]).encode())
+    return hasher.hexdigest()
+
+
+def _content_hash(files: Iterable[Path], context: Path) -> str:
+    hasher = hashlib.sha256()
+    for f in files:
+        hasher.update(f.relative_to(context).as_posix().encode())
+        with open(f, "rb") as fp:
+            for chunk in iter(lambda: fp.read(1 << 20), b""):
+                hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def fingerprint_build(root: Path, build, dockerignore: Optional[str] = None, state: Optional[dict] = None) -> str:
+    """
+    Compute the fingerprint of a docker compose service's build, which changes whenever the image has to be rebuilt.
+
+    The fingerprint covers the build section itself (context, Dockerfile path, build args, target, etc.), the
+    contents of the Dockerfile and the contents of every file in the build context that isn't excluded by the
+    ``.dockerignore``. Hashing a large context is slow, so the content hash is only recomputed when the names,
+    sizes or modification times of the files change; pass the same ``state`` dictionary across calls to keep them.
+
+    Args:
+        root (Path): The directory of the docker compose file. Relative contexts are resolved against it.
+        build: The ``build`` section of the service (a dict or a context path)
+        dockerignore (str): The contents of the ``.dockerignore`` file that applies to the context. If None, the context's own ``.dockerignore`` is used.
+        state (dict): Where the content hashes are cached. Edited in place.
+
+    Returns:
+        str: The fingerprint
+    """
+    build = {"context": build} if isinstance(build, str) else dict(build)
+    context = (Path(root) / build.get("context", ".")).resolve()
+    dockerfile = context / build.get("dockerfile", "Dockerfile")
+    if dockerignore is None:
+        dockerignore = (context / ".dockerignore").read_text() if (context / ".dockerignore").is_file() else ""
+
+    files = context_files(context, dockerignore)
+    signature = _stat_signature(files, context)
+    entry = (state if state is not None else {}).setdefault("contexts", {}).get(str(context))
+    if entry is not None and entry["signature"] == signature and entry["dockerignore"] == dockerignore:
+        content_hash = entry["hash"]
+    else:
+        LOGGER.debug(f"Hashing the build context '{context}'...")
+        content_hash = _content_hash(files, context)
+        if state is not None:
+            state["contexts"][str(context)] = {"signature": signature, "dockerignore": dockerignore, "hash": content_hash}
+
+    # Where the cache is imported from and exported to doesn't change the image
+    build = {k: v for k, v in build.items() if k not in ("cache_from", "cache_to")}
+    hasher = hashlib.sha256()
+    hasher.update(json.dumps(build, sort_keys=True, default=str).encode())
+    hasher.update(dockerfile.read_bytes() if dockerfile.is_file() else b"")
+    hasher.update(content_hash.encode())
+    return hasher.hexdigest()
@@ -0,0 +1,217 @@
+#
+# MIT License
+#
+# Copyright (c) 2018-2021 Wisconsin Autonomous
+#
+# See https://wa.wisc.edu
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+# Import some utils
+from wa_cli.utils.logger import LOGGER
+
+# Docker imports
+from python_on_whales import docker, exceptions as docker_exceptions
+
+# External library imports
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional
+import subprocess
+import shutil
+import os
+import re
+import sys
+
+BUILDER = "wa-cli"
+"""Name of the buildx builder used when exporting the build cache. The default ``docker`` driver can't export caches."""
+
+_VERTEX_LINE = re.compile(r"^#(\d+) (.*)$")
+_DONE = re.compile(r"^DONE (\d+(?:\.\d+)?)s$")
+_STEP = re.compile(r"^\[(.*?)\s*(?:\d+/\d+)?\] (.*)$")
+
+
+def ensure_builder(name: str = BUILDER) -> str:
+    """
+    Create the buildx builder that's used to import and export local build caches, if it doesn't exist.
+
+    Args:
+        name (str): The name of the builder
+
+    Returns:
+        str: The name of the builder
+    """
+    try:
+        docker.buildx.inspect(name)
+    except docker_exceptions.DockerException:
+        LOGGER.info(f"Creating buildx builder '{name}'...")
+        docker.buildx.create(name=name, driver="docker-container")
+    return name
+
+
+def add_build_cache(compose: dict, cache_dir: str, project: str) -> List[Path]:
+    """
+    Configure every service that's built in a docker compose file to import and export a local BuildKit cache.
+
+    Each service has its own cache directory (``<cache_dir>/<project>/<service>``), so services don't evict each
+    other's layers. The cache is exported to a sibling ``.new`` directory; call :func:`rotate_build_cache` once the
+    build succeeds to replace the old cache with it. The local cache is never garbage collected, so exporting
+    into the directory that was imported from would grow it forever.
+
+    Args:
+        compose (dict): The docker compose file. It's edited in place.
+        cache_dir (str): The root of the cache directories (i.e. a directory restored by CI)
+        project (str): The name of the project
+
+    Returns:
+        List[Path]: The cache directory of each service that's built
+    """
+    dirs = []
+    for name, service in compose.get("services", {}).items():
+        if "build" not in service:
+            continue
+        if isinstance(service["build"], str):
+            service["build"] = {"context": service["build"]}
+
+        path = Path(cache_dir).expanduser().resolve() / project / name
+        if (path / "index.json").is_file():
+            service["build"].setdefault("cache_from", []).append(f"type=local,src={path}")
+        service["build"].setdefault("cache_to", []).append(f"type=local,dest={path}.new,mode=max")
+        dirs.append(path)
+    return dirs
+
+
+def rotate_build_cache(dirs: Iterable[Path], success: bool = True):
+    """
+    Replace each cache directory with the cache that was just exported next to it.
+
+    Args:
+        dirs (Iterable[Path]): The cache directories returned by :func:`add_build_cache`
+        success (bool): Whether the build succeeded. If not, the partially exported caches are removed instead.
+    """
+    for path in dirs:
+        new = path.with_name(path.name + ".new")
+        if not new.is_dir():
+            continue
+        if success:
+            shutil.rmtree(path, ignore_errors=True)
+            new.rename(path)
+        else:
+            shutil.rmtree(new, ignore_errors=True)
+
+
+def parse_build_progress(lines: Iterable[str]) -> List[dict]:
+    """
+    Parse the steps of a build out of BuildKit's ``plain`` progress output.
+
+    Every step (a "vertex") is printed as ``#<id> <name>`` when it starts, followed by its output and then either
+    ``#<id> CACHED`` or ``#<id> DONE <seconds>s``. Steps of a Dockerfile are named ``[<stage> <i>/<n>] <instruction>``;
+    compose prefixes the stage with the service.
+
+    Args:
+        lines (Iterable[str]): The lines of the progress output
+
+    Returns:
+        List[dict]: The steps, in the order they started, with their ``stage``, ``step``, ``seconds`` and whether they were ``cached``
+    """
+    steps = {}
+    for line in lines:
+        match = _VERTEX_LINE.match(line.rstrip())
+        if match is None:
+            continue
+        vertex, rest = match.groups()
+        if vertex == "0":
+            # Describes the builder, not a step
+            continue
+        if vertex not in steps:
+            # Steps that aren't part of a Dockerfile (i.e. importing and exporting caches) are done by buildkit itself
+            step = _STEP.match(rest)
+            stage, name = step.groups() if step is not None else ("buildkit", rest)
+            steps[vertex] = {"stage": stage, "step": name, "seconds": 0.0, "cached": False, "error": False}
+        elif rest == "CACHED":
+            steps[vertex]["cached"] = True
+        elif rest.startswith("ERROR"):
+            steps[vertex]["error"] = True
+        else:
+            done = _DONE.match(rest)
+            if done is not None:
+                steps[vertex]["seconds"] = float(done.group(1))
+    return list(steps.values())
+
+
+def summarize_build(steps: List[dict], top: int = 10) -> dict:
+    """
+    Summarize the steps of a build per stage.
+
+    Args:
+        steps (List[dict]): The steps returned by :func:`parse_build_progress`
+        top (int): How many of the slowest steps to include
+
+    Returns:
+        dict: The total time and cache hits, the time per stage and the slowest steps
+    """
+    stages = {}
+    for step in steps:
+        stage = stages.setdefault(step["stage"], {"stage": step["stage"], "seconds": 0.0, "steps": 0, "cached": 0})
+        stage["seconds"] += step["seconds"]
+        stage["steps"] += 1
+        stage["cached"] += step["cached"]
+    return {
+        "seconds": sum(step["seconds"] for step in steps),
+        "steps": len(steps),
+        "cached": sum(step["cached"] for step in steps),
+        "stages": sorted(stages.values(), key=lambda s: -s["seconds"]),
+        "slowest": sorted(steps, key=lambda s: -s["seconds"])[:top],
+    }
+
+
+def print_build_summary(summary: dict):
+    """Print the summary returned by :func:`summarize_build` as a table."""
+    print(f"\nBuild steps: {summary['steps']} ({summary['cached']} cached), {summary['seconds']:.1f}s total")
+    print(f"\n{'SECONDS':>8}  {'STEPS':>5}  {'CACHED':>6}  STAGE")
+    for stage in summary["stages"]:
+        print(f"{stage['seconds']:>8.1f}  {stage['steps']:>5}  {stage['cached']:>6}  {stage['stage']}")
+    print(f"\n{'SECONDS':>8}  STEP")
+    for step in summary["slowest"]:
+        print(f"{step['seconds']:>8.1f}  [{step['stage']}] {step['step'][:100]}")
+
+
+def run_build(cmd: List[str], env: Optional[dict] = None):
+    """
+    Run a build command with BuildKit's ``plain`` progress output, forwarding the output as it's produced.
+
+    Args:
+        cmd (List[str]): The command to run (i.e. ``docker compose build``)
+        env (dict): The environment to run the command with. ``BUILDKIT_PROGRESS`` is set to ``plain``.
+
+    Returns:
+        Tuple[int, List[dict]]: The return code of the command and the steps parsed by :func:`parse_build_progress`
+    """
+    LOGGER.info(" ".join(cmd))
+    env = dict(env if env is not None else os.environ, BUILDKIT_PROGRESS="plain")
+    with subprocess.Popen(cmd, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, errors="replace") as process:
+        steps = parse_build_progress(_tee(process.stdout))
+    return process.returncode, steps
+
+
+def _tee(lines: Iterable[str]) -> Iterator[str]:
+    for line in lines:
+        sys.stdout.write(line)
+        sys.stdout.flush()
+        yield line
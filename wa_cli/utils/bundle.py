@@ -0,0 +1,146 @@
+#
+# MIT License
+#
+# Copyright (c) 2018-2021 Wisconsin Autonomous
+#
+# See https://wa.wisc.edu
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+# Import some utils
+from wa_cli.utils.logger import LOGGER
+
+# Docker imports
+from python_on_whales import docker
+
+# External library imports
+from typing import Iterable, Iterator
+import json
+import time
+
+BUNDLE_VERSION = 1
+
+_CHUNK_SIZE = 1 << 20
+
+
+def save_bundle(images: Iterable[str], path: str, level: int = 3, threads: int = -1) -> dict:
+    """
+    Export ``images`` into a single zstd compressed bundle.
+
+    The images are saved with one ``docker save``, so layers that are shared between them are only stored once.
+    The bundle is a single zstd stream: a one line JSON manifest followed by the ``docker save`` tar. The tar is
+    compressed as it's produced, so no uncompressed copy is ever written to disk.
+
+    Args:
+        images (Iterable[str]): The images to export
+        path (str): Where to write the bundle
+        level (int): The zstd compression level
+        threads (int): How many threads to compress with. -1 uses every cpu.
+
+    Returns:
+        dict: The manifest of the bundle
+    """
+    import zstandard
+
+    images = list(dict.fromkeys(images))
+    manifest = {
+        "version": BUNDLE_VERSION,
+        "created": time.time(),
+        "images": [{"name": image, "id": docker.image.inspect(image).id} for image in images],
+    }
+
+    start, size = time.time(), 0
+    compressor = zstandard.ZstdCompressor(level=level, threads=threads)
+    with open(path, "wb") as f, compressor.stream_writer(f, closefd=False) as writer:
+        writer.write(json.dumps(manifest).encode() + b"\n")
+        for chunk in docker.image.save(images):
+            writer.write(chunk)
+            size += len(chunk)
+    LOGGER.info(f"Saved {len(images)} image(s) ({size / 1024 ** 2:.0f}MB uncompressed) to '{path}' in {time.time() - start:.1f}s.")
+    return manifest
+
+
+def read_manifest(path: str) -> dict:
+    """
+    Read the manifest of a bundle written by :func:`save_bundle`.
+
+    Args:
+        path (str): The bundle
+
+    Returns:
+        dict: The manifest
+    """
+    import zstandard
+
+    with open(path, "rb") as f, zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True) as reader:
+        line = b""
+        while not line.endswith(b"\n"):
+            chunk = reader.read(1)
+            if not chunk:
+                raise ValueError(f"'{path}' is not a wa_cli image bundle.")
+            line += chunk
+    return json.loads(line)
+
+
+def _stream_images(path: str) -> Iterator[bytes]:
+    # Decompresses the bundle and yields the docker save tar that follows the manifest
+    import zstandard
+
+    with open(path, "rb") as f, zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True) as reader:
+        buffer = b""
+        while b"\n" not in buffer:
+            buffer += reader.read(_CHUNK_SIZE)
+        yield buffer.split(b"\n", 1)[1]
+        for chunk in iter(lambda: reader.read(_CHUNK_SIZE), b""):
+            yield chunk
+
+
+def load_bundle(path: str, force: bool = False) -> list:
+    """
+    Load the images in a bundle written by :func:`save_bundle` into the docker daemon.
+
+    The bundle is decompressed straight into ``docker load`` without a temporary file. If every image in the
+    bundle is already present, nothing is loaded. Otherwise, ``docker load`` only registers the layers that
+    aren't present yet.
+
+    Args:
+        path (str): The bundle
+        force (bool): Load the bundle even if every image is already present
+
+    Returns:
+        list: The names of the images in the bundle that were loaded
+    """
+    manifest = read_manifest(path)
+    if manifest.get("version") != BUNDLE_VERSION:
+        raise ValueError(f"'{path}' has bundle version {manifest.get('version')}, but only version {BUNDLE_VERSION} is supported.")
+
+    def is_present(image):
+        return docker.image.exists(image["name"]) and docker.image.inspect(image["name"]).id == image["id"]
+
+    missing = [image["name"] for image in manifest["images"] if not is_present(image)]
+    if not missing and not force:
+        LOGGER.info(f"Every image in '{path}' is already present. Nothing to load.")
+        return []
+
+    LOGGER.info(f"Loading {', '.join(missing or [image['name'] for image in manifest['images']])} from '{path}'...")
+    start = time.time()
+    docker.image.load(_stream_images(path), quiet=True)
+    LOGGER.info(f"Loaded '{path}' in {time.time() - start:.1f}s.")
+    return missing
@@ -0,0 +1,211 @@
+#
+# MIT License
+#
+# Copyright (c) 2018-2021 Wisconsin Autonomous
+#
+# See https://wa.wisc.edu
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+# Import some utils
+from wa_cli.utils.logger import LOGGER
+from wa_cli.utils.state import get_state_path
+
+# External library imports
+from pathlib import Path
+from typing import BinaryIO, Iterable, Optional
+import hashlib
+import shutil
+import json
+import os
+
+_SIZE_SUFFIXES = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+
+def parse_size(size: str) -> int:
+    """
+    Parse a human readable size (i.e. ``512M`` or ``5G``) into a number of bytes.
+
+    Args:
+        size (str): The size to parse. The suffix is optional and case insensitive.
+
+    Returns:
+        int: The number of bytes
+    """
+    size = str(size).strip().upper().rstrip("B")
+    suffix = size[-1] if size and size[-1] in _SIZE_SUFFIXES else ""
+    return int(float(size[:len(size) - len(suffix)]) * _SIZE_SUFFIXES[suffix])
+
+
+def hash_path(path: str, exclude: Iterable[str] = (), hasher=None) -> str:
+    """
+    Hash the contents of a file or, recursively, a directory.
+
+    Directories are walked in sorted order and both the relative paths and the contents of the files are
+    hashed, so renaming a file changes the hash.
+
+    Args:
+        path (str): The file or directory to hash
+        exclude (Iterable[str]): Resolved paths that should be skipped when walking a directory
+        hasher: An existing ``hashlib`` object to update. Defaults to a new sha256 object.
+
+    Returns:
+        str: The hex digest
+    """
+    hasher = hashlib.sha256() if hasher is None else hasher
+    path = Path(path)
+    exclude = set(str(Path(e).resolve()) for e in exclude)
+
+    files = [path] if path.is_file() else sorted(p for p in path.rglob("*") if p.is_file())
+    for f in files:
+        resolved = str(f.resolve())
+        if any(resolved == e or resolved.startswith(e + os.sep) for e in exclude):
+            continue
+        hasher.update(str(f.relative_to(path) if f != path else f.name).encode())
+        with open(f, "rb") as fp:
+            for chunk in iter(lambda: fp.read(1 << 20), b""):
+                hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def compute_run_key(config: dict, image_digest: str, exclude: Iterable[str] = (), outputs: Iterable[str] = ()) -> str:
+    """
+    Compute the cache key of a ``docker run`` invocation.
+
+    The key covers the resolved image digest, the contents of every host path that's mounted
+    in the container (the script and each ``--data`` entry), the sorted environment and ports, and the
+    command (which includes the script arguments). Mounts the run only writes to (``outputs``) are keyed by their
+    container path alone, since their contents (and often their host paths) change with every run.
+
+    Args:
+        config (dict): The container config that would be passed to ``docker.run``
+        image_digest (str): The resolved digest of the image
+        exclude (Iterable[str]): Host paths to leave out of the hash, i.e. outputs written by the run
+        outputs (Iterable[str]): Container paths of the mounts that are outputs of the run
+
+    Returns:
+        str: The hex digest to use as the cache key
+    """
+    hasher = hashlib.sha256()
+    hasher.update(image_digest.encode())
+    outputs = set(outputs)
+    for hostpath, containerpath, *_ in sorted(config["volumes"]):
+        hasher.update(f"{containerpath}:".encode())
+        if containerpath not in outputs:
+            hasher.update(hash_path(hostpath, exclude=exclude).encode())
+    hasher.update(json.dumps(sorted(config["envs"].items())).encode())
+    hasher.update(json.dumps(sorted(":".join(p) for p in config["publish"])).encode())
+    hasher.update(json.dumps(config["command"]).encode())
+    return hasher.hexdigest()
+
+
+def _merge_tree(src: Path, dst: str):
+    # Like shutil.copytree(..., dirs_exist_ok=True), which requires python 3.8
+    for dirpath, _, filenames in os.walk(src):
+        target = Path(dst) / Path(dirpath).relative_to(src)
+        target.mkdir(parents=True, exist_ok=True)
+        for filename in filenames:
+            shutil.copy2(os.path.join(dirpath, filename), target / filename)
+
+
+class ResultCache:
+    """
+    A content-addressed store of the results of previous runs, kept in the ``wa_cli`` state directory.
+
+    Each entry holds the recorded stdout of the run and a copy of its output artifacts. Entries are
+    evicted in least-recently-used order once the store grows larger than ``max_size`` bytes.
+
+    Args:
+        max_size (int): The maximum size of the store in bytes
+    """
+
+    def __init__(self, max_size: int):
+        self._root = get_state_path("cache", "runs", is_dir=True)
+        self._max_size = max_size
+
+    def _entry(self, key: str) -> Path:
+        return self._root / key
+
+    def lookup(self, key: str) -> Optional[Path]:
+        """Get the entry for ``key`` if it exists. The entry is marked as recently used."""
+        entry = self._entry(key)
+        if not (entry / "meta.json").is_file():
+            return None
+        os.utime(entry / "meta.json")
+        return entry
+
+    def replay(self, key: str, out: BinaryIO):
+        """Restore the artifacts of the entry for ``key`` to their original host paths and write the recorded stdout to ``out``."""
+        entry = self._entry(key)
+        with open(entry / "meta.json") as f:
+            meta = json.load(f)
+        for i, artifact in enumerate(meta["artifacts"]):
+            src = entry / "artifacts" / str(i)
+            if src.is_dir():
+                _merge_tree(src, artifact)
+            elif src.is_file():
+                Path(artifact).parent.mkdir(parents=True, exist_ok=True)
+                shutil.copy2(src, artifact)
+            LOGGER.debug(f"Restored cached artifact '{artifact}'.")
+        with open(entry / "stdout", "rb") as f:
+            shutil.copyfileobj(f, out)
+        out.flush()
+
+    def store(self, key: str, stdout_file: str, artifacts: Iterable[str] = ()):
+        """Record the stdout (read from ``stdout_file``) and a copy of ``artifacts`` (host paths) for ``key`` and evict old entries if needed."""
+        entry = self._entry(key)
+        tmp = self._root / f".{key}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        (tmp / "artifacts").mkdir(parents=True)
+
+        artifacts = [str(Path(a).resolve()) for a in artifacts]
+        for i, artifact in enumerate(artifacts):
+            dst = tmp / "artifacts" / str(i)
+            if Path(artifact).is_dir():
+                shutil.copytree(artifact, dst)
+            elif Path(artifact).is_file():
+                shutil.copy2(artifact, dst)
+            else:
+                LOGGER.warn(f"Artifact '{artifact}' was not created by the run. It will not be cached.")
+        shutil.copyfile(stdout_file, tmp / "stdout")
+        with open(tmp / "meta.json", "w") as f:
+            json.dump({"artifacts": artifacts}, f)
+
+        # Swap the entry in atomically so an interrupted store never leaves a partial entry behind
+        shutil.rmtree(entry, ignore_errors=True)
+        tmp.rename(entry)
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until the store fits in ``max_size`` bytes."""
+        entries = []
+        for entry in self._root.iterdir():
+            if not (entry / "meta.json").is_file():
+                continue
+            size = sum(f.stat().st_size for f in entry.rglob("*") if f.is_file())
+            entries.append(((entry / "meta.json").stat().st_mtime, size, entry))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries, key=lambda e: e[0]):
+            if total <= self._max_size:
+                break
+            LOGGER.debug(f"Evicting cache entry '{entry.name}'...")
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
@@ -0,0 +1,169 @@
+#
+# MIT License
+#
+# Copyright (c) 2018-2021 Wisconsin Autonomous
+#
+# See https://wa.wisc.edu
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+# Import some utils
+from wa_cli.utils.logger import LOGGER
+from wa_cli.utils.state import locked_state
+from wa_cli.utils.ipam import reclaim_leases
+
+# External library imports
+from typing import Optional, Tuple
+from pathlib import Path
+import os
+import time
+
+_CPUS_STATE = "cpus.json"
+
+AUTO = "auto"
+"""Cpuset placeholder that's replaced by a set of leased physical cores when the container is created."""
+
+
+def physical_cores() -> dict:
+    """
+    Group the logical cpus of this machine by physical core.
+
+    Hyperthread siblings share a physical core, so they're kept together. The NUMA node of each core is read from
+    sysfs; if the topology isn't available, every logical cpu is its own core on node 0.
+
+    Returns:
+        dict: Maps ``"<node>:<package>:<core>"`` to ``{"node": <node>, "cpus": [<logical cpus>]}``
+    """
+    cores = {}
+    allowed = os.sched_getaffinity(0) if hasattr(os, "sched_getaffinity") else range(os.cpu_count() or 1)
+    for cpu in sorted(allowed):
+        path = Path(f"/sys/devices/system/cpu/cpu{cpu}")
+        try:
+            core_id = (path / "topology" / "core_id").read_text().strip()
+            package_id = (path / "topology" / "physical_package_id").read_text().strip()
+        except OSError:
+            core_id, package_id = str(cpu), "0"
+        nodes = [int(p.name[4:]) for p in path.glob("node[0-9]*")]
+        node = nodes[0] if nodes else 0
+
+        core = cores.setdefault(f"{node}:{package_id}:{core_id}", {"node": node, "cpus": []})
+        core["cpus"].append(cpu)
+    return cores
+
+
+def allocate_cores(name: str, count: int) -> Optional[Tuple[list, list]]:
+    """
+    Lease ``count`` physical cores for the container ``name``.
+
+    Cores are taken from the NUMA node with the most free cores so a container's cpus (and memory) stay on one node
+    when possible. Leases are recorded in the ``wa_cli`` state directory and are reclaimed once their container no
+    longer exists, so concurrent runs are spread across the cores instead of thrashing each other.
+
+    Args:
+        name (str): The name of the container the cores are for
+        count (int): The number of physical cores to lease
+
+    Returns:
+        Optional[Tuple[list, list]]: The logical cpus and the NUMA nodes to pin the container to, or None if there
+        aren't enough free cores
+    """
+    cores = physical_cores()
+    with locked_state(_CPUS_STATE) as leases:
+        reclaim_leases(leases)
+
+        free = [key for key in cores if key not in leases]
+        if len(free) < count:
+            LOGGER.warn(f"Only {len(free)} of the {len(cores)} physical cores are free, but {count} were requested. The container won't be pinned.")
+            return None
+
+        # Prefer the node with the most free cores, then fill up from the next ones
+        free_per_node = {}
+        for key in free:
+            free_per_node.setdefault(cores[key]["node"], []).append(key)
+        chosen = []
+        for node in sorted(free_per_node, key=lambda n: -len(free_per_node[n])):
+            chosen.extend(free_per_node[node][:count - len(chosen)])
+            if len(chosen) == count:
+                break
+
+        for key in chosen:
+            leases[key] = {"name": name, "created": time.time()}
+
+    cpus = sorted(cpu for key in chosen for cpu in cores[key]["cpus"])
+    nodes = sorted(set(cores[key]["node"] for key in chosen))
+    LOGGER.debug(f"Leased cpus {cpus} on node(s) {nodes} to '{name}'.")
+    return cpus, nodes
+
+
+def release_cores(name: str):
+    """
+    Release the cores leased to the container ``name``.
+
+    Args:
+        name (str): The name of the container
+    """
+    with locked_state(_CPUS_STATE) as leases:
+        for key, lease in list(leases.items()):
+            if lease["name"] == name:
+                leases.pop(key)
+
+
+def parse_cpuset(cpuset: str) -> list:
+    """
+    Parse a cpuset like ``0-3,6`` into a list of cpus.
+
+    Args:
+        cpuset (str): Comma separated list of cpus and ranges of cpus
+
+    Returns:
+        list: The cpus in the set
+    """
+    cpus = []
+    for part in cpuset.split(","):
+        start, _, end = part.partition("-")
+        cpus.extend(range(int(start), int(end or start) + 1))
+    return cpus
+
+
+def resolve_cpus(config: dict, name: Optional[str] = None) -> bool:
+    """
+    Replace an ``auto`` cpuset in a container config with leased physical cores.
+
+    One core is leased per cpu requested with ``cpus`` (rounded up), or a single core if no quota is set.
+    If not enough cores are free, the cpuset is dropped and the container isn't pinned.
+
+    Args:
+        config (dict): The container config that would be passed to ``docker.run``. Updated in place.
+        name (str): The name of the container, if it's not the one in ``config``. Defaults to None.
+
+    Returns:
+        bool: Whether cores were leased
+    """
+    if config.get("cpuset_cpus") != AUTO:
+        return False
+
+    import math
+
+    pinned = allocate_cores(name or config["name"], math.ceil(config.get("cpus") or 1))
+    if pinned is None:
+        config.pop("cpuset_cpus")
+        return False
+    config["cpuset_cpus"], config["cpuset_mems"] = pinned
+    return True
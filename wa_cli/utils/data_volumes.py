@@ -0,0 +1,169 @@
+#
+# MIT License
+#
+# Copyright (c) 2018-2021 Wisconsin Autonomous
+#
+# See https://wa.wisc.edu
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+# Import some utils
+from wa_cli.utils.logger import LOGGER
+from wa_cli.utils.state import locked_state
+from wa_cli.utils.cache import hash_path
+
+# Docker imports
+from python_on_whales import docker, exceptions as docker_exceptions
+
+# External library imports
+from pathlib import Path
+from typing import Iterable
+import hashlib
+import json
+import time
+
+_DATA_VOLUMES_STATE = "data_volumes.json"
+
+DATA_VOLUME_LABEL = "wa_cli.data"
+"""Label attached to every data volume. The value is the host path the volume was populated from."""
+
+
+def _stat_signature(path: Path) -> str:
+    # Hashes the names, sizes and modification times of every file. Much cheaper than hashing the contents.
+    hasher = hashlib.sha256()
+    for f in sorted(p for p in path.rglob("*") if p.is_file()):
+        stat = f.stat()
+        hasher.update(json.dumps([str(f.relative_to(path)), stat.st_size, stat.st_mtime_ns]).encode())
+    return hasher.hexdigest()
+
+
+def _tree_size(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+def _content_hash(path: Path, state: dict) -> str:
+    # If no file was touched since the last run, the content hash from then is still valid
+    signature = _stat_signature(path)
+    entry = state.setdefault("paths", {}).get(str(path))
+    if entry is not None and entry["signature"] == signature:
+        return entry["hash"]
+
+    LOGGER.info(f"Hashing '{path}'...")
+    content_hash = hash_path(path)
+    state["paths"][str(path)] = {"signature": signature, "hash": content_hash}
+    return content_hash
+
+
+def _populate(name: str, path: Path, image: str):
+    # Copies the directory into the volume through a container that's created, but never started
+    LOGGER.info(f"Populating data volume '{name}' from '{path}'. This only happens once per version of the data...")
+    docker.volume.create(name, labels={DATA_VOLUME_LABEL: str(path)})
+    container = docker.container.create(image, volumes=[(name, "/data")])
+    try:
+        docker.copy(f"{path}/.", (container, "/data"))
+    except BaseException:
+        # Includes Ctrl+C (which wa exits through), since a partial copy must not be left behind
+        docker.container.remove(container, force=True)
+        docker.volume.remove(name)
+        raise
+    docker.container.remove(container, force=True)
+
+
+def get_data_volume(path: str, image: str) -> str:
+    """
+    Get a named volume holding the contents of the directory ``path``, populating it if needed.
+
+    Volumes are content addressed, so a volume is only populated once per version of the data and is shared by
+    every run that uses it. To avoid hashing gigabytes of data on every run, the hash is reused as long as the names,
+    sizes and modification times of the files haven't changed.
+
+    Args:
+        path (str): The host directory
+        image (str): An image to create the (never started) container that populates the volume with
+
+    Returns:
+        str: The name of the volume
+    """
+    path = Path(path).resolve()
+    with locked_state(_DATA_VOLUMES_STATE) as state:
+        name = f"wa-data-{_content_hash(path, state)[:16]}"
+        volumes = state.setdefault("volumes", {})
+        # A volume is only recorded as populated once the copy finished, so an interrupted copy is never reused
+        exists = docker.volume.exists(name)
+        if not exists or not volumes.get(name, {}).get("populated", False):
+            if exists:
+                LOGGER.warn(f"Data volume '{name}' wasn't completely populated. Populating it again...")
+                docker.volume.remove(name)
+            _populate(name, path, image)
+            size = _tree_size(path)
+        else:
+            size = volumes[name].get("size", 0)
+        volumes[name] = {"path": str(path), "size": size, "last_used": time.time(), "populated": True}
+    return name
+
+
+def evict_data_volumes(max_size: int, force: bool = False, keep: Iterable[str] = ()) -> list:
+    """
+    Remove data volumes in least-recently-used order until they take up at most ``max_size`` bytes.
+
+    Volumes that are in use by a container are kept.
+
+    Args:
+        max_size (int): The total size of the data volumes to keep, in bytes
+        force (bool): Remove every data volume that isn't in use instead
+        keep (Iterable[str]): Volumes to never remove, i.e. ones that are about to be mounted
+
+    Returns:
+        list: The names of the removed volumes
+    """
+    removed = []
+    with locked_state(_DATA_VOLUMES_STATE) as state:
+        volumes = state.setdefault("volumes", {})
+        existing = set(v.name for v in docker.volume.list(filters={"label": DATA_VOLUME_LABEL}))
+        for name in list(volumes):
+            if name not in existing:
+                volumes.pop(name)
+
+        total = sum(v["size"] for v in volumes.values())
+        for name, volume in sorted(volumes.items(), key=lambda item: item[1]["last_used"]):
+            if not force and total <= max_size:
+                break
+            if name in keep:
+                continue
+            try:
+                docker.volume.remove(name)
+            except docker_exceptions.DockerException:
+                continue  # Still in use
+            LOGGER.info(f"Removed data volume '{name}' ({volume['path']}).")
+            volumes.pop(name)
+            total -= volume["size"]
+            removed.append(name)
+    return removed
+
+
+def list_data_volumes() -> dict:
+    """
+    List the data volumes known to this machine.
+
+    Returns:
+        dict: Maps the name of each volume to its host path, size and last use
+    """
+    with locked_state(_DATA_VOLUMES_STATE) as state:
+        return dict(state.get("volumes", {}))
@@ -0,0 +1,233 @@
+#
+# MIT License
+#
+# Copyright (c) 2018-2021 Wisconsin Autonomous
+#
+# See https://wa.wisc.edu
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+# Import some utils
+from wa_cli.utils.logger import LOGGER
+from wa_cli.utils.state import get_state_path
+
+# Docker imports
+from python_on_whales import docker, exceptions as docker_exceptions
+
+# External library imports
+from typing import List, Optional
+import posixpath
+import re
+
+DEV_CACHE_LABEL = "wa_cli.dev_cache"
+"""Label attached to every build cache volume of ``wa dev``. The value is the project the volume belongs to."""
+
+CACHE_KINDS = ["ccache", "build", "install", "log"]
+"""The directories kept in volumes: the ccache directory and colcon's ``build``, ``install`` and ``log`` directories."""
+
+CCACHE_LAUNCHER = "/opt/wa_cli/ccache-launcher"
+"""Where the compiler launcher is mounted in the container. CMake is pointed at it instead of at ccache directly."""
+
+COLCON_DEFAULTS = "/opt/wa_cli/colcon-defaults.yaml"
+"""Where the colcon defaults that pass the launcher to CMake are mounted. CMake only reads ``CMAKE_<LANG>_COMPILER_LAUNCHER``
+from the environment since 3.17 (i.e. not the 3.16 of Ubuntu 20.04), but honors the cache variables on any version."""
+
+_COLCON_DEFAULTS = f"""build:
+  cmake-args:
+    - -DCMAKE_C_COMPILER_LAUNCHER={CCACHE_LAUNCHER}
+    - -DCMAKE_CXX_COMPILER_LAUNCHER={CCACHE_LAUNCHER}
+"""
+
+_LAUNCHER_SCRIPT = """#!/bin/sh
+# Compiles through ccache if it's installed in the image and directly otherwise
+if command -v ccache >/dev/null 2>&1; then exec ccache "$@"; fi
+exec "$@"
+"""
+
+_STATS_SCRIPT = "ccache --print-stats 2>/dev/null || ccache -s; echo @@du; du -sk /wa_cache/*"
+
+
+def _volume_name(project: str, service: str, workspace: str, kind: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_.-]", "_", f"wa-dev-{project}-{service}-{workspace}-{kind}")
+
+
+def add_cache_volumes(compose: dict, root, project: str, ccache_size: str = "5G") -> dict:
+    """
+    Mount named volumes for ccache and for the colcon ``build``, ``install`` and ``log`` directories of each ROS workspace.
+
+    A service gets the volumes if it's built with a ``ROS_WORKSPACE`` build arg and mounts the project root. The
+    volumes are named per project, service and workspace, so they outlive the containers (i.e. ``wa dev --down``) and
+    aren't shared between services. CMake is pointed at a launcher that compiles through ccache if the image has it,
+    both through the ``CMAKE_<LANG>_COMPILER_LAUNCHER`` environment variables and through the ``cmake-args`` of a
+    colcon defaults file (``COLCON_DEFAULTS_FILE``), since older CMake versions ignore the environment variables.
+    The build section of the service isn't changed, so enabling the volumes never causes a rebuild.
+
+    Args:
+        compose (dict): The docker compose file. It's edited in place.
+        root: The root of the project (which is mounted in the services)
+        project (str): The name of the project
+        ccache_size (str): The maximum size of each ccache directory
+
+    Returns:
+        dict: Maps each service that got volumes to the paths they're mounted at in the container
+    """
+    mounted = {}
+    launcher = _write_state_file("ccache-launcher", _LAUNCHER_SCRIPT, executable=True)
+    colcon_defaults = _write_state_file("colcon-defaults.yaml", _COLCON_DEFAULTS)
+    for name, service in compose.get("services", {}).items():
+        build = service.get("build")
+        args = build.get("args", {}) if isinstance(build, dict) else {}
+        workspace = args.get("ROS_WORKSPACE")
+        mount = next((v.split(":")[1] for v in service.get("volumes", []) if isinstance(v, str) and v.split(":")[0] == str(root)), None)
+        if workspace is None or mount is None:
+            continue
+
+        paths = {kind: posixpath.join(mount, workspace, kind) for kind in CACHE_KINDS if kind != "ccache"}
+        paths["ccache"] = posixpath.join(posixpath.dirname(mount), ".ccache")
+        for kind, path in paths.items():
+            volume = _volume_name(project, name, workspace, kind)
+            compose.setdefault("volumes", {})[volume] = {
+                "name": volume,
+                "labels": {DEV_CACHE_LABEL: project, f"{DEV_CACHE_LABEL}.service": name, f"{DEV_CACHE_LABEL}.workspace": workspace,
+                           f"{DEV_CACHE_LABEL}.kind": kind, f"{DEV_CACHE_LABEL}.image": service.get("image", "")},
+            }
+            service["volumes"].append(f"{volume}:{path}")
+
+        service["volumes"].append(f"{launcher}:{CCACHE_LAUNCHER}:ro")
+        service["volumes"].append(f"{colcon_defaults}:{COLCON_DEFAULTS}:ro")
+        service.setdefault("environment", []).extend([
+            f"CCACHE_DIR={paths['ccache']}",
+            f"CCACHE_MAXSIZE={ccache_size}",
+            f"CMAKE_C_COMPILER_LAUNCHER={CCACHE_LAUNCHER}",
+            f"CMAKE_CXX_COMPILER_LAUNCHER={CCACHE_LAUNCHER}",
+            f"COLCON_DEFAULTS_FILE={COLCON_DEFAULTS}",
+        ])
+        mounted[name] = paths
+    return mounted
+
+
+def _write_state_file(name: str, text: str, executable: bool = False) -> str:
+    # Writes a file that's mounted in the services. It's only rewritten if it changed, since it's mounted in running containers.
+    path = get_state_path("dev", name)
+    if not path.is_file() or path.read_text() != text:
+        path.write_text(text)
+    path.chmod(0o755 if executable else 0o644)
+    return str(path)
+
+
+def chown_cache_volumes(compose: dict, mounted: dict):
+    """
+    Give the user of each service ownership of its cache volumes.
+
+    New volumes that are mounted at a path that doesn't exist in the image are owned by root, so the user the
+    service runs as (``USER_UID``/``USER_GID``) couldn't write to them.
+
+    Args:
+        compose (dict): The docker compose file
+        mounted (dict): The paths returned by :func:`add_cache_volumes`
+    """
+    for name, paths in mounted.items():
+        service = compose["services"][name]
+        env = dict(e.split("=", 1) for e in service.get("environment", []) if "=" in e)
+        owner = f"{env.get('USER_UID', 1000)}:{env.get('USER_GID', 1000)}"
+        try:
+            docker.execute(service["container_name"], ["chown", owner, *paths.values()], user="root")
+        except docker_exceptions.DockerException as e:
+            LOGGER.warn(f"Failed to give '{owner}' ownership of the cache volumes of '{name}': {e}")
+
+
+def _list_cache_volumes(project: Optional[str] = None) -> list:
+    label = DEV_CACHE_LABEL if project is None else f"{DEV_CACHE_LABEL}={project}"
+    return docker.volume.list(filters={"label": label})
+
+
+def _parse_ccache_stats(output: str) -> dict:
+    # 'ccache --print-stats' (ccache 4) prints tab separated counters, 'ccache -s' (ccache 3) prints a table
+    counters = {}
+    for line in output.splitlines():
+        key, _, value = line.rpartition("\t") if "\t" in line else line.rpartition(" ")
+        if value.strip().isdigit():
+            counters[key.strip()] = int(value)
+    hits = counters.get("direct_cache_hit", counters.get("cache hit (direct)", 0)) + \
+        counters.get("preprocessed_cache_hit", counters.get("cache hit (preprocessed)", 0))
+    misses = counters.get("cache_miss", counters.get("cache miss", 0))
+    return {"hits": hits, "misses": misses, "hit_rate": hits / (hits + misses) if hits + misses else None}
+
+
+def cache_stats(project: Optional[str] = None) -> List[dict]:
+    """
+    Get the ccache hit rate and the size of the cache volumes of each service.
+
+    The stats are read through a throwaway container of the service's image, so the service doesn't need to be running.
+
+    Args:
+        project (str): Only report the volumes of this project. Defaults to every project.
+
+    Returns:
+        List[dict]: The stats of each project, service and workspace
+    """
+    groups = {}
+    for volume in _list_cache_volumes(project):
+        labels = volume.labels
+        key = (labels[DEV_CACHE_LABEL], labels[f"{DEV_CACHE_LABEL}.service"], labels[f"{DEV_CACHE_LABEL}.workspace"])
+        groups.setdefault(key, {"image": labels.get(f"{DEV_CACHE_LABEL}.image"), "volumes": {}})["volumes"][labels[f"{DEV_CACHE_LABEL}.kind"]] = volume.name
+
+    stats = []
+    for (project, service, workspace), group in sorted(groups.items()):
+        entry = {"project": project, "service": service, "workspace": workspace, "hits": None, "misses": None, "hit_rate": None,
+                 "sizes": {}}
+        try:
+            output = docker.run(group["image"], ["-c", _STATS_SCRIPT], entrypoint="sh", user="root", remove=True,
+                                volumes=[(v, f"/wa_cache/{kind}") for kind, v in group["volumes"].items()],
+                                envs={"CCACHE_DIR": "/wa_cache/ccache"})
+        except docker_exceptions.DockerException as e:
+            LOGGER.warn(f"Failed to read the cache stats of '{project}/{service}': {e}")
+            stats.append(entry)
+            continue
+
+        ccache, _, du = output.partition("@@du")
+        entry.update(_parse_ccache_stats(ccache))
+        for line in du.split("\n"):
+            size, _, path = line.partition("\t")
+            if size.strip().isdigit():
+                entry["sizes"][posixpath.basename(path)] = int(size) * 1024
+        stats.append(entry)
+    return stats
+
+
+def prune_cache_volumes(project: Optional[str] = None) -> list:
+    """
+    Remove the cache volumes that aren't in use by a container.
+
+    Args:
+        project (str): Only remove the volumes of this project. Defaults to every project.
+
+    Returns:
+        list: The names of the removed volumes
+    """
+    removed = []
+    for volume in _list_cache_volumes(project):
+        try:
+            docker.volume.remove(volume.name)
+        except docker_exceptions.DockerException:
+            LOGGER.warn(f"Volume '{volume.name}' is in use. Skipping...")
+            continue
+        removed.append(volume.name)
+    return removed
@@ -0,0 +1,97 @@
+#
+# MIT License
+#
+# Copyright (c) 2018-2021 Wisconsin Autonomous
+#
+# See https://wa.wisc.edu
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+# External library imports
+from typing import Optional
+from urllib.parse import quote
+import http.client
+import socket
+import json
+import os
+
+DEFAULT_SOCKET = "/var/run/docker.sock"
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self._path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self._path)
+
+
+def get_socket_path() -> Optional[str]:
+    """
+    Get the path of the unix socket the docker daemon listens on.
+
+    Returns:
+        Optional[str]: The path, or None if the daemon isn't reached through a local unix socket (i.e. ``DOCKER_HOST`` is a tcp address or a docker context is selected)
+    """
+    if "DOCKER_CONTEXT" in os.environ:
+        return None
+    host = os.environ.get("DOCKER_HOST", f"unix://{DEFAULT_SOCKET}")
+    return host[len("unix://"):] if host.startswith("unix://") else None
+
+
+def inspect_container(name: str, timeout: float = 1.0) -> Optional[dict]:
+    """
+    Inspect a container by talking to the docker Engine API directly.
+
+    Going through the ``docker`` client (or ``python_on_whales``, which wraps it) costs a process spawn and the
+    client's startup; a single request over the daemon's socket takes a few milliseconds.
+
+    Args:
+        name (str): The name or id of the container
+        timeout (float): The timeout of the request, in seconds
+
+    Returns:
+        Optional[dict]: The container's details (as returned by ``docker inspect``), or None if it doesn't exist
+
+    Raises:
+        OSError: If the daemon can't be reached over a local unix socket
+    """
+    path = get_socket_path()
+    if path is None:
+        raise OSError("The docker daemon isn't reachable through a local unix socket.")
+
+    connection = _UnixHTTPConnection(path, timeout)
+    try:
+        connection.request("GET", f"/containers/{quote(name)}/json")
+        response = connection.getresponse()
+        body = response.read()
+    except http.client.HTTPException as e:
+        raise OSError(f"Got an invalid response from the docker daemon: {e}")
+    finally:
+        connection.close()
+
+    if response.status == 404:
+        return None
+    if response.status != 200:
+        raise OSError(f"The docker daemon responded with {response.status}: {body.decode(errors='replace')}")
+    return json.loads(body)
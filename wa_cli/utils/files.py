@@ -29,7 +29,7 @@ from wa_cli.utils.logger import LOGGER
 
 # External library imports
 from pathlib import Path
-from typing import Union
+from typing import Optional, Union
 
 
 def file_exists(filename: str, throw_error: bool = False) -> bool:
@@ -75,3 +75,20 @@ def get_resolved_path(path, wa_cli_relative: bool = False, return_as_str: bool =
         return str(resolved_path)
     else:
         return resolved_path
+
+
+def search_upwards_for_file(filename: str) -> Optional[Path]:
+    """
+    Search for a file in the current directory and then each of its parents.
+
+    Args:
+        filename (str): The name of the file to find
+
+    Returns:
+        Optional[Path]: The path of the file, or None if it wasn't found
+    """
+    directory = Path.cwd()
+    for candidate in [directory, *directory.parents]:
+        if (candidate / filename).is_file():
+            return candidate / filename
+    return None
@@ -0,0 +1,251 @@
+#
+# MIT License
+#
+# Copyright (c) 2018-2021 Wisconsin Autonomous
+#
+# See https://wa.wisc.edu
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+# Import some utils
+from wa_cli.utils.logger import LOGGER
+
+# Docker imports
+from python_on_whales import docker
+
+# External library imports
+from typing import Iterator
+import posixpath
+import tarfile
+import heapq
+import json
+import zlib
+import io
+
+# Only every n-th chunk of a layer is compressed to estimate how well it compresses
+_SAMPLE_EVERY = 8
+
+_CHUNK_SIZE = 1 << 20
+
+_WHITEOUT_PREFIX = ".wh."
+
+_OPAQUE_WHITEOUT = ".wh..wh..opq"
+
+
+def format_size(size: float) -> str:
+    """
+    Format a number of bytes as a human readable size (i.e. ``1.5G``).
+
+    Args:
+        size (float): The number of bytes
+
+    Returns:
+        str: The formatted size
+    """
+    for suffix in ["B", "K", "M", "G"]:
+        if abs(size) < 1024:
+            return f"{size:.1f}{suffix}" if suffix != "B" else f"{int(size)}B"
+        size /= 1024
+    return f"{size:.1f}T"
+
+
+class _IteratorReader(io.RawIOBase):
+    # Exposes an iterator of bytes (i.e. the output of 'docker save') as a file
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = chunks
+        self._buffer = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer:
+            self._buffer = next(self._chunks, None)
+            if self._buffer is None:
+                self._buffer = b""
+                return 0
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
+class _SampledReader(io.RawIOBase):
+    # Reads a layer while estimating its compressed size from a sample of its chunks
+    def __init__(self, prefix: bytes, f):
+        self._prefix = prefix
+        self._gzipped = prefix[:2] == b"\x1f\x8b"
+        self._f = f
+        self.size = 0
+        self.sampled = 0
+        self.sampled_compressed = 0
+        self._chunks = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        data, self._prefix = self._prefix[:len(b)], self._prefix[len(b):]
+        if len(data) < len(b):
+            data += self._f.read(len(b) - len(data))
+        b[:len(data)] = data
+        self.size += len(data)
+        if self._chunks % _SAMPLE_EVERY == 0 and data:
+            self.sampled += len(data)
+            self.sampled_compressed += len(zlib.compress(data, 1))
+        self._chunks += 1
+        return len(data)
+
+    @property
+    def compressed_size(self) -> int:
+        # Layers that are already gzipped are pulled as is
+        if self._gzipped:
+            return self.size
+        return int(self.size * self.sampled_compressed / self.sampled) if self.sampled else self.size
+
+
+def _analyze_layer(reader: _SampledReader, top: int) -> dict:
+    files, size = 0, 0
+    paths = {}
+    whiteouts, opaque = [], []
+    largest = []
+    with tarfile.open(fileobj=io.BufferedReader(reader, _CHUNK_SIZE), mode="r|*") as layer:
+        for member in layer:
+            path = posixpath.normpath("/" + member.name)
+            name = posixpath.basename(path)
+            if name == _OPAQUE_WHITEOUT:
+                # Everything the layers below put in this directory is hidden
+                opaque.append(posixpath.dirname(path))
+                continue
+            if name.startswith(_WHITEOUT_PREFIX):
+                whiteouts.append(posixpath.join(posixpath.dirname(path), name[len(_WHITEOUT_PREFIX):]))
+                continue
+            if not member.isfile():
+                continue
+            files += 1
+            size += member.size
+            paths[path] = member.size
+            heapq.heappush(largest, (member.size, path))
+            if len(largest) > top:
+                heapq.heappop(largest)
+    return {
+        "files": files,
+        "size": size,
+        "paths": paths,
+        "whiteouts": whiteouts,
+        "opaque": opaque,
+        "largest": sorted(largest, reverse=True),
+        "compressed_size": reader.compressed_size,
+    }
+
+
+def analyze_image(image: str, top: int = 10, bandwidth: float = 10, extract_rate: float = 100) -> dict:
+    """
+    Analyze the layers of a local image.
+
+    The image is streamed out of the local image store with ``docker save`` (no registry access is needed) and
+    each layer is walked to count its files and find its largest paths. Files that a later layer overwrites or
+    deletes are reported as wasted, since they're still pulled and extracted. The compressed size of each layer is
+    estimated by compressing a sample of it, and the pull and extract costs are estimated from the passed rates.
+
+    Args:
+        image (str): The image to analyze
+        top (int): How many of the largest layers, paths and wasted paths to report
+        bandwidth (float): The network bandwidth to estimate pull times with, in MB/s
+        extract_rate (float): The disk throughput to estimate extract times with, in MB/s
+
+    Returns:
+        dict: The report
+    """
+    layers, documents, links = {}, {}, {}
+    with tarfile.open(fileobj=io.BufferedReader(_IteratorReader(iter(docker.image.save(image))), _CHUNK_SIZE), mode="r|") as saved:
+        for member in saved:
+            # Older versions of docker save a layer that's used more than once as a link to its first copy
+            if member.issym():
+                links[member.name] = posixpath.normpath(posixpath.join(posixpath.dirname(member.name), member.linkname))
+            elif member.islnk():
+                links[member.name] = member.linkname
+            if not member.isfile():
+                continue
+            f = saved.extractfile(member)
+            head = f.read(512)
+            # Layers are tars (possibly gzipped), everything else is a json document. A layer without any files
+            # (i.e. from a 'RUN' that changed nothing) is just the end-of-archive blocks, which are all zeros.
+            if head[257:262] == b"ustar" or head[:2] == b"\x1f\x8b" or (head and not head.strip(b"\0")):
+                LOGGER.debug(f"Analyzing layer '{member.name}'...")
+                layers[member.name] = _analyze_layer(_SampledReader(head, f), top)
+            elif member.size < 64 * _CHUNK_SIZE:
+                try:
+                    documents[member.name] = json.loads(head + f.read())
+                except ValueError:
+                    pass
+
+    # Match the layers to the commands in the image's history that created them
+    manifest = documents["manifest.json"][0]
+    config = documents.get(manifest["Config"], {})
+    history = [h for h in config.get("history", []) if not h.get("empty_layer", False)]
+
+    report_layers, seen = [], {}
+    for i, name in enumerate(manifest["Layers"]):
+        while name in links:
+            name = links[name]
+        layer = layers[name]
+
+        # Paths in this layer shadow the same paths (or everything under a deleted path) in the layers below
+        shadowed = [p for p in layer["paths"] if p in seen]
+        for path in layer["whiteouts"]:
+            shadowed.extend(p for p in seen if p == path or p.startswith(path.rstrip("/") + "/"))
+        for path in layer["opaque"]:
+            shadowed.extend(p for p in seen if p.startswith(path.rstrip("/") + "/"))
+        wasted = [dict(path=p, **seen.pop(p)) for p in dict.fromkeys(shadowed)]
+        for path, size in layer["paths"].items():
+            seen[path] = {"size": size, "layer": i}
+
+        compressed = layer["compressed_size"]
+        report_layers.append({
+            "index": i,
+            "created_by": history[i].get("created_by", "") if i < len(history) else "",
+            "size": layer["size"],
+            "files": layer["files"],
+            "estimated_compressed_size": compressed,
+            "estimated_pull_seconds": compressed / (bandwidth * 1e6),
+            "estimated_extract_seconds": layer["size"] / (extract_rate * 1e6),
+            "largest_paths": [{"path": p, "size": s} for s, p in layer["largest"]],
+            "wasted": wasted,
+        })
+
+    wasted = sorted((w for layer in report_layers for w in layer.pop("wasted")), key=lambda w: -w["size"])
+    total_size = sum(layer["size"] for layer in report_layers)
+    total_compressed = sum(layer["estimated_compressed_size"] for layer in report_layers)
+    return {
+        "image": image,
+        "id": docker.image.inspect(image).id,
+        "layers": len(report_layers),
+        "files": sum(layer["files"] for layer in report_layers),
+        "size": total_size,
+        "estimated_compressed_size": total_compressed,
+        "estimated_pull_seconds": total_compressed / (bandwidth * 1e6),
+        "estimated_extract_seconds": total_size / (extract_rate * 1e6),
+        "wasted_size": sum(w["size"] for w in wasted),
+        "largest_layers": sorted(report_layers, key=lambda layer: -layer["size"])[:top],
+        "largest_paths": sorted((dict(layer=layer["index"], **p) for layer in report_layers for p in layer["largest_paths"]),
+                                key=lambda p: -p["size"])[:top],
+        "wasted_paths": wasted[:top],
+    }
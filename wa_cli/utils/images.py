@@ -0,0 +1,288 @@
+#
+# MIT License
+#
+# Copyright (c) 2018-2021 Wisconsin Autonomous
+#
+# See https://wa.wisc.edu
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+# Import some utils
+from wa_cli.utils.logger import LOGGER
+from wa_cli.utils.state import locked_state, get_state_path
+from wa_cli.utils.files import search_upwards_for_file
+
+# Docker imports
+from python_on_whales import docker, exceptions as docker_exceptions
+
+# External library imports
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Iterable, Optional, Tuple
+import tempfile
+import json
+import subprocess
+import hashlib
+import shutil
+import time
+import re
+
+_IMAGES_STATE = "images.json"
+
+DERIVED_REPOSITORY = "wa-cli-derived"
+"""Repository of the images built by :func:`get_derived_image`. The tag is the key of the image."""
+
+DERIVED_LABEL = "wa_cli.derived"
+"""Label attached to every derived image. The value is the base image it was built from."""
+
+DEFAULT_IMAGES = ["wiscauto/wa_simulator:latest", "wiscauto/vnc:latest"]
+"""The images the ``wa_cli`` uses by default (i.e. for ``docker run --wasim`` and ``docker vnc``)."""
+
+LOCK_FILE = "wa-images.lock"
+"""Name of a project's image lock file. It's searched for in the current directory and its parents."""
+
+# 'docker pull' prints a line whenever the status of a layer changes (when its output isn't a terminal)
+_LAYER_LINE = re.compile(r"^([0-9a-f]{12}): (.+)$")
+
+_LAYER_DONE = ["Pull complete", "Already exists"]
+
+_DERIVED_DOCKERFILE = """
+FROM {base}
+COPY requirements.txt /tmp/wa_requirements.txt
+RUN pip install --no-cache-dir -r /tmp/wa_requirements.txt && rm /tmp/wa_requirements.txt
+"""
+
+
+def get_derived_image(base: str, base_digest: str, requirements: str) -> str:
+    """
+    Get an image that extends ``base`` with the pip ``requirements``, building it if needed.
+
+    The image is tagged by a hash of the base image digest and the contents of the requirements file, so it's
+    only built once and is rebuilt automatically when either of them changes.
+
+    Args:
+        base (str): The base image
+        base_digest (str): The digest (id) of the base image
+        requirements (str): Path to a pip requirements file
+
+    Returns:
+        str: The tag of the derived image
+    """
+    contents = Path(requirements).read_bytes()
+    key = hashlib.sha256(base_digest.encode() + b"\0" + contents).hexdigest()[:16]
+    tag = f"{DERIVED_REPOSITORY}:{key}"
+
+    if not docker.image.exists(tag):
+        LOGGER.info(f"Building '{tag}' from '{base}' with the requirements in '{requirements}'...")
+        with tempfile.TemporaryDirectory() as context:
+            shutil.copyfile(requirements, Path(context) / "requirements.txt")
+            (Path(context) / "Dockerfile").write_text(_DERIVED_DOCKERFILE.format(base=base))
+            docker.build(context, tags=[tag], labels={DERIVED_LABEL: base}, load=True)
+    else:
+        LOGGER.info(f"Using the cached image '{tag}'.")
+
+    with locked_state(_IMAGES_STATE) as state:
+        state[tag] = {"base": base, "last_used": time.time()}
+    return tag
+
+
+def prune_derived_images(max_age: float = 0) -> list:
+    """
+    Remove derived images that haven't been used for ``max_age`` seconds.
+
+    Images that are used by a container (running or not) are kept.
+
+    Args:
+        max_age (float): How long (in seconds) an image must have been unused for. Defaults to 0 (all unused images).
+
+    Returns:
+        list: The tags of the removed images
+    """
+    removed = []
+    in_use = set(c.config.image for c in docker.container.list(all=True))
+    with locked_state(_IMAGES_STATE) as state:
+        for image in docker.image.list(filters={"label": DERIVED_LABEL}):
+            for tag in image.repo_tags:
+                last_used = state.get(tag, {}).get("last_used", 0)
+                if tag in in_use or time.time() - last_used < max_age:
+                    continue
+                try:
+                    docker.image.remove(tag)
+                except docker_exceptions.DockerException as e:
+                    LOGGER.warn(f"Failed to remove '{tag}': {e}")
+                    continue
+                LOGGER.info(f"Removed derived image '{tag}'.")
+                state.pop(tag, None)
+                removed.append(tag)
+    return removed
+
+
+def project_images() -> list:
+    """
+    Find the images referenced by the project's ``.avtoolbox.yml`` that are pulled rather than built.
+
+    Returns:
+        list: The images of every service that has an ``image`` but no ``build`` section
+    """
+    import yaml
+
+    conf = search_upwards_for_file(".avtoolbox.yml")
+    if conf is None:
+        return []
+    with open(conf, "r") as f:
+        services = (yaml.safe_load(f) or {}).get("services", {}) or {}
+    return [s["image"] for s in services.values() if isinstance(s, dict) and "image" in s and "build" not in s]
+
+
+def stack_images() -> list:
+    """
+    Find the images of the project's development stack (see ``wa dev``) that have been built on this machine.
+
+    Returns:
+        list: The tags of the built stack images
+    """
+    import yaml
+
+    conf = search_upwards_for_file(".avtoolbox.yml")
+    if conf is None:
+        return []
+    with open(conf, "r") as f:
+        project = (yaml.safe_load(f) or {}).get("project")
+    if project is None:
+        return []
+    return [image for image in [f"avtoolbox/{project}:dev", f"avtoolbox/{project}:vnc"] if docker.image.exists(image)]
+
+
+def _repo_digest(image: str) -> Optional[str]:
+    # The digest reference (i.e. 'wiscauto/vnc@sha256:...') of a pulled tag
+    repository = image.rsplit(":", 1)[0] if ":" in image.rsplit("/", 1)[-1] else image
+    digests = docker.image.inspect(image).repo_digests
+    matching = [d for d in digests if d.split("@")[0] == repository]
+    return (matching or digests or [None])[0]
+
+
+def _pull(image: str):
+    # Runs 'docker pull' and logs the progress of each layer as it's downloaded and extracted
+    docker_binary = shutil.which("docker")
+    if docker_binary is None:
+        raise RuntimeError("Docker was not found to be installed.")
+
+    layers, output = {}, []
+    with subprocess.Popen([docker_binary, "pull", image], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, errors="replace") as process:
+        for line in process.stdout:
+            match = _LAYER_LINE.match(line.strip())
+            if match is None:
+                output.append(line.strip())
+                continue
+            layer, status = match.groups()
+            layers[layer] = status
+            if status == "Download complete" or status in _LAYER_DONE:
+                done = sum(s in _LAYER_DONE for s in layers.values())
+                LOGGER.info(f"'{image}' {layer}: {status} ({done}/{len(layers)} layers done)")
+    if process.returncode != 0:
+        raise RuntimeError(next((line for line in reversed(output) if line), f"'docker pull' exited with code {process.returncode}."))
+
+
+def pull_images(images: Iterable[str], workers: int = 4) -> Tuple[dict, dict]:
+    """
+    Pull ``images`` concurrently and resolve the digest each tag points to.
+
+    The progress of each layer is logged as it's pulled. Images without a digest reference (i.e. a tag that only
+    exists locally) can't be pinned, so they're reported as failures.
+
+    Args:
+        images (Iterable[str]): The images to pull
+        workers (int): How many images to pull at once
+
+    Returns:
+        Tuple[dict, dict]: Maps each pulled tag to its digest reference (i.e. ``wiscauto/vnc@sha256:...``), and maps
+        each image that couldn't be pulled to the error. A failure doesn't stop the other images from being pulled.
+    """
+    images = list(dict.fromkeys(images))
+    pins, errors = {}, {}
+
+    def pull(image):
+        start = time.time()
+        _pull(image)
+        digest = _repo_digest(image)
+        if digest is None:
+            raise RuntimeError("The image has no digest reference to pin (was it only built locally?).")
+        return digest, time.time() - start
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(pull, image): image for image in images}
+        for i, future in enumerate(as_completed(futures), start=1):
+            image = futures[future]
+            try:
+                pins[image], duration = future.result()
+            except (docker_exceptions.DockerException, RuntimeError) as e:
+                LOGGER.error(f"[{i}/{len(images)}] Failed to pull '{image}': {e}")
+                errors[image] = e
+                continue
+            LOGGER.info(f"[{i}/{len(images)}] Pulled '{image}' in {duration:.1f}s ({pins[image]}).")
+    return pins, errors
+
+
+def _lock_path() -> Path:
+    project_lock = search_upwards_for_file(LOCK_FILE)
+    return project_lock if project_lock is not None else get_state_path(LOCK_FILE)
+
+
+def _read_lock(path: Path) -> dict:
+    # An empty project lock file is how a project starts pinning its images
+    text = path.read_text() if path.is_file() else ""
+    return json.loads(text) if text.strip() else {"images": {}}
+
+
+def write_lock(pins: dict, path: Optional[str] = None):
+    """
+    Record the digests that tags point to in a lock file.
+
+    Args:
+        pins (dict): Maps tags to digest references, as returned by :func:`pull_images`
+        path (str): The lock file to update. Defaults to the project's lock file, if there is one, or the machine's.
+    """
+    path = Path(path) if path is not None else _lock_path()
+    lock = _read_lock(path)
+    lock["images"].update(pins)
+    path.write_text(json.dumps(lock, indent=4, sort_keys=True) + "\n")
+    LOGGER.info(f"Wrote the digests of {len(pins)} image(s) to '{path}'.")
+
+
+def pin_image(image: str) -> str:
+    """
+    Replace a tag with the digest it's pinned to in the lock file, if there is one.
+
+    Since the image is referenced by its digest, running it doesn't depend on what the tag points to now.
+
+    Args:
+        image (str): The image to pin
+
+    Returns:
+        str: The digest reference if the tag is pinned (and the image is present locally), otherwise ``image``
+    """
+    path = _lock_path()
+    if image is None or not path.is_file():
+        return image
+    pinned = _read_lock(path).get("images", {}).get(image)
+    if pinned is None or not docker.image.exists(pinned):
+        return image
+    LOGGER.debug(f"Using '{pinned}' for '{image}' as pinned in '{path}'.")
+    return pinned
@@ -0,0 +1,144 @@
+#
+# MIT License
+#
+# Copyright (c) 2018-2021 Wisconsin Autonomous
+#
+# See https://wa.wisc.edu
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+# Import some utils
+from wa_cli.utils.logger import LOGGER
+from wa_cli.utils.state import locked_state
+
+# Docker imports
+from python_on_whales import docker
+
+# External library imports
+from typing import Optional
+import itertools
+import ipaddress
+import time
+
+_IPAM_STATE = "ipam.json"
+
+LEASE_GRACE_PERIOD = 60
+"""Leases younger than this (in seconds) are never reclaimed, since their container may still be starting."""
+
+RESERVED_HOSTS = 4
+"""The first hosts of a network are reserved: the gateway, the control stack (.2), the simulation (.3) and vnc (.4)."""
+
+
+def _network_subnets(network: str) -> list:
+    config = docker.network.inspect(network).ipam.config or []
+    return [ipaddress.ip_network(c["Subnet"]) for c in config if "Subnet" in c and ":" not in c["Subnet"]]
+
+
+def _addresses_in_use(network: str) -> set:
+    # Includes containers that weren't started by the wa_cli (i.e. ones that got a dynamic address)
+    containers = docker.network.inspect(network).containers or {}
+    return set(c.ipv4_address.split("/")[0] for c in containers.values() if c.ipv4_address)
+
+
+def reclaim_leases(leases: dict):
+    """
+    Drop leases whose container no longer exists. Leases younger than ``LEASE_GRACE_PERIOD`` are kept.
+
+    Args:
+        leases (dict): Maps the leased resource to a ``{"name": <container>, "created": <time>}`` dict. Updated in place.
+    """
+    existing = set(c.name for c in docker.container.list(all=True))
+    now = time.time()
+    for ip, lease in list(leases.items()):
+        if lease["name"] not in existing and now - lease["created"] > LEASE_GRACE_PERIOD:
+            LOGGER.debug(f"Reclaiming '{ip}' from '{lease['name']}'.")
+            leases.pop(ip)
+
+
+def allocate_ip(network: str, name: str, preferred: Optional[str] = None) -> str:
+    """
+    Lease a free static ip address on ``network`` for the container ``name``.
+
+    Addresses are handed out from every (IPv4) subnet of the network, skipping the reserved hosts, addresses
+    leased to other containers and addresses already in use on the network. Leases are recorded in the
+    ``wa_cli`` state directory; leases of containers that no longer exist are reclaimed.
+
+    Args:
+        network (str): The network to lease an address on. It must already exist.
+        name (str): The name of the container the address is for
+        preferred (str): An address to use if it's free (i.e. ``172.20.0.3`` for the simulation). Defaults to None.
+
+    Returns:
+        str: The leased ip address
+
+    Raises:
+        RuntimeError: If every address of the network is taken
+    """
+    with locked_state(_IPAM_STATE) as state:
+        leases = state.setdefault(network, {})
+        reclaim_leases(leases)
+
+        taken = set(leases) | _addresses_in_use(network)
+        subnets = _network_subnets(network)
+
+        # Hosts are generated lazily since a large subnet has many of them
+        candidates = itertools.chain(
+            [ipaddress.ip_address(preferred)] if preferred is not None else [],
+            *(itertools.islice(s.hosts(), RESERVED_HOSTS if i == 0 else 0, None) for i, s in enumerate(subnets))
+        )
+
+        for candidate in candidates:
+            if str(candidate) not in taken and any(candidate in s for s in subnets):
+                ip = str(candidate)
+                break
+        else:
+            raise RuntimeError(f"No free ip addresses are left on network '{network}' ({', '.join(map(str, subnets))}).")
+
+        leases[ip] = {"name": name, "created": time.time()}
+        LOGGER.debug(f"Leased '{ip}' on '{network}' to '{name}'.")
+        return ip
+
+
+def release_ip(network: str, ip: str):
+    """Release a lease created with :func:`allocate_ip`."""
+    with locked_state(_IPAM_STATE) as state:
+        state.get(network, {}).pop(ip, None)
+
+
+def release_ips(name: str):
+    """
+    Release every lease of the container ``name``, on any network.
+
+    Args:
+        name (str): The name of the container
+    """
+    with locked_state(_IPAM_STATE) as state:
+        for leases in state.values():
+            for ip, lease in list(leases.items()):
+                if lease["name"] == name:
+                    leases.pop(ip)
+
+
+def list_leases() -> dict:
+    """Get the current leases, keyed by network and then ip address."""
+    with locked_state(_IPAM_STATE) as state:
+        for leases in state.values():
+            reclaim_leases(leases)
+        return dict(state)
@@ -0,0 +1,283 @@
+#
+# MIT License
+#
+# Copyright (c) 2018-2021 Wisconsin Autonomous
+#
+# See https://wa.wisc.edu
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+# Import some utils
+from wa_cli.utils.logger import LOGGER
+from wa_cli.utils.state import locked_state
+from wa_cli.utils.ports import resolve_ports
+from wa_cli.utils.cpus import resolve_cpus
+
+# Docker imports
+from python_on_whales import docker, exceptions as docker_exceptions
+
+# External library imports
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+import hashlib
+import json
+import time
+import uuid
+import os
+
+POOL_LABEL = "wa_cli.pool"
+"""Label attached to every pooled container. The value is the key of the pool the container belongs to."""
+
+_POOL_STATE = "pool.json"
+
+FORKSERVER_PATH = "/tmp/wa_forkserver.py"
+"""Where the forkserver script is copied to inside pooled containers."""
+
+# Options of the container config that are applied when a pooled container is created
+_RUN_OPTIONS = ["ipc", "cpus", "cpuset_cpus", "cpuset_mems", "memory", "shm_size", "ulimit", "tmpfs"]
+
+
+def _pool_key(config: dict) -> str:
+    # Single files are copied in before each execution, so only directory mounts are part of the key
+    volumes = sorted(list(v) for v in config["volumes"] if not Path(v[0]).is_file())
+    options = {k: config[k] for k in _RUN_OPTIONS if k in config}
+    key = [config["image"], volumes, config["networks"], config.get("ip"), sorted(config["publish"]), options]
+    return hashlib.sha256(json.dumps(key).encode()).hexdigest()
+
+
+def _pid_alive(pid) -> bool:
+    if pid is None:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _sync(pool: dict):
+    # Forget about containers that were stopped or removed outside of the pool
+    running = set(c.name for c in docker.container.list(filters={"label": POOL_LABEL}))
+    for name in list(pool):
+        if name not in running:
+            pool.pop(name)
+
+
+def _create(config: dict, key: str) -> str:
+    name = f"wa-pool-{key[:8]}-{uuid.uuid4().hex[:6]}"
+    LOGGER.info(f"Starting pooled container '{name}'...")
+
+    # Each pooled container leases its own address. The lease is reclaimed once the container is removed.
+    ip = config.get("ip")
+    if ip == "auto":
+        from wa_cli.utils.ipam import allocate_ip
+        ip = allocate_ip(config["networks"][0], name) if config["networks"][0] is not None else None
+
+    # Same for 'auto' host ports
+    publish = [list(p) for p in config["publish"]]
+    for container, host in resolve_ports({"name": name, "publish": publish}).items():
+        LOGGER.info(f"'{name}' publishes {container} on localhost:{host}.")
+
+    # Same for pinned cores
+    options = {k: config[k] for k in _RUN_OPTIONS if k in config}
+    resolve_cpus(options, name=name)
+
+    docker.run(
+        config["image"],
+        ["tail", "-f", "/dev/null"],
+        name=name,
+        volumes=[v for v in config["volumes"] if not Path(v[0]).is_file()],
+        publish=publish,
+        networks=config["networks"],
+        ip=ip,
+        labels={**config.get("labels", {}), POOL_LABEL: key},
+        detach=True,
+        remove=True,
+        **options,
+    )
+    return name
+
+
+def evict_idle(ttl: float, force: bool = False):
+    """
+    Remove pooled containers that haven't been used for ``ttl`` seconds.
+
+    Args:
+        ttl (float): The maximum idle time in seconds
+        force (bool): Remove every idle container, regardless of ``ttl``. Defaults to False.
+    """
+    with locked_state(_POOL_STATE) as pool:
+        _sync(pool)
+        now = time.time()
+        for name, entry in list(pool.items()):
+            if _pid_alive(entry["busy"]):
+                continue
+            if force or now - entry["last_used"] > ttl:
+                LOGGER.info(f"Removing idle pooled container '{name}'...")
+                docker.container.remove(name, force=True)
+                pool.pop(name)
+
+
+def list_pool() -> dict:
+    """Get the pooled containers that are running, mapped to their state (key, last use, and the pid of the process using it)."""
+    with locked_state(_POOL_STATE) as pool:
+        _sync(pool)
+        return {name: dict(entry, busy=entry["busy"] if _pid_alive(entry["busy"]) else None) for name, entry in pool.items()}
+
+
+def _forkserver_socket(preload: str) -> str:
+    return f"/tmp/wa_forkserver-{hashlib.sha256(preload.encode()).hexdigest()[:8]}.sock"
+
+
+def _start_forkserver(name: str, config: dict, preload: str):
+    from wa_cli.utils.files import get_resolved_path
+
+    LOGGER.info(f"Starting forkserver in '{name}' preloading '{preload}'...")
+    docker.copy(get_resolved_path("scripts/forkserver.py", wa_cli_relative=True), (name, FORKSERVER_PATH))
+    docker.execute(name, ["python", FORKSERVER_PATH, "--socket", _forkserver_socket(preload), "serve", "--preload", preload], envs=config["envs"], detach=True)
+
+
+def _acquire(config: dict, preload: Optional[str] = None) -> str:
+    key = _pool_key(config)
+    with locked_state(_POOL_STATE) as pool:
+        _sync(pool)
+        for name, entry in pool.items():
+            if entry["key"] == key and not _pid_alive(entry["busy"]):
+                LOGGER.info(f"Reusing warm container '{name}'.")
+                break
+        else:
+            name = _create(config, key)
+            pool[name] = {"key": key}
+        pool[name].update(busy=os.getpid(), last_used=time.time())
+
+        # The forkserver keeps running in the container, so it only has to be started once per module list
+        forkservers = pool[name].setdefault("forkservers", [])
+        if preload is not None and preload not in forkservers:
+            _start_forkserver(name, config, preload)
+            forkservers.append(preload)
+    return name
+
+
+def _release(name: str, config: dict, size: int, keep: bool):
+    key = _pool_key(config)
+    with locked_state(_POOL_STATE) as pool:
+        if not keep:
+            # The container may still be running the interrupted script, so it can't be reused
+            LOGGER.info(f"Removing pooled container '{name}'...")
+            docker.container.remove(name, force=True)
+            pool.pop(name, None)
+            return
+
+        if name in pool:
+            pool[name].update(busy=None, last_used=time.time())
+
+        # Top up the pool so the next iteration finds a warm container
+        for _ in range(size - sum(1 for entry in pool.values() if entry["key"] == key)):
+            pool[_create(config, key)] = {"key": key, "busy": None, "last_used": time.time()}
+
+
+@contextmanager
+def pooled_container(config: dict, size: int, ttl: float, preload: Optional[str] = None):
+    """
+    Check out a warm container from the pool for the duration of the context.
+
+    If the context is exited because of an error, the container is removed instead of returned to the pool,
+    since it may still be running the interrupted command. See :func:`run_in_pool` for the arguments.
+
+    Yields:
+        str: The name of the container
+    """
+    evict_idle(ttl)
+
+    name = _acquire(config, preload)
+    keep = False
+    try:
+        yield name
+        keep = True
+    finally:
+        _release(name, config, size, keep)
+
+
+def execute_in_container(name: str, config: dict, stream: Callable[[Iterable], None], preload: Optional[str] = None, pidfile: Optional[str] = None) -> int:
+    """
+    Run the command of ``config`` in a pooled container checked out with :func:`pooled_container`.
+
+    Args:
+        name (str): The name of the container
+        config (dict): The container config that would be passed to ``docker.run``
+        stream (Callable): Called with the ``(source, chunk)`` output of the command
+        preload (str): The module list of the forkserver to use. Defaults to None (no forkserver).
+        pidfile (str): Only used with a forkserver. The file (in the container) the client writes its pid to, see :func:`cancel_in_container`.
+
+    Returns:
+        int: The exit code of the command
+    """
+    command = config["command"]
+    if preload is not None:
+        # 'python <script> <args>' becomes a thin client that asks the forkserver to run '<script> <args>'
+        options = ["--pidfile", pidfile] if pidfile is not None else []
+        command = ["python", "-S", FORKSERVER_PATH, "--socket", _forkserver_socket(preload), "run", *options, *command[1:]]
+
+    for hostfile, containerfile, *_ in config["volumes"]:
+        if Path(hostfile).is_file():
+            docker.copy(hostfile, (name, containerfile))
+
+    start = time.time()
+    try:
+        stream(docker.execute(name, command, envs=config["envs"], stream=True))
+        exit_code = 0
+    except docker_exceptions.DockerException as e:
+        exit_code = e.return_code
+    LOGGER.info(f"Script exited with code {exit_code} after {time.time() - start:.3f}s.")
+    return exit_code
+
+
+def cancel_in_container(name: str, pidfile: str):
+    """Cancel a command started by :func:`execute_in_container` with a forkserver and ``pidfile``. The forkserver then stops the script."""
+    docker.execute(name, ["sh", "-c", f"test -f {pidfile} && kill -TERM $(cat {pidfile}); rm -f {pidfile}"])
+
+
+def run_in_pool(config: dict, size: int, ttl: float, stream: Callable[[Iterable], None], preload: Optional[str] = None) -> int:
+    """
+    Run a command in a warm, pre-started container instead of starting a new one.
+
+    Containers are pooled by image, directory mounts, network and ports; up to ``size`` containers are kept
+    running per pool. Single file mounts (i.e. the script) are copied into the container before each
+    execution so the latest version is always used. The command is then run with ``docker exec``.
+    Containers that were idle for more than ``ttl`` seconds are removed the next time the pool is used.
+
+    If ``preload`` is set, a forkserver is started in the container that imports those modules once. Each
+    execution is then forked from it, which skips the interpreter start up and the (often slow) imports.
+
+    Args:
+        config (dict): The container config that would be passed to ``docker.run``
+        size (int): The number of containers to keep warm for this pool
+        ttl (float): The maximum idle time in seconds
+        stream (Callable): Called with the ``(source, chunk)`` output of the command
+        preload (str): Comma separated list of modules to preload in a forkserver. Defaults to None (no forkserver).
+
+    Returns:
+        int: The exit code of the command
+    """
+    with pooled_container(config, size, ttl, preload) as name:
+        return execute_in_container(name, config, stream, preload)
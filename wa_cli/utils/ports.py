@@ -0,0 +1,111 @@
+#
+# MIT License
+#
+# Copyright (c) 2018-2021 Wisconsin Autonomous
+#
+# See https://wa.wisc.edu
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+# Import some utils
+from wa_cli.utils.logger import LOGGER
+from wa_cli.utils.state import locked_state
+from wa_cli.utils.ipam import reclaim_leases
+
+# External library imports
+import socket
+import time
+
+_PORTS_STATE = "ports.json"
+
+AUTO = "auto"
+"""Host port placeholder (i.e. ``auto:5555``) that's replaced by a free port when the container is created."""
+
+
+def _port_is_free(port: int, protocol: str = "tcp") -> bool:
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM if protocol == "udp" else socket.SOCK_STREAM) as s:
+        try:
+            s.bind(("", port))
+        except OSError:
+            return False
+    return True
+
+
+def allocate_port(name: str, preferred: int, max_tries: int = 1000, protocol: str = "tcp") -> int:
+    """
+    Lease a free host port for the container ``name``.
+
+    The ``preferred`` port is used if it's free; otherwise the following ports are tried in order. A port is
+    free if no other container holds a lease on it and it can be bound on the host. Leases are recorded in the
+    ``wa_cli`` state directory and are reclaimed once their container no longer exists.
+
+    Args:
+        name (str): The name of the container the port is for
+        preferred (int): The port to try first, typically the container port
+        max_tries (int): How many ports to try before giving up
+        protocol (str): The protocol the port is published for (``tcp`` or ``udp``). Defaults to ``tcp``.
+
+    Returns:
+        int: The leased host port
+
+    Raises:
+        RuntimeError: If no free port was found
+    """
+    with locked_state(_PORTS_STATE) as leases:
+        reclaim_leases(leases)
+        for port in range(preferred, min(preferred + max_tries, 65536)):
+            if str(port) not in leases and _port_is_free(port, protocol):
+                leases[str(port)] = {"name": name, "created": time.time()}
+                LOGGER.debug(f"Leased host port '{port}' to '{name}'.")
+                return port
+    raise RuntimeError(f"Could not find a free host port in the range {preferred}-{preferred + max_tries - 1}.")
+
+
+def release_ports(name: str):
+    """
+    Release the host ports leased to the container ``name``.
+
+    Args:
+        name (str): The name of the container
+    """
+    with locked_state(_PORTS_STATE) as leases:
+        for port, lease in list(leases.items()):
+            if lease["name"] == name:
+                leases.pop(port)
+
+
+def resolve_ports(config: dict) -> dict:
+    """
+    Replace every ``auto`` host port in the ``publish`` entries of a container config with a leased free port.
+
+    Args:
+        config (dict): The container config that would be passed to ``docker.run``. Updated in place.
+
+    Returns:
+        dict: Maps each container port to the host port it's published on
+    """
+    mapping = {}
+    for i, (*host_ip, host, container) in enumerate(config["publish"]):
+        if host == AUTO:
+            port, _, protocol = container.partition("/")
+            host = str(allocate_port(config["name"], int(port), protocol=protocol or "tcp"))
+            config["publish"][i] = [*host_ip, host, container]
+        mapping[container] = host
+    return mapping
@@ -0,0 +1,108 @@
+#
+# MIT License
+#
+# Copyright (c) 2018-2021 Wisconsin Autonomous
+#
+# See https://wa.wisc.edu
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+# Import some utils
+from wa_cli.utils.logger import LOGGER
+
+# External library imports
+from contextlib import contextmanager
+from pathlib import Path
+import json
+import os
+
+STATE_DIR_ENV = "WA_CLI_STATE_DIR"
+"""Environment variable that, if set, overrides the default state directory (``~/.wa_cli``)."""
+
+
+def get_state_dir() -> Path:
+    """
+    Get the directory where the ``wa_cli`` stores local state (job queues, caches, leases, etc.).
+
+    The directory defaults to ``~/.wa_cli`` and can be overridden with the ``WA_CLI_STATE_DIR``
+    environment variable. It is created if it doesn't exist.
+
+    Returns:
+        Path: The resolved state directory
+    """
+    state_dir = Path(os.environ.get(STATE_DIR_ENV, Path.home() / ".wa_cli")).expanduser().resolve()
+    if not state_dir.is_dir():
+        LOGGER.debug(f"Creating state directory at '{state_dir}'...")
+        state_dir.mkdir(parents=True, exist_ok=True)
+    return state_dir
+
+
+def get_state_path(*parts: str, is_dir: bool = False) -> Path:
+    """
+    Get a path inside the state directory. Parent directories are created as needed.
+
+    Args:
+        *parts (str): The path components relative to the state directory
+        is_dir (bool): If True, the path itself is created as a directory. Defaults to False.
+
+    Returns:
+        Path: The path inside the state directory
+    """
+    path = get_state_dir().joinpath(*parts)
+    if is_dir:
+        path.mkdir(parents=True, exist_ok=True)
+    else:
+        path.parent.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+@contextmanager
+def locked_state(name: str):
+    """
+    Load a JSON state file while holding an exclusive lock on it.
+
+    The loaded dictionary is yielded and written back when the context exits, so concurrent ``wa``
+    invocations never clobber each other's updates. Locking is skipped on platforms without ``fcntl``.
+
+    Args:
+        name (str): The name of the state file, relative to the state directory (i.e. ``pool.json``)
+
+    Yields:
+        dict: The contents of the state file. Empty if it doesn't exist yet.
+    """
+    path = get_state_path(name)
+    with open(path.with_name(path.name + ".lock"), "w") as lock:
+        try:
+            import fcntl
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        except ImportError:
+            pass
+
+        state = {}
+        if path.is_file():
+            with open(path) as f:
+                state = json.load(f)
+
+        yield state
+
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(state, f, indent=4)
+        os.replace(tmp, path)
@@ -0,0 +1,223 @@
+#
+# MIT License
+#
+# Copyright (c) 2018-2021 Wisconsin Autonomous
+#
+# See https://wa.wisc.edu
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+# Docker imports
+from python_on_whales import docker, exceptions as docker_exceptions
+
+# External library imports
+from logging.handlers import RotatingFileHandler
+from typing import BinaryIO, Callable, Iterable, Optional
+from collections import deque
+from datetime import datetime, timezone
+import threading
+import logging
+import queue
+import time
+import sys
+
+MAX_LINE_LENGTH = 64 * 1024
+"""Partial lines longer than this are flushed to the log file as is, which bounds the memory used per stream."""
+
+
+class RotatingLog:
+    """
+    A line oriented log file that's rotated once it grows past ``max_bytes``.
+
+    Args:
+        filename (str): The file to write to
+        max_bytes (int): The size at which the file is rotated
+        backup_count (int): How many rotated files to keep around
+        compress (bool): Whether to gzip the rotated files. Defaults to False.
+    """
+
+    def __init__(self, filename: str, max_bytes: int, backup_count: int, compress: bool = False):
+        self._handler = RotatingFileHandler(filename, maxBytes=max_bytes, backupCount=backup_count)
+        self._handler.setFormatter(logging.Formatter("%(message)s"))
+        if compress:
+            self._handler.namer = lambda name: name + ".gz"
+            self._handler.rotator = _gzip_rotator
+        self._partial = {}
+
+    def write(self, source: str, chunk: bytes):
+        """Write a chunk of output. Only complete lines are written; the remainder is held until the next chunk."""
+        data = self._partial.pop(source, b"") + chunk
+        *lines, rest = data.split(b"\n")
+        if len(rest) > MAX_LINE_LENGTH:
+            lines.append(rest)
+            rest = b""
+        if rest:
+            self._partial[source] = rest
+        for line in lines:
+            self._handler.emit(logging.makeLogRecord({"msg": line.decode(errors="replace").rstrip("\r")}))
+
+    def close(self):
+        """Flush any partial lines and close the file."""
+        for source, rest in list(self._partial.items()):
+            self._partial.pop(source)
+            self.write(source, rest + b"\n")
+        self._handler.close()
+
+
+def _gzip_rotator(source: str, dest: str):
+    import gzip
+    import shutil
+    import os
+
+    with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+def stream_output(chunks: Iterable, log: Optional[RotatingLog] = None, record: Optional[BinaryIO] = None):
+    """
+    Forward ``(source, chunk)`` pairs (as yielded by ``python_on_whales`` when streaming) to the terminal as they are produced.
+
+    The output is forwarded chunk by chunk so memory use doesn't grow with the length of the run.
+
+    Args:
+        chunks (Iterable): The ``(source, chunk)`` pairs, where ``source`` is ``stdout`` or ``stderr``
+        log (RotatingLog): If set, the output is also written to this log
+        record (BinaryIO): If set, the stdout is also written to this file
+    """
+    for source, chunk in chunks:
+        out = sys.stdout if source == "stdout" else sys.stderr
+        out.buffer.write(chunk)
+        out.flush()
+        if log is not None:
+            log.write(source, chunk)
+        if record is not None and source == "stdout":
+            record.write(chunk)
+
+
+def stream_container(container, log: Optional[RotatingLog] = None, record: Optional[BinaryIO] = None):
+    """
+    Stream the stdout and stderr of a running container to the terminal as it is produced.
+
+    Args:
+        container: The container (or its name) to follow
+        log (RotatingLog): If set, the output is also written to this log
+        record (BinaryIO): If set, the stdout of the container is also written to this file
+    """
+    stream_output(docker.container.logs(container, follow=True, stream=True), log=log, record=record)
+
+
+def _parse_timestamp(timestamp: str) -> float:
+    # Docker emits RFC3339 timestamps in UTC with up to nanosecond precision (trailing zeros trimmed)
+    base, _, fraction = timestamp.rstrip("Z").partition(".")
+    seconds = datetime.strptime(base, "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc).timestamp()
+    return seconds + float(f"0.{fraction or 0}")
+
+
+def _follow(container: str, container_id: str, lines: queue.Queue):
+    def put(line: bytes):
+        timestamp, _, message = line.decode(errors="replace").partition(" ")
+        lines.put((_parse_timestamp(timestamp), container, message.rstrip("\r")))
+
+    partial = b""
+    try:
+        for _, chunk in docker.container.logs(container_id, follow=True, stream=True, timestamps=True):
+            *complete, partial = (partial + chunk).split(b"\n")
+            for line in complete:
+                put(line)
+        # The last line doesn't have to end with a newline
+        if partial:
+            put(partial)
+    finally:
+        lines.put((None, container, None))
+
+
+def follow_containers(list_containers: Callable[[], Iterable[str]], emit: Callable[[float, str, str], None], window: float = 0.25, buffer_size: int = 1000, poll: float = 2.0, keep_polling: bool = True):
+    """
+    Follow the logs of many containers at once and merge them into one stream ordered by timestamp.
+
+    Each container is followed in its own thread. Lines are held in a per-container ring buffer for
+    ``window`` seconds after they arrive so that lines from different containers can be emitted in timestamp order. A buffer
+    that fills up is drained immediately, so memory use is bounded by ``buffer_size`` lines per container.
+
+    Args:
+        list_containers (Callable): Returns the names of the containers to follow. Called every ``poll`` seconds so new containers are picked up.
+        emit (Callable): Called with ``(timestamp, container, line)`` for each line, in order
+        window (float): How long (in seconds) lines are held back to be reordered
+        buffer_size (int): The maximum number of lines held per container
+        poll (float): How often (in seconds) to look for new containers
+        keep_polling (bool): If False, return once every followed container has stopped instead of waiting for new ones
+    """
+    lines = queue.Queue()
+    buffers = {}
+    followed, finished = {}, {}
+    last_poll = 0
+
+    while True:
+        if time.time() - last_poll > poll:
+            containers = set(list_containers())
+            for container in containers - set(followed):
+                try:
+                    container_id = docker.container.inspect(container).id
+                except docker_exceptions.DockerException:
+                    continue
+                # Containers whose logs already ended aren't followed again, since that would replay their whole
+                # history. A new container that took the name of one that ended is.
+                if finished.get(container) == container_id:
+                    continue
+                followed[container] = container_id
+                buffers.setdefault(container, deque(maxlen=buffer_size))
+                threading.Thread(target=_follow, args=(container, container_id, lines), daemon=True).start()
+            for container in set(finished) - containers:
+                finished.pop(container)
+            last_poll = time.time()
+
+        # Move everything that arrived into the per-container buffers
+        try:
+            timeout = window
+            while True:
+                timestamp, container, line = lines.get(timeout=timeout)
+                timeout = 0
+                if line is None:
+                    finished[container] = followed.pop(container)
+                else:
+                    buffer = buffers[container]
+                    if len(buffer) == buffer.maxlen:
+                        emit(*buffer.popleft()[:3])
+                    buffer.append((timestamp, container, line, time.time()))
+        except queue.Empty:
+            pass
+
+        # Emit the oldest line across all the buffers once it has been held for the reordering window
+        cutoff = time.time() - window
+        while True:
+            heads = [buffer[0] for buffer in buffers.values() if buffer]
+            if not heads:
+                break
+            oldest = min(heads)
+            if oldest[3] > cutoff:
+                break
+            emit(*buffers[oldest[1]].popleft()[:3])
+
+        # Forget about containers that have stopped and have nothing left to emit
+        for container in [c for c, b in buffers.items() if not b and c not in followed]:
+            buffers.pop(container)
+        if not keep_polling and not buffers:
+            return
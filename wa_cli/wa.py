@@ -34,8 +34,10 @@ subparsers may be `docker` to do things with Docker containers, or
 # Command imports
 import wa_cli.script as script
 import wa_cli.docker_cli as docker_cli
-import avtoolbox.dev as dev
+import wa_cli.dev as dev
 import wa_cli.wiki as wiki
+import wa_cli.jobs as jobs
+import wa_cli.bridge as bridge
 
 # Utility imports
 from wa_cli.utils.logger import set_verbosity
@@ -59,9 +61,11 @@ def init():
     script.init(subparsers.add_parser("script", description="Entrypoint for various generic scripts useful to Wisconsin Autonomous members"))
     docker_cli.init(subparsers.add_parser("docker", description="Entrypoint for Docker related commands"))
     wiki.init(subparsers.add_parser("wiki", description="Entrypoint for internal wiki related commands"))
+    jobs.init(subparsers.add_parser("jobs", description="Entrypoint for the local simulation job queue"))
+    bridge.init(subparsers.add_parser("bridge", description="Entrypoint for inspecting the simulator bridge"))
 
     # Alias for the wa docker stack command
-    dev._init(subparsers.add_parser("dev", description="Work with the AV development environment"))
+    dev.init(subparsers.add_parser("dev", description="Work with the AV development environment"))
 
     return parser
 